@@ -1,9 +1,10 @@
 from typing import List
 
 from io import BytesIO
-from typing import List
+from typing import Any, AsyncIterator, List
 
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
@@ -13,11 +14,18 @@ from app.models.audit_run import AuditRun, AuditStatus
 from app.schemas import (
     AuditBaselineSummary,
     AuditFindingRead,
+    AuditProgressRead,
     AuditRunCreate,
     AuditRunRead,
 )
 from app.services.audit_report import AuditReportBuilder
 from app.services.audit_summary import initialize_summary
+from app.services.audit_events import (
+    TERMINAL_STATUSES,
+    format_sse,
+    get_event_broker,
+)
+from app.services.batch_ingestion import progress_report
 from app.workers.tasks import run_audit as run_audit_task
 
 router = APIRouter()
@@ -80,6 +88,97 @@ def get_audit(org_id: int, audit_id: int, db: Session = Depends(get_db_session))
     return audit
 
 
+@router.get("/{org_id}/audits/{audit_id}/progress", response_model=AuditProgressRead)
+def get_audit_progress(
+    org_id: int, audit_id: int, db: Session = Depends(get_db_session)
+) -> AuditProgressRead:
+    audit = db.get(AuditRun, audit_id)
+    if not audit or audit.org_id != org_id:
+        raise HTTPException(status_code=404, detail="Auditoria não encontrada")
+    report = progress_report(
+        audit.summary,
+        status=audit.status,
+        started_at=audit.started_at,
+        finished_at=audit.finished_at,
+    )
+    return AuditProgressRead(audit_run_id=audit.id, **report)
+
+
+# Comentário SSE enviado quando nada acontece, para manter proxies abertos.
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def _progress_snapshot(db: Session, org_id: int, audit_id: int) -> dict[str, Any]:
+    audit = db.get(AuditRun, audit_id)
+    if not audit or audit.org_id != org_id:
+        raise HTTPException(status_code=404, detail="Auditoria não encontrada")
+    return {
+        "type": "progress",
+        "audit_run_id": audit.id,
+        **progress_report(
+            audit.summary,
+            status=audit.status,
+            started_at=audit.started_at,
+            finished_at=audit.finished_at,
+        ),
+    }
+
+
+@router.get("/{org_id}/audits/{audit_id}/events")
+async def stream_audit_events(
+    org_id: int,
+    audit_id: int,
+    request: Request,
+    db: Session = Depends(get_db_session),
+) -> StreamingResponse:
+    """Stream SSE com o progresso e os novos achados de uma auditoria.
+
+    Envia primeiro o estado atual (o mesmo de ``/progress``) e depois os
+    eventos publicados pelas tasks, até a auditoria terminar.
+    """
+
+    # Assina antes de ler o estado atual para não perder eventos entre os dois;
+    # a consulta é síncrona e roda no threadpool para não travar o event loop.
+    subscription = await get_event_broker().subscribe(audit_id)
+    try:
+        snapshot = await run_in_threadpool(_progress_snapshot, db, org_id, audit_id)
+    except BaseException:
+        await subscription.close()
+        raise
+
+    async def events() -> AsyncIterator[str]:
+        async with subscription:
+            yield format_sse(snapshot)
+            if snapshot["status"] in TERMINAL_STATUSES:
+                yield format_sse(
+                    {
+                        "type": "status",
+                        "audit_run_id": audit_id,
+                        "status": snapshot["status"],
+                        "processed_invoices": snapshot["processed_invoices"],
+                        "total_findings": snapshot["total_findings"],
+                        "error": snapshot["error"],
+                    }
+                )
+                return
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+                if event.get("type") == "status" and event.get("status") in (
+                    TERMINAL_STATUSES
+                ):
+                    return
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/{org_id}/audits/{audit_id}/findings", response_model=List[AuditFindingRead])
 def list_findings(org_id: int, audit_id: int, db: Session = Depends(get_db_session)) -> list[AuditFinding]:
     return (
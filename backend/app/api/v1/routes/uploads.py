@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 from datetime import datetime
 from typing import Any
 
@@ -12,11 +13,28 @@ from app.services.invoice_ingestion import InvoiceIngestor
 from app.services.zfm_calculator import ZFMAuditCalculator
 from app.services.audit_summary import AuditSummaryBuilder, initialize_summary
 from app.services.org_plan_limits import OrgPlanLimiter, PlanLimitError
+from app.services.storage.base import STREAM_CHUNK_SIZE
 from app.workers.tasks import parse_xml_batch
 
 router = APIRouter()
 
 
+async def _digest_upload(file: UploadFile) -> tuple[str, int]:
+    """sha256 e tamanho do upload, lidos em blocos; o arquivo volta ao início.
+
+    O corpo já chega em um temporário do Starlette (em disco acima de 1 MB):
+    daqui ele segue em blocos para o storage, sem ``file.read()`` inteiro.
+    """
+
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(STREAM_CHUNK_SIZE):
+        digest.update(chunk)
+        size += len(chunk)
+    await file.seek(0)
+    return digest.hexdigest(), size
+
+
 @router.post('/{org_id}/uploads/xml')
 async def upload_xml(
     org_id: int,
@@ -49,7 +67,12 @@ async def upload_xml(
         uploaded_by=current_user.id,
     )
 
-    limiter.register_usage(setting, uploaded_files=1, added_bytes=len(payload))
+    # XML repetido não ocupa armazenamento novo.
+    limiter.register_usage(
+        setting,
+        uploaded_files=1,
+        added_bytes=0 if result.reused else len(payload),
+    )
 
     metadata = {'source': 'single_xml', 'file_name': file.filename}
     audit_run = AuditRun(
@@ -63,9 +86,20 @@ async def upload_xml(
 
     calculator = ZFMAuditCalculator(db, org_id)
     calculator.bind_to_run(audit_run)
-    findings = calculator.persist_results(audit_run=audit_run, invoice=result.invoice)
+    findings = None
+    if result.reused:
+        # Mesmo XML e mesmas regras: reaproveita os achados da última auditoria.
+        findings = calculator.reuse_findings(
+            audit_run=audit_run,
+            invoice=result.invoice,
+        )
+    if findings is None:
+        findings = calculator.persist_results(
+            audit_run=audit_run,
+            invoice=result.invoice,
+        )
     metadata = dict(audit_run.summary.get('metadata') if audit_run.summary else {})
-    metadata.update({'invoice_id': result.invoice.id})
+    metadata.update({'invoice_id': result.invoice.id, 'reused': result.reused})
     summary_builder = AuditSummaryBuilder(db)
     audit_run.summary = summary_builder.build(
         audit_run,
@@ -80,11 +114,12 @@ async def upload_xml(
         'invoice_id': result.invoice.id,
         'audit_run_id': audit_run.id,
         'created': result.created,
+        'reused': result.reused,
         'findings': len(findings),
     }
 
 
-@router.post('/{org_id}/uploads/zip')
+@router.post('/{org_id}/uploads/zip', status_code=202)
 async def upload_zip(
     org_id: int,
     file: UploadFile = File(...),
@@ -94,14 +129,14 @@ async def upload_zip(
     if not file.filename.lower().endswith('.zip'):
         raise HTTPException(status_code=400, detail='Apenas arquivos ZIP são aceitos.')
 
-    payload = await file.read()
-    if not payload:
+    sha256, size = await _digest_upload(file)
+    if not size:
         raise HTTPException(status_code=400, detail='Arquivo vazio.')
 
     limiter = OrgPlanLimiter(db)
     try:
         setting = limiter.ensure_upload_quota(
-            org_id, new_bytes=len(payload)
+            org_id, new_bytes=size
         )
     except PlanLimitError as exc:
         raise HTTPException(status_code=403, detail=exc.message) from exc
@@ -111,12 +146,13 @@ async def upload_zip(
         session=db,
         org_id=org_id,
         file_name=file.filename,
-        payload=payload,
+        payload=file.file,
         mime=file.content_type or 'application/zip',
         uploaded_by=current_user.id,
+        sha256=sha256,
     )
 
-    limiter.register_usage(setting, added_bytes=len(payload))
+    limiter.register_usage(setting, added_bytes=size)
 
     audit_run = AuditRun(
         org_id=org_id,
@@ -129,13 +165,18 @@ async def upload_zip(
     db.add(audit_run)
     db.flush()
 
-    result = parse_xml_batch(
+    # Grava arquivo e auditoria antes de enfileirar: o worker lê ambos do banco.
+    db.commit()
+    parse_xml_batch.delay(
         zip_path=stored_file.storage_path,
         org_id=org_id,
         audit_run_id=audit_run.id,
         raw_file_id=stored_file.id,
         requested_by=current_user.id,
     )
-    db.commit()
 
-    return result
+    return {
+        'audit_run_id': audit_run.id,
+        'file_id': stored_file.id,
+        'status': AuditStatus.PENDING,
+    }
@@ -85,6 +85,47 @@ class Settings(BaseSettings):
     s3_region: Optional[str] = Field(default=None, alias="S3_REGION")
     s3_bucket: Optional[str] = Field(default=None, alias="S3_BUCKET")
     s3_secure: bool = Field(default=True, alias="S3_SECURE")
+    # Objetos a partir deste tamanho vão em multipart, com partes enviadas em paralelo.
+    s3_multipart_threshold: int = Field(
+        default=64 * 1024 * 1024, alias="S3_MULTIPART_THRESHOLD"
+    )
+    s3_multipart_part_size: int = Field(
+        default=16 * 1024 * 1024, alias="S3_MULTIPART_PART_SIZE"
+    )
+    s3_upload_concurrency: int = Field(default=4, alias="S3_UPLOAD_CONCURRENCY")
+    # Envios em streaming/multipart assinam ``UNSIGNED-PAYLOAD`` em vez do sha256.
+    s3_unsigned_payload: bool = Field(default=True, alias="S3_UNSIGNED_PAYLOAD")
+    # Pool de conexões do cliente S3 (compartilhado entre threads) e lotes.
+    s3_max_connections: int = Field(default=32, alias="S3_MAX_CONNECTIONS")
+    s3_max_keepalive_connections: int = Field(
+        default=16, alias="S3_MAX_KEEPALIVE_CONNECTIONS"
+    )
+    s3_keepalive_expiry: float = Field(default=30.0, alias="S3_KEEPALIVE_EXPIRY")
+    s3_http2: bool = Field(default=False, alias="S3_HTTP2")
+    s3_bulk_concurrency: int = Field(default=16, alias="S3_BULK_CONCURRENCY")
+    # Leitura antecipada de ``storage.open``: cada ``Range`` GET traz ao menos isto.
+    s3_read_ahead: int = Field(default=1024 * 1024, alias="S3_READ_AHEAD")
+    # Cache de leitura em disco na frente do S3/MinIO (desligado sem diretório).
+    storage_cache_dir: Optional[str] = Field(default=None, alias="STORAGE_CACHE_DIR")
+    storage_cache_max_bytes: int = Field(
+        default=10 * 1024 * 1024 * 1024, alias="STORAGE_CACHE_MAX_BYTES"
+    )
+    storage_cache_max_object_size: int = Field(
+        default=256 * 1024 * 1024, alias="STORAGE_CACHE_MAX_OBJECT_SIZE"
+    )
+    # Compressão de XMLs no storage: none | gzip | zstd (gzip sem ``zstandard``).
+    storage_compression: str = Field(default="none", alias="STORAGE_COMPRESSION")
+    # Compactação de XMLs pequenos em segmentos por organização.
+    storage_segment_size: int = Field(
+        default=64 * 1024 * 1024, alias="STORAGE_SEGMENT_SIZE"
+    )
+    storage_segment_max_member_size: int = Field(
+        default=1024 * 1024, alias="STORAGE_SEGMENT_MAX_MEMBER_SIZE"
+    )
+    # Segmentos com menos que esta fração de bytes ainda referenciados são regravados.
+    storage_segment_min_live_ratio: float = Field(
+        default=0.5, alias="STORAGE_SEGMENT_MIN_LIVE_RATIO"
+    )
 
     # SSO
     sso_enabled: bool = Field(default=False, alias="SSO_ENABLED")
@@ -105,6 +146,17 @@ class Settings(BaseSettings):
     feature_zfm_rules: Optional[bool] = Field(default=None, alias="FEATURE_ZFM_RULES")
     feature_webhook_outbound: Optional[bool] = Field(default=None, alias="FEATURE_WEBHOOK_OUTBOUND")
 
+    # Motor de regras
+    ruleset_cache_size: int = Field(default=32, alias="RULESET_CACHE_SIZE")
+
+    # Ingestão de lotes ZIP (0 = número de CPUs; 1 = sequencial)
+    ingestion_workers: int = Field(default=0, alias="INGESTION_WORKERS")
+    ingestion_executor: str = Field(default="thread", alias="INGESTION_EXECUTOR")
+    # XMLs por subtarefa de ``parse_xml_batch`` (0 = lote inteiro em uma task)
+    ingestion_chunk_size: int = Field(default=1000, alias="INGESTION_CHUNK_SIZE")
+    # Gravação de itens e achados: orm | insert (multi-row) | copy (PostgreSQL)
+    persistence_strategy: str = Field(default="insert", alias="PERSISTENCE_STRATEGY")
+
 @lru_cache()
 def get_settings() -> Settings:
     return Settings()
@@ -0,0 +1,24 @@
+"""Add content hash to invoice items"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0005_invoice_item_content_hash"
+down_revision = "0004_app_settings_table"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "invoice_items", sa.Column("content_hash", sa.String(length=64), nullable=True)
+    )
+    op.create_index(
+        "ix_invoice_items_invoice_seq", "invoice_items", ["invoice_id", "seq"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_invoice_items_invoice_seq", table_name="invoice_items")
+    op.drop_column("invoice_items", "content_hash")
@@ -0,0 +1,17 @@
+"""Index files by organization and content hash"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0006_files_org_sha256_index"
+down_revision = "0005_invoice_item_content_hash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_files_org_sha256", "files", ["org_id", "sha256"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_files_org_sha256", table_name="files")
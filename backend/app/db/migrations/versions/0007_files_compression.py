@@ -0,0 +1,20 @@
+"""Record the storage compression codec on files"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0007_files_compression"
+down_revision = "0006_files_org_sha256_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "files", sa.Column("compression", sa.String(length=16), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("files", "compression")
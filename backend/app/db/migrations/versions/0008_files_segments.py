@@ -0,0 +1,24 @@
+"""Index files packed into storage segments"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0008_files_segments"
+down_revision = "0007_files_compression"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("files", sa.Column("segment_offset", sa.BigInteger(), nullable=True))
+    op.add_column("files", sa.Column("segment_length", sa.Integer(), nullable=True))
+    op.create_index(
+        "ix_files_storage_path", "files", ["storage_backend", "storage_path"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_files_storage_path", table_name="files")
+    op.drop_column("files", "segment_length")
+    op.drop_column("files", "segment_offset")
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from datetime import datetime
 
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import BigInteger, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from typing import Optional  # opcional
 
@@ -15,6 +15,12 @@ class FileStorageBackend(str):
 
 class File(Base):
     __tablename__ = "files"
+    # Deduplicação de uploads procura o mesmo conteúdo dentro da organização;
+    # a compactação procura os arquivos de cada segmento pelo ``storage_path``.
+    __table_args__ = (
+        Index("ix_files_org_sha256", "org_id", "sha256"),
+        Index("ix_files_storage_path", "storage_backend", "storage_path"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     org_id: Mapped[int] = mapped_column(ForeignKey("organizations.id"), nullable=False)
@@ -24,6 +30,13 @@ class File(Base):
     storage_backend: Mapped[str] = mapped_column(String(10), default=FileStorageBackend.LOCAL)
     storage_path: Mapped[str] = mapped_column(String(255), nullable=False)
     sha256: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Codec aplicado no storage (gzip/zstd); ``size_bytes`` e ``sha256`` são do
+    # conteúdo original.
+    compression: Mapped[str | None] = mapped_column(String(16))
+    # Posição do arquivo dentro de um segmento (``storage_path`` aponta para o
+    # segmento); ``None`` quando o arquivo é um objeto próprio no storage.
+    segment_offset: Mapped[int | None] = mapped_column(BigInteger)
+    segment_length: Mapped[int | None] = mapped_column(Integer)
     uploaded_by: Mapped[int | None] = mapped_column(ForeignKey("users.id"))
     uploaded_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
 
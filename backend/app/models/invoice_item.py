@@ -1,5 +1,5 @@
 from __future__ import annotations
-from sqlalchemy import JSON, ForeignKey, Numeric, String
+from sqlalchemy import JSON, ForeignKey, Index, Numeric, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base_class import Base
@@ -8,6 +8,8 @@ from app.models.invoice import Invoice  # <- precisa importar o tipo real
 
 class InvoiceItem(Base):
     __tablename__ = "invoice_items"
+    # Reprocessamentos casam os itens existentes por ``(invoice_id, seq)``.
+    __table_args__ = (Index("ix_invoice_items_invoice_seq", "invoice_id", "seq"),)
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     invoice_id: Mapped[int] = mapped_column(ForeignKey("invoices.id"), nullable=False)
@@ -28,5 +30,7 @@ class InvoiceItem(Base):
     bc_st: Mapped[float | None] = mapped_column(Numeric(14, 2))
     icms_st_value: Mapped[float | None] = mapped_column(Numeric(14, 2))
     other_taxes: Mapped[dict] = mapped_column(JSON, default=dict)
+    # sha256 das colunas acima; permite regravar só os itens alterados.
+    content_hash: Mapped[str | None] = mapped_column(String(64))
 
     invoice: Mapped[Invoice] = relationship("Invoice", back_populates="items")
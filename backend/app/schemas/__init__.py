@@ -6,6 +6,7 @@ from .audit import (
     AuditRunRead,
     AuditFindingRead,
     AuditBaselineSummary,
+    AuditProgressRead,
     AuditSummary,
     AuditTopRule,
 )
@@ -56,6 +57,7 @@ __all__ = [
     "AuditSummary",
     "AuditTopRule",
     "AuditBaselineSummary",
+    "AuditProgressRead",
     "OrganizationCreate",
     "OrganizationRead",
     "CheckoutSessionRequest",
@@ -48,3 +48,18 @@ class AuditRunRead(OraculoBaseModel):
 
 class AuditBaselineSummary(AuditSummary):
     audit_run_id: int
+
+
+class AuditProgressRead(OraculoBaseModel):
+    audit_run_id: int
+    status: str
+    total_invoices: int | None = None
+    processed_invoices: int = 0
+    total_chunks: int | None = None
+    completed_chunks: int = 0
+    total_findings: int = 0
+    percent: float | None = None
+    elapsed_seconds: float | None = None
+    throughput_per_second: float | None = None
+    eta_seconds: float | None = None
+    error: str | None = None
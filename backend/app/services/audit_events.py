@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Any
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Eventos que encerram o stream de uma auditoria.
+TERMINAL_STATUSES = ("done", "failed")
+
+
+def audit_channel(audit_run_id: int) -> str:
+    return f"audit-run:{audit_run_id}:events"
+
+
+class AuditEventSubscription(ABC):
+    """Assinatura dos eventos de uma auditoria (usar com ``async with``)."""
+
+    async def __aenter__(self) -> AuditEventSubscription:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    @abstractmethod
+    async def get(self, timeout: float) -> dict[str, Any] | None:
+        """Próximo evento, ou ``None`` se nada chegar em ``timeout`` segundos."""
+
+    async def close(self) -> None:
+        return None
+
+
+class AuditEventBroker(ABC):
+    """Publica o andamento das tasks de auditoria para quem acompanha a run.
+
+    ``publish`` é chamado pelos workers (código síncrono) e nunca propaga
+    falhas do transporte: perder um evento só atrasa a interface, que recebe
+    o estado completo ao reconectar.
+    """
+
+    def publish(self, audit_run_id: int, event: dict[str, Any]) -> None:
+        try:
+            self._publish(audit_run_id, event)
+        except Exception:  # pragma: no cover - depende do transporte
+            logger.warning(
+                "Falha ao publicar evento da auditoria %s", audit_run_id, exc_info=True
+            )
+
+    @abstractmethod
+    def _publish(self, audit_run_id: int, event: dict[str, Any]) -> None:
+        """Entrega ``event`` pelo transporte; falhas são tratadas em ``publish``."""
+
+    @abstractmethod
+    async def subscribe(self, audit_run_id: int) -> AuditEventSubscription:
+        """Assina os eventos de ``audit_run_id`` a partir deste momento."""
+
+
+# ----------------------------------------------------------------------
+class _MemorySubscription(AuditEventSubscription):
+    def __init__(self, broker: InMemoryAuditEventBroker, audit_run_id: int) -> None:
+        self.broker = broker
+        self.audit_run_id = audit_run_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+
+    def deliver(self, event: dict[str, Any]) -> None:
+        # Chamado na thread de quem publica; entrega no loop do assinante.
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    async def get(self, timeout: float) -> dict[str, Any] | None:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self) -> None:
+        self.broker._remove(self)
+
+
+class InMemoryAuditEventBroker(AuditEventBroker):
+    """Broker do próprio processo, usado nos testes e sem ``REDIS_URL``.
+
+    Só alcança assinantes do mesmo processo da API: serve para as tasks
+    executadas em modo eager ou em desenvolvimento.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: dict[int, list[_MemorySubscription]] = {}
+        self._lock = threading.Lock()
+
+    def _publish(self, audit_run_id: int, event: dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(audit_run_id, ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    async def subscribe(self, audit_run_id: int) -> AuditEventSubscription:
+        subscription = _MemorySubscription(self, audit_run_id)
+        with self._lock:
+            self._subscribers.setdefault(audit_run_id, []).append(subscription)
+        return subscription
+
+    def _remove(self, subscription: _MemorySubscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.audit_run_id, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(subscription.audit_run_id, None)
+
+
+# ----------------------------------------------------------------------
+class _RedisSubscription(AuditEventSubscription):
+    def __init__(self, client: Any, pubsub: Any) -> None:
+        self.client = client
+        self.pubsub = pubsub
+
+    async def get(self, timeout: float) -> dict[str, Any] | None:
+        message = await self.pubsub.get_message(
+            ignore_subscribe_messages=True, timeout=timeout
+        )
+        if not message or message.get("type") != "message":
+            return None
+        return json.loads(message["data"])
+
+    async def close(self) -> None:
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+class RedisAuditEventBroker(AuditEventBroker):
+    """Broker via Redis pub/sub: workers publicam, a API assina por run."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self._client: Any = None
+
+    def _publish(self, audit_run_id: int, event: dict[str, Any]) -> None:
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+        self._client.publish(audit_channel(audit_run_id), json.dumps(event))
+
+    async def subscribe(self, audit_run_id: int) -> AuditEventSubscription:
+        import redis.asyncio as redis_asyncio
+
+        client = redis_asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(audit_channel(audit_run_id))
+        return _RedisSubscription(client, pubsub)
+
+
+_broker: AuditEventBroker | None = None
+
+
+def get_event_broker() -> AuditEventBroker:
+    global _broker
+    if _broker is None:
+        _broker = (
+            RedisAuditEventBroker(settings.redis_url)
+            if settings.redis_url
+            else InMemoryAuditEventBroker()
+        )
+    return _broker
+
+
+def set_event_broker(broker: AuditEventBroker | None) -> None:
+    """Troca o broker do processo (testes); ``None`` volta à configuração."""
+
+    global _broker
+    _broker = broker
+
+
+def format_sse(event: dict[str, Any]) -> str:
+    """Serializa um evento no formato ``text/event-stream``."""
+
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
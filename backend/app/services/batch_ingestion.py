@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from dataclasses import dataclass
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, Protocol, Union
+
+from app.models.audit_run import AuditStatus
+from app.services.storage import get_storage_backend
+from app.utils.xml_parser import ParsedInvoice, XMLParser
+
+logger = logging.getLogger(__name__)
+
+INGESTION_EXECUTORS = ("thread", "process")
+
+
+class ZipOpener(Protocol):
+    """Abre o ZIP como arquivo com ``seek`` (ex.: ``StorageBackend.open``)."""
+
+    def open(self) -> BinaryIO:
+        ...
+
+
+@dataclass(frozen=True, slots=True)
+class StoredZip:
+    """ZIP guardado em um backend de storage, lido por faixas.
+
+    Só carrega nomes, então vai para os processos do pool; cada um abre o
+    objeto por conta própria.
+    """
+
+    backend: str
+    path: str
+
+    def open(self) -> BinaryIO:
+        return get_storage_backend(self.backend).open(path=self.path)
+
+
+# Lote a processar: bytes em memória, o caminho de um ZIP em disco ou um
+# ``ZipOpener``. Com um caminho ou um opener, só o diretório central e os
+# membros em leitura são lidos (no S3, por ``Range`` GETs), e cada processo do
+# pool abre o próprio arquivo em vez de receber uma cópia.
+ZipSource = Union[bytes, str, os.PathLike, ZipOpener]
+
+
+class _OpenedZipFile(zipfile.ZipFile):
+    """``ZipFile`` que fecha, ao final, o arquivo aberto por ``open_zip``."""
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self._stream = stream
+        try:
+            super().__init__(stream)
+        except BaseException:
+            stream.close()
+            raise
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._stream.close()
+
+
+def open_zip(source: ZipSource) -> zipfile.ZipFile:
+    if isinstance(source, bytes):
+        return zipfile.ZipFile(BytesIO(source))
+    if isinstance(source, (str, os.PathLike)):
+        return zipfile.ZipFile(source)
+    return _OpenedZipFile(source.open())
+
+
+class ZipMemberError(ValueError):
+    """Falha ao ler ou interpretar um XML específico do lote."""
+
+    def __init__(self, index: int, file_name: str, error: Exception) -> None:
+        super().__init__(f"{file_name}: {error}")
+        self.index = index
+        self.file_name = file_name
+
+
+@dataclass(slots=True)
+class ParsedMember:
+    """XML de um ZIP já descompactado e interpretado, na ordem do arquivo."""
+
+    index: int
+    file_name: str
+    parsed: ParsedInvoice
+
+
+def xml_members(archive: zipfile.ZipFile) -> list[zipfile.ZipInfo]:
+    return [
+        info
+        for info in archive.infolist()
+        if not info.is_dir() and info.filename.lower().endswith('.xml')
+    ]
+
+
+def plan_chunks(total: int, chunk_size: int) -> list[tuple[int, int]]:
+    """Divide ``total`` membros em faixas ``[start, stop)`` de ``chunk_size``.
+
+    ``chunk_size <= 0`` mantém o lote inteiro em uma única faixa.
+    """
+
+    if total <= 0:
+        return []
+    if chunk_size <= 0:
+        return [(0, total)]
+    return [
+        (start, min(start + chunk_size, total))
+        for start in range(0, total, chunk_size)
+    ]
+
+
+def merge_chunk_results(results: list[dict[str, Any]]) -> dict[str, int]:
+    """Soma as contagens devolvidas pelas subtarefas de um lote."""
+
+    return {
+        'chunks': len(results),
+        'processed_invoices': sum(r.get('processed_invoices', 0) for r in results),
+        'total_findings': sum(r.get('total_findings', 0) for r in results),
+    }
+
+
+def record_chunk_progress(
+    summary: dict[str, Any] | None,
+    *,
+    total_chunks: int | None = None,
+    total_invoices: int | None = None,
+    processed_invoices: int = 0,
+    completed_chunks: int = 0,
+    findings: int = 0,
+) -> dict[str, Any]:
+    """Devolve uma cópia de ``summary`` com o progresso do lote atualizado.
+
+    O progresso fica em ``summary["metadata"]["progress"]``, que o
+    ``AuditSummaryBuilder`` preserva ao consolidar a auditoria.
+    """
+
+    summary = dict(summary or {})
+    metadata = dict(summary.get('metadata') or {})
+    progress = dict(metadata.get('progress') or {})
+    if total_chunks is not None:
+        progress['total_chunks'] = total_chunks
+    if total_invoices is not None:
+        progress['total_invoices'] = total_invoices
+    progress['completed_chunks'] = (
+        progress.get('completed_chunks', 0) + completed_chunks
+    )
+    progress['processed_invoices'] = (
+        progress.get('processed_invoices', 0) + processed_invoices
+    )
+    progress['total_findings'] = progress.get('total_findings', 0) + findings
+    metadata['progress'] = progress
+    summary['metadata'] = metadata
+    return summary
+
+
+def progress_report(
+    summary: dict[str, Any] | None,
+    *,
+    status: str,
+    started_at: datetime | None,
+    finished_at: datetime | None = None,
+    now: datetime | None = None,
+) -> dict[str, Any]:
+    """Progresso de um lote com vazão (notas/s) e estimativa de término.
+
+    Vazão e ETA são calculadas na leitura a partir de ``started_at`` e das
+    contagens gravadas por ``record_chunk_progress``; enquanto nenhuma faixa
+    terminou, ambas ficam ``None``.
+    """
+
+    summary = summary or {}
+    progress = (summary.get('metadata') or {}).get('progress') or {}
+    processed = int(progress.get('processed_invoices', 0))
+    total = progress.get('total_invoices')
+    end = finished_at or now or datetime.utcnow()
+    elapsed = (end - started_at).total_seconds() if started_at else None
+
+    throughput = None
+    if elapsed and processed:
+        throughput = processed / elapsed
+    eta = None
+    if status in (AuditStatus.DONE, AuditStatus.FAILED):
+        eta = 0.0 if status == AuditStatus.DONE else None
+    elif throughput and total is not None:
+        eta = max(0, total - processed) / throughput
+
+    percent = None
+    if total:
+        percent = round(100 * min(processed, total) / total, 2)
+    elif total == 0 and status == AuditStatus.DONE:
+        percent = 100.0
+    return {
+        'status': status,
+        'total_invoices': total,
+        'processed_invoices': processed,
+        'total_chunks': progress.get('total_chunks'),
+        'completed_chunks': int(progress.get('completed_chunks', 0)),
+        'total_findings': int(progress.get('total_findings', 0)),
+        'percent': percent,
+        'elapsed_seconds': elapsed,
+        'throughput_per_second': throughput,
+        'eta_seconds': eta,
+        'error': summary.get('error'),
+    }
+
+
+# ----------------------------------------------------------------------
+# Estado de cada processo do pool (modo ``process``): o ZIP e o parser são
+# enviados uma vez por processo, e cada tarefa carrega apenas o nome do membro.
+_worker_archive: zipfile.ZipFile | None = None
+_worker_parser: XMLParser | None = None
+
+
+def _init_process_worker(source: ZipSource, parser_options: dict[str, Any]) -> None:
+    global _worker_archive, _worker_parser
+    _worker_archive = open_zip(source)
+    _worker_parser = XMLParser(**parser_options)
+
+
+def _parse_in_process(member_name: str) -> ParsedInvoice:
+    assert _worker_archive is not None and _worker_parser is not None
+    return _worker_parser.parse_bytes(_worker_archive.read(member_name))
+
+
+def _parse_member(
+    archive: zipfile.ZipFile, parser: XMLParser, member_name: str
+) -> ParsedInvoice:
+    # ``ZipFile.read`` serializa apenas o posicionamento no arquivo; zlib e
+    # lxml liberam o GIL durante a descompressão e o parse.
+    return parser.parse_bytes(archive.read(member_name))
+
+
+# ----------------------------------------------------------------------
+class ZipBatchParser:
+    """Descompacta e interpreta os XMLs de um ZIP em um pool de workers.
+
+    ``iter_parsed`` entrega os resultados na ordem dos membros do arquivo,
+    independentemente de qual worker termina primeiro, para que um único
+    consumidor (a sessão do banco) grave as notas em sequência. No máximo
+    ``workers * prefetch`` membros ficam em andamento ao mesmo tempo, o que
+    limita a memória em lotes grandes. Um erro de leitura ou de parse vira
+    ``ZipMemberError`` quando o consumidor chega àquele membro: os membros
+    anteriores já foram entregues e os seguintes são cancelados, de modo que
+    o erro reportado é sempre o do primeiro XML inválido do arquivo.
+
+    ``executor="thread"`` basta na maioria dos casos; ``"process"`` contorna o
+    GIL no restante do parse (montagem dos dataclasses e ``Decimal``) ao custo
+    de serializar os resultados entre processos. Processos daemon (como os
+    workers ``prefork`` do Celery) não podem ter filhos; neles ``"process"``
+    cai para ``"thread"``. Com ``workers <= 1`` tudo acontece no processo
+    atual, sem pool.
+    """
+
+    def __init__(
+        self,
+        *,
+        workers: int | None = None,
+        executor: str = "thread",
+        prefetch: int = 4,
+        parser_options: dict[str, Any] | None = None,
+    ) -> None:
+        if executor not in INGESTION_EXECUTORS:
+            raise ValueError(f"Executor de ingestão desconhecido: {executor}")
+        if executor == "process" and multiprocessing.current_process().daemon:
+            logger.warning(
+                "Executor 'process' indisponível em processo daemon "
+                "(ex.: worker Celery prefork); usando threads"
+            )
+            executor = "thread"
+        self.workers = workers if workers and workers > 0 else os.cpu_count() or 1
+        self.executor = executor
+        self.prefetch = max(1, prefetch)
+        self.parser_options = dict(parser_options or {})
+
+    def iter_parsed(
+        self, source: ZipSource, *, start: int = 0, stop: int | None = None
+    ) -> Iterator[ParsedMember]:
+        """Membros XML ``[start, stop)`` do arquivo; ``index`` é a posição no ZIP."""
+
+        with open_zip(source) as archive:
+            members = list(enumerate(xml_members(archive)))[start:stop]
+            if self.workers <= 1 or len(members) <= 1:
+                parser = XMLParser(**self.parser_options)
+                for index, info in members:
+                    try:
+                        parsed = _parse_member(archive, parser, info.filename)
+                    except Exception as exc:
+                        raise ZipMemberError(index, info.filename, exc) from exc
+                    yield ParsedMember(index, Path(info.filename).name, parsed)
+                return
+
+            pool = self._create_pool(source)
+            if self.executor == "process":
+
+                def submit(name: str) -> Future[ParsedInvoice]:
+                    return pool.submit(_parse_in_process, name)
+
+            else:
+                parser = XMLParser(**self.parser_options)
+
+                def submit(name: str) -> Future[ParsedInvoice]:
+                    return pool.submit(_parse_member, archive, parser, name)
+
+            window = self.workers * self.prefetch
+            pending: deque[tuple[int, zipfile.ZipInfo, Future[ParsedInvoice]]] = (
+                deque()
+            )
+            remaining = iter(members)
+            try:
+                for index, info in remaining:
+                    pending.append((index, info, submit(info.filename)))
+                    if len(pending) >= window:
+                        break
+                while pending:
+                    index, info, future = pending.popleft()
+                    try:
+                        parsed = future.result()
+                    except Exception as exc:
+                        raise ZipMemberError(index, info.filename, exc) from exc
+                    next_member = next(remaining, None)
+                    if next_member is not None:
+                        next_index, next_info = next_member
+                        pending.append(
+                            (next_index, next_info, submit(next_info.filename))
+                        )
+                    yield ParsedMember(index, Path(info.filename).name, parsed)
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+    def _create_pool(self, source: ZipSource) -> Executor:
+        if self.executor == "process":
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_process_worker,
+                initargs=(source, self.parser_options),
+            )
+        return ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="zip-ingestion"
+        )
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Iterable, Sequence
+
+from sqlalchemy import JSON, Table, insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.audit_finding import AuditFinding
+from app.models.invoice_item import InvoiceItem
+from app.services.rules_engine import RuleResult
+from app.utils.xml_parser import ParsedInvoiceItem
+
+PERSISTENCE_STRATEGIES = ("orm", "insert", "copy")
+
+
+def _optional_float(value: Any) -> float | None:
+    return float(value) if value is not None else None
+
+
+def item_content_hash(row: dict[str, Any]) -> str:
+    """sha256 do conteúdo de um item, sem ``invoice_id`` nem o próprio hash."""
+
+    content = {
+        key: value
+        for key, value in row.items()
+        if key not in ("id", "invoice_id", "content_hash")
+    }
+    encoded = json.dumps(content, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def item_rows(
+    invoice_id: int, items: Iterable[ParsedInvoiceItem]
+) -> list[dict[str, Any]]:
+    """Linhas de ``invoice_items`` no mesmo formato do caminho ORM."""
+
+    rows = [
+        {
+            "invoice_id": invoice_id,
+            "seq": item.seq or index,
+            "product_code": item.product_code,
+            "description": item.description,
+            "ncm": item.ncm,
+            "cest": item.cest,
+            "cfop": item.cfop,
+            "cst": item.cst,
+            "quantity": float(item.quantity),
+            "unit_value": float(item.unit_value),
+            "total_value": float(item.total_value),
+            "freight_alloc": _optional_float(item.freight_alloc),
+            "discount": _optional_float(item.discount),
+            "bc_icms": _optional_float(item.bc_icms),
+            "icms_value": _optional_float(item.icms_value),
+            "bc_st": _optional_float(item.bc_st),
+            "icms_st_value": _optional_float(item.icms_st_value),
+            "other_taxes": item.other_taxes,
+        }
+        for index, item in enumerate(items, start=1)
+    ]
+    for row in rows:
+        row["content_hash"] = item_content_hash(row)
+    return rows
+
+
+def finding_rows(
+    audit_run_id: int, invoice_id: int, results: Iterable[RuleResult]
+) -> list[dict[str, Any]]:
+    """Linhas de ``audit_findings`` no mesmo formato do caminho ORM."""
+
+    return [
+        {
+            "audit_run_id": audit_run_id,
+            "invoice_id": invoice_id,
+            "item_id": result.item.id if result.item else None,
+            "rule_id": result.rule_id,
+            "inconsistency_code": result.inconsistency_code,
+            "severity": result.severity,
+            "message_pt": result.message_pt,
+            "suggestion_code": result.suggestion_code,
+            "references": list(result.references) if result.references else None,
+            "evidence": result.evidence or {},
+        }
+        for result in results
+    ]
+
+
+class BulkWriter:
+    """Grava linhas sem passar pelo identity map da sessão.
+
+    ``insert`` usa ``session.execute(insert(Model), rows)``: o SQLAlchemy
+    agrupa as linhas em ``INSERT ... VALUES`` de várias linhas
+    (*insertmanyvalues*). ``copy`` usa ``COPY ... FROM STDIN`` do psycopg 3
+    quando o banco é PostgreSQL e volta ao ``insert`` nos demais. ``orm``
+    mantém o caminho antigo (um ``session.add`` por linha) e é tratado pelos
+    chamadores; aqui ele se comporta como ``insert``.
+
+    As linhas entram na transação da sessão, mas os objetos já carregados não
+    as enxergam: quem precisar delas via relacionamento deve expirá-lo.
+    """
+
+    def __init__(self, session: Session, strategy: str | None = None) -> None:
+        strategy = strategy or settings.persistence_strategy
+        if strategy not in PERSISTENCE_STRATEGIES:
+            raise ValueError(f"Estratégia de persistência desconhecida: {strategy}")
+        self.session = session
+        self.strategy = strategy
+
+    @property
+    def uses_orm(self) -> bool:
+        return self.strategy == "orm"
+
+    def supports_copy(self) -> bool:
+        dialect = self.session.get_bind().dialect
+        return dialect.name == "postgresql" and dialect.driver == "psycopg"
+
+    def insert_rows(self, model: type[Any], rows: Sequence[dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        if self.strategy == "copy" and self.supports_copy():
+            self._copy(model.__table__, rows)
+        else:
+            self.session.execute(insert(model), list(rows))
+        return len(rows)
+
+    def insert_items(self, invoice_id: int, items: Iterable[ParsedInvoiceItem]) -> int:
+        return self.insert_rows(InvoiceItem, item_rows(invoice_id, items))
+
+    def insert_findings(
+        self, audit_run_id: int, invoice_id: int, results: Iterable[RuleResult]
+    ) -> list[dict[str, Any]]:
+        rows = finding_rows(audit_run_id, invoice_id, results)
+        self.insert_rows(AuditFinding, rows)
+        return rows
+
+    # ------------------------------------------------------------------
+    def _copy(self, table: Table, rows: Sequence[dict[str, Any]]) -> None:
+        columns = [column for column in table.columns if column.name in rows[0]]
+        json_columns = {
+            column.name for column in columns if isinstance(column.type, JSON)
+        }
+        names = [column.name for column in columns]
+        # Valores padrão do lado Python (ex.: ``evidence=dict``) não passam pelo
+        # COPY; as linhas montadas acima já trazem todas as colunas.
+        statement = 'COPY {} ({}) FROM STDIN'.format(
+            table.name, ", ".join(f'"{name}"' for name in names)
+        )
+        driver_connection = self.session.connection().connection.driver_connection
+        with driver_connection.cursor() as cursor:
+            with cursor.copy(statement) as copy:
+                for row in rows:
+                    copy.write_row(
+                        tuple(
+                            json.dumps(row[name])
+                            if name in json_columns and row[name] is not None
+                            else row[name]
+                            for name in names
+                        )
+                    )
@@ -4,30 +4,54 @@ import hashlib
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Iterable
+from typing import Any, BinaryIO, Iterable, Sequence
 
-from sqlalchemy import delete
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, literal_column, select, update
+from sqlalchemy.orm import Session, selectinload
 
+from app.core.config import settings
+from app.models.audit_finding import AuditFinding
 from app.models.file import File
 from app.models.invoice import Invoice
 from app.models.invoice_item import InvoiceItem
+from app.services.bulk_persistence import BulkWriter, item_rows
 from app.services.storage import get_storage_backend
+from app.services.storage.base import StorageContent, iter_chunks
+from app.services.storage.compression import (
+    CODEC_SUFFIXES,
+    compress,
+    is_compressible,
+    resolve_codec,
+)
 from app.utils.xml_parser import ParsedInvoice, ParsedInvoiceItem, XMLParser
 
+# Notas por ``INSERT ... ON CONFLICT``: mantém o total de parâmetros do
+# comando (12 colunas por nota) bem abaixo do limite do PostgreSQL e do SQLite.
+UPSERT_BATCH_SIZE = 500
+
 
 @dataclass(slots=True)
 class IngestionResult:
     invoice: Invoice
     created: bool
+    # XML idêntico a um já gravado: nada foi armazenado, interpretado ou regravado.
+    reused: bool = False
 
 
 class InvoiceIngestor:
     """Serviço responsável por armazenar e transformar XMLs de NF-e."""
 
-    def __init__(self, parser: XMLParser | None = None) -> None:
+    def __init__(
+        self,
+        parser: XMLParser | None = None,
+        *,
+        persistence_strategy: str | None = None,
+        compression: str | None = None,
+    ) -> None:
         self.parser = parser or XMLParser()
         self.storage = get_storage_backend()
+        self.persistence_strategy = persistence_strategy
+        self.compression = resolve_codec(compression or settings.storage_compression)
 
     # ------------------------------------------------------------------
     def store_file(
@@ -36,26 +60,53 @@ class InvoiceIngestor:
         session: Session,
         org_id: int,
         file_name: str,
-        payload: bytes,
+        payload: StorageContent,
         mime: str,
         uploaded_by: int | None,
+        sha256: str | None = None,
     ) -> File:
-        stored = self.storage.store(
-            org_id=org_id,
-            file_name=file_name,
-            content=payload,
-            content_type=mime,
-        )
+        """Grava o arquivo no storage e registra o ``File``.
+
+        ``payload`` pode ser um arquivo aberto (ex.: o temporário do upload),
+        copiado em blocos; sem ``sha256`` informado, o hash é calculado em uma
+        leitura prévia e o arquivo volta à posição inicial. Com
+        ``STORAGE_COMPRESSION``, XMLs são gravados comprimidos e o codec fica
+        em ``File.compression``; ``size_bytes`` continua sendo o tamanho
+        original, que é o que conta para a cota.
+        """
+
+        if sha256 is None:
+            if isinstance(payload, bytes):
+                sha256 = hashlib.sha256(payload).hexdigest()
+            else:
+                sha256 = _stream_sha256(payload)
+        codec = self.compression if is_compressible(file_name, mime) else None
+        content: StorageContent = payload
+        size: int | None = len(payload) if isinstance(payload, bytes) else None
+        stored_name = file_name
+        if codec:
+            content, size = compress(payload, codec)
+            stored_name = f"{file_name}{CODEC_SUFFIXES[codec]}"
+        try:
+            stored = self.storage.store(
+                org_id=org_id,
+                file_name=stored_name,
+                content=content,
+                content_type=mime,
+            )
+        finally:
+            if content is not payload and not isinstance(content, bytes):
+                content.close()
 
-        sha256 = hashlib.sha256(payload).hexdigest()
         file = File(
             org_id=org_id,
             file_name=file_name,
             mime=mime,
-            size_bytes=len(payload),
+            size_bytes=size if size is not None else stored.size or 0,
             storage_backend=self.storage.name,
             storage_path=stored.path,
             sha256=sha256,
+            compression=codec,
             uploaded_by=uploaded_by,
         )
         session.add(file)
@@ -74,18 +125,123 @@ class InvoiceIngestor:
         uploaded_by: int | None,
         raw_file: File | None = None,
     ) -> IngestionResult:
-        file_record = raw_file or self.store_file(
+        """Armazena, interpreta e grava um XML de NF-e.
+
+        Sem ``raw_file``, o sha256 do conteúdo é procurado entre os arquivos da
+        organização: se a nota ainda aponta para um arquivo idêntico, ela é
+        devolvida com ``reused=True`` sem gravar no storage nem interpretar o
+        XML; se só o arquivo é conhecido, ele é reaproveitado e a nota, regravada.
+        """
+
+        file_record = raw_file
+        if file_record is None:
+            sha256 = hashlib.sha256(payload).hexdigest()
+            invoice = self.find_invoice_by_sha256(session, org_id, sha256)
+            if invoice is not None:
+                return IngestionResult(invoice=invoice, created=False, reused=True)
+            file_record = self.find_file_by_sha256(
+                session, org_id, sha256
+            ) or self.store_file(
+                session=session,
+                org_id=org_id,
+                file_name=file_name,
+                payload=payload,
+                mime=mime,
+                uploaded_by=uploaded_by,
+                sha256=sha256,
+            )
+        parsed = self.parser.parse_bytes(payload)
+        return self.ingest_parsed(
             session=session,
             org_id=org_id,
-            file_name=file_name,
-            payload=payload,
-            mime=mime,
-            uploaded_by=uploaded_by,
+            parsed=parsed,
+            file_record=file_record,
         )
-        parsed = self.parser.parse_bytes(payload)
+
+    # ------------------------------------------------------------------
+    def find_file_by_sha256(
+        self, session: Session, org_id: int, sha256: str
+    ) -> File | None:
+        return session.scalars(
+            select(File)
+            .where(File.org_id == org_id, File.sha256 == sha256)
+            .order_by(File.id.desc())
+            .limit(1)
+        ).first()
+
+    def find_invoice_by_sha256(
+        self, session: Session, org_id: int, sha256: str
+    ) -> Invoice | None:
+        """Nota cujo conteúdo atual veio de um arquivo com este sha256."""
+
+        return session.scalars(
+            select(Invoice)
+            .join(File, Invoice.raw_file_id == File.id)
+            .where(
+                Invoice.org_id == org_id,
+                File.org_id == org_id,
+                File.sha256 == sha256,
+            )
+            .order_by(Invoice.id)
+            .limit(1)
+        ).first()
+
+    # ------------------------------------------------------------------
+    def ingest_parsed(
+        self,
+        *,
+        session: Session,
+        org_id: int,
+        parsed: ParsedInvoice,
+        file_record: File,
+    ) -> IngestionResult:
+        """Grava uma nota já interpretada (ex.: pelo ``ZipBatchParser``)."""
+
         invoice, created = self._upsert_invoice(session, org_id, parsed, file_record)
         return IngestionResult(invoice=invoice, created=created)
 
+    def ingest_parsed_batch(
+        self,
+        *,
+        session: Session,
+        org_id: int,
+        parsed_invoices: Sequence[ParsedInvoice],
+        file_record: File,
+    ) -> list[IngestionResult]:
+        """Grava várias notas com um ``INSERT ... ON CONFLICT`` por lote.
+
+        O conflito em ``uq_invoice_access_org`` atualiza a nota existente e o
+        ``RETURNING`` devolve ids e o indicador de criação de todas de uma vez;
+        os itens do lote inteiro são sincronizados de uma vez (ver
+        ``_sync_items``). O resultado segue a ordem de ``parsed_invoices``, com o mesmo
+        efeito de chamar ``ingest_parsed`` nota a nota (chaves repetidas: vale
+        a última ocorrência, e só a primeira conta como criada).
+
+        Com ``PERSISTENCE_STRATEGY=orm`` ou em bancos sem ``ON CONFLICT``
+        (fora PostgreSQL e SQLite) usa o caminho nota a nota.
+        """
+
+        insert = _upsert_insert(session)
+        writer = BulkWriter(session, self.persistence_strategy)
+        if insert is None or writer.uses_orm:
+            return [
+                self.ingest_parsed(
+                    session=session,
+                    org_id=org_id,
+                    parsed=parsed,
+                    file_record=file_record,
+                )
+                for parsed in parsed_invoices
+            ]
+
+        results: list[IngestionResult] = []
+        for start in range(0, len(parsed_invoices), UPSERT_BATCH_SIZE):
+            chunk = parsed_invoices[start : start + UPSERT_BATCH_SIZE]
+            results.extend(
+                self._upsert_batch(session, insert, writer, org_id, chunk, file_record)
+            )
+        return results
+
     # ------------------------------------------------------------------
     def ingest_from_path(
         self,
@@ -106,6 +262,94 @@ class InvoiceIngestor:
         )
 
     # ------------------------------------------------------------------
+    def _upsert_batch(
+        self,
+        session: Session,
+        insert: Any,
+        writer: BulkWriter,
+        org_id: int,
+        parsed_invoices: Sequence[ParsedInvoice],
+        file_record: File,
+    ) -> list[IngestionResult]:
+        # Uma linha por chave: o ON CONFLICT não pode tocar a mesma linha duas
+        # vezes no mesmo comando. A última ocorrência define o conteúdo e a
+        # primeira, a posição (mesma ordem de ids do caminho nota a nota).
+        latest: dict[str, ParsedInvoice] = {}
+        for parsed in parsed_invoices:
+            latest[parsed.access_key] = parsed
+        if not latest:
+            return []
+
+        rows = [
+            {
+                'org_id': org_id,
+                'access_key': access_key,
+                **_invoice_values(parsed, file_record),
+            }
+            for access_key, parsed in latest.items()
+        ]
+        statement = insert(Invoice).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Invoice.access_key, Invoice.org_id],
+            set_={
+                column: statement.excluded[column]
+                for column in rows[0]
+                if column not in ('org_id', 'access_key')
+            },
+        )
+
+        dialect = session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            # ``xmax = 0`` só vale para linhas inseridas por este comando.
+            created_flag = literal_column('(xmax = 0)')
+            returned = session.execute(
+                statement.returning(Invoice.id, Invoice.access_key, created_flag)
+            ).all()
+            ids = {access_key: invoice_id for invoice_id, access_key, _ in returned}
+            new_keys = {access_key for _, access_key, created in returned if created}
+        else:
+            existing = set(
+                session.scalars(
+                    select(Invoice.access_key).where(
+                        Invoice.org_id == org_id,
+                        Invoice.access_key.in_(list(latest)),
+                    )
+                )
+            )
+            returned = session.execute(
+                statement.returning(Invoice.id, Invoice.access_key)
+            ).all()
+            ids = {access_key: invoice_id for invoice_id, access_key in returned}
+            new_keys = set(latest) - existing
+
+        self._sync_items(
+            session,
+            writer,
+            {
+                ids[access_key]: item_rows(ids[access_key], parsed.items)
+                for access_key, parsed in latest.items()
+            },
+        )
+
+        # As linhas não passaram pela sessão: recarrega notas e itens.
+        invoices = {
+            invoice.access_key: invoice
+            for invoice in session.scalars(
+                select(Invoice)
+                .where(Invoice.id.in_(list(ids.values())))
+                .options(selectinload(Invoice.items))
+                .execution_options(populate_existing=True)
+            )
+        }
+        results = []
+        for parsed in parsed_invoices:
+            created = parsed.access_key in new_keys
+            new_keys.discard(parsed.access_key)
+            results.append(
+                IngestionResult(invoice=invoices[parsed.access_key], created=created)
+            )
+        return results
+
     def _upsert_invoice(
         self,
         session: Session,
@@ -123,16 +367,8 @@ class InvoiceIngestor:
             invoice = Invoice(org_id=org_id, access_key=parsed.access_key)
             created = True
 
-        invoice.emitente_cnpj = parsed.emitente_cnpj or ''
-        invoice.destinatario_cnpj = parsed.destinatario_cnpj or ''
-        invoice.uf = parsed.uf or ''
-        invoice.issue_date = parsed.issue_date
-        invoice.total_value = float(parsed.total_value)
-        invoice.freight_value = float(parsed.freight_value) if parsed.freight_value is not None else None
-        invoice.has_st = parsed.has_st
-        invoice.raw_file_id = file_record.id
-        invoice.parsed_at = datetime.utcnow()
-        invoice.indexed_at = datetime.utcnow()
+        for column, value in _invoice_values(parsed, file_record).items():
+            setattr(invoice, column, value)
 
         session.add(invoice)
         session.flush()
@@ -146,32 +382,134 @@ class InvoiceIngestor:
         invoice: Invoice,
         items: Iterable[ParsedInvoiceItem],
     ) -> None:
-        session.execute(
-            delete(InvoiceItem).where(InvoiceItem.invoice_id == invoice.id)
-        )
-        session.flush()
+        writer = BulkWriter(session, self.persistence_strategy)
+        self._sync_items(session, writer, {invoice.id: item_rows(invoice.id, items)})
+        # Parte das alterações não passou pela coleção: ``invoice.items`` é relido.
+        session.expire(invoice, ['items'])
+
+    def _sync_items(
+        self,
+        session: Session,
+        writer: BulkWriter,
+        rows_by_invoice: dict[int, list[dict[str, Any]]],
+    ) -> None:
+        """Aplica aos itens gravados só o que mudou em relação a ``rows_by_invoice``.
 
-        for index, item in enumerate(items, start=1):
-            seq = item.seq or index
-            invoice_item = InvoiceItem(
-                invoice_id=invoice.id,
-                seq=seq,
-                product_code=item.product_code,
-                description=item.description,
-                ncm=item.ncm,
-                cest=item.cest,
-                cfop=item.cfop,
-                cst=item.cst,
-                quantity=float(item.quantity),
-                unit_value=float(item.unit_value),
-                total_value=float(item.total_value),
-                freight_alloc=float(item.freight_alloc) if item.freight_alloc is not None else None,
-                discount=float(item.discount) if item.discount is not None else None,
-                bc_icms=float(item.bc_icms) if item.bc_icms is not None else None,
-                icms_value=float(item.icms_value) if item.icms_value is not None else None,
-                bc_st=float(item.bc_st) if item.bc_st is not None else None,
-                icms_st_value=float(item.icms_st_value) if item.icms_st_value is not None else None,
-                other_taxes=item.other_taxes,
+        Itens são casados por ``(invoice_id, seq)`` e comparados pelo
+        ``content_hash``: iguais ficam intocados (mantendo ids e as referências
+        de ``audit_findings.item_id``), alterados são atualizados, novos são
+        inseridos e os que sumiram são removidos, com as referências dos
+        achados antigos zeradas.
+        """
+
+        condition = InvoiceItem.invoice_id.in_(list(rows_by_invoice))
+        loaded: dict[int, InvoiceItem] = {}
+        if writer.uses_orm:
+            loaded = {
+                item.id: item
+                for item in session.scalars(select(InvoiceItem).where(condition))
+            }
+            existing = [
+                (item.id, item.invoice_id, item.seq, item.content_hash)
+                for item in loaded.values()
+            ]
+        else:
+            existing = session.execute(
+                select(
+                    InvoiceItem.id,
+                    InvoiceItem.invoice_id,
+                    InvoiceItem.seq,
+                    InvoiceItem.content_hash,
+                ).where(condition)
+            ).all()
+        inserts, updates, deletes = _plan_item_changes(existing, rows_by_invoice)
+
+        if deletes:
+            session.execute(
+                update(AuditFinding)
+                .where(AuditFinding.item_id.in_(deletes))
+                .values(item_id=None)
             )
-            session.add(invoice_item)
-        session.flush()
+        if writer.uses_orm:
+            for item_id in deletes:
+                session.delete(loaded[item_id])
+            for row in updates:
+                item = loaded[row['id']]
+                for column, value in row.items():
+                    setattr(item, column, value)
+            session.add_all(InvoiceItem(**row) for row in inserts)
+            session.flush()
+            return
+
+        if deletes:
+            session.execute(delete(InvoiceItem).where(InvoiceItem.id.in_(deletes)))
+        if updates:
+            session.execute(update(InvoiceItem), updates)
+        writer.insert_rows(InvoiceItem, inserts)
+
+
+def _plan_item_changes(
+    existing: Iterable[tuple[int, int, int, str | None]],
+    rows_by_invoice: dict[int, list[dict[str, Any]]],
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]], list[int]]:
+    """Separa as linhas em inserções, atualizações (com ``id``) e ids a remover."""
+
+    current: dict[tuple[int, int], tuple[int, str | None]] = {}
+    deletes: list[int] = []
+    for item_id, invoice_id, seq, content_hash in existing:
+        if (invoice_id, seq) in current:
+            deletes.append(item_id)  # ``seq`` repetido na nota: sobra é removida
+        else:
+            current[(invoice_id, seq)] = (item_id, content_hash)
+
+    inserts: list[dict[str, Any]] = []
+    updates: list[dict[str, Any]] = []
+    for invoice_id, rows in rows_by_invoice.items():
+        for row in rows:
+            match = current.pop((invoice_id, row['seq']), None)
+            if match is None:
+                inserts.append(row)
+            elif match[1] != row['content_hash']:
+                updates.append({'id': match[0], **row})
+    deletes.extend(item_id for item_id, _ in current.values())
+    return inserts, updates, deletes
+
+
+def _invoice_values(parsed: ParsedInvoice, file_record: File) -> dict[str, Any]:
+    now = datetime.utcnow()
+    return {
+        'emitente_cnpj': parsed.emitente_cnpj or '',
+        'destinatario_cnpj': parsed.destinatario_cnpj or '',
+        'uf': parsed.uf or '',
+        'issue_date': parsed.issue_date,
+        'total_value': float(parsed.total_value),
+        'freight_value': (
+            float(parsed.freight_value) if parsed.freight_value is not None else None
+        ),
+        'has_st': parsed.has_st,
+        'raw_file_id': file_record.id,
+        'parsed_at': now,
+        'indexed_at': now,
+    }
+
+
+def _stream_sha256(stream: BinaryIO) -> str:
+    start = stream.tell()
+    digest = hashlib.sha256()
+    for chunk in iter_chunks(stream):
+        digest.update(chunk)
+    stream.seek(start)
+    return digest.hexdigest()
+
+
+def _upsert_insert(session: Session) -> Any:
+    """``insert`` do dialeto com ``on_conflict_do_update``, se houver."""
+
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
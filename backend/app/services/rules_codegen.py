@@ -0,0 +1,445 @@
+from __future__ import annotations
+
+import ast
+import math
+import warnings
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Sequence
+
+from app.services.rules_dsl import RuleDefinition
+from app.services.rules_engine import (
+    ExpressionCompiler,
+    RuleEvaluationError,
+    parse_expression,
+    split_invoice_guards,
+)
+
+RuleHits = tuple[list[tuple[Any, dict[str, Any] | None]], ...]
+FusedFunction = Callable[[Any, Sequence[Any], Any], RuleHits]
+
+_UNSET = object()
+
+_INVOICE_NAMES = frozenset({"invoice", "helpers"})
+_ITEM_NAMES = _INVOICE_NAMES | {"item"}
+
+_BINARY_SYMBOLS = {
+    ast.Add: "+",
+    ast.Sub: "-",
+    ast.Mult: "*",
+    ast.Div: "/",
+    ast.Mod: "%",
+}
+
+_COMPARE_SYMBOLS = {
+    ast.Eq: "==",
+    ast.NotEq: "!=",
+    ast.Gt: ">",
+    ast.GtE: ">=",
+    ast.Lt: "<",
+    ast.LtE: "<=",
+    ast.In: "in",
+    ast.NotIn: "not in",
+    ast.Is: "is",
+    ast.IsNot: "is not",
+}
+
+_LITERAL_TYPES = (str, int, bool, type(None))
+
+
+def _missing(name: str) -> Any:
+    raise RuleEvaluationError(f"Variável '{name}' não disponível no contexto")
+
+
+@dataclass(slots=True)
+class FusedRuleSet:
+    """Função gerada para um conjunto de regras e o código que a originou."""
+
+    source: str
+    function: FusedFunction
+    shared_subexpressions: int
+
+    def __call__(self, invoice: Any, items: Sequence[Any], helpers: Any) -> RuleHits:
+        return self.function(invoice, items, helpers)
+
+
+class RuleSetCodeGenerator:
+    """Gera uma única função Python para um conjunto de regras composto.
+
+    Todas as regras de escopo ``invoice`` são avaliadas uma vez por nota e as de
+    escopo ``item`` dentro de um único laço sobre os itens. Subexpressões que
+    aparecem mais de uma vez (em cláusulas ``when`` ou em ``then.evidence``) são
+    calculadas sob demanda e memorizadas em variáveis locais: as que dependem
+    apenas de ``invoice``/``helpers`` valem para a nota inteira; as que usam
+    ``item`` são reiniciadas a cada item. Isso pressupõe expressões sem efeitos
+    colaterais, como já é o caso dos helpers expostos às regras.
+
+    Cláusulas iniciais de ``all`` que só dependem da nota (``invoice.uf ==
+    "AM"``, ver ``split_invoice_guards``) viram guardas calculadas antes do
+    laço: a regra de item só é testada nos itens quando a guarda passa, e o
+    laço é pulado se nenhuma regra puder casar.
+
+    O código é gerado apenas a partir de nós aceitos pelo ``ExpressionCompiler``
+    (mesma whitelist do ``ExpressionEvaluator``) e executado sem builtins.
+    """
+
+    def __init__(self, compiler: ExpressionCompiler | None = None) -> None:
+        self.compiler = compiler or ExpressionCompiler()
+
+    def generate(self, rules: Iterable[RuleDefinition]) -> FusedRuleSet:
+        rules = list(rules)
+        emitter = _Emitter()
+        invoice_rules = [
+            (index, rule) for index, rule in enumerate(rules) if rule.scope != "item"
+        ]
+        item_rules = [
+            (index, rule) for index, rule in enumerate(rules) if rule.scope == "item"
+        ]
+
+        for scope, scoped_rules in (("invoice", invoice_rules), ("item", item_rules)):
+            for _, rule in scoped_rules:
+                for tree in self._rule_trees(rule):
+                    emitter.count(tree, scope)
+        emitter.assign_temporaries()
+
+        body: list[str] = []
+        invoice_temps = emitter.temporaries("invoice")
+        if invoice_temps:
+            body.append(f"    {' = '.join(invoice_temps)} = _U")
+        hit_names = [f"_h{index}" for index in range(len(rules))]
+        body.extend(f"    {name} = []" for name in hit_names)
+
+        for index, rule in invoice_rules:
+            body.extend(self._emit_rule(emitter, rule, index, "invoice", indent=1))
+
+        if item_rules:
+            body.extend(self._emit_item_loop(emitter, item_rules))
+
+        body.append(f"    return ({''.join(f'{name}, ' for name in hit_names)})")
+        source = "\n".join(
+            ["def _fused_ruleset(invoice, items, helpers):", *body]
+        ) + "\n"
+
+        namespace = emitter.namespace()
+        namespace["__builtins__"] = {}
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", SyntaxWarning)
+            code = compile(source, "<regras compostas>", "exec")
+        exec(code, namespace)  # noqa: S102 - código gerado a partir da AST validada
+        return FusedRuleSet(
+            source=source,
+            function=namespace["_fused_ruleset"],
+            shared_subexpressions=emitter.shared_count,
+        )
+
+    # ------------------------------------------------------------------
+    def _rule_trees(self, rule: RuleDefinition) -> Iterable[ast.AST]:
+        for expression in self._iter_expressions(rule.when):
+            yield self._parse(expression)
+        for value in (rule.then.get("evidence") or {}).values():
+            if isinstance(value, str):
+                yield self._parse(value)
+
+    def _iter_expressions(self, condition: Any) -> Iterable[str]:
+        if isinstance(condition, str):
+            yield condition
+            return
+        if not isinstance(condition, dict):
+            raise RuleEvaluationError("Cláusula de condição inválida")
+        for key in ("all", "any"):
+            for clause in condition.get(key) or []:
+                yield from self._iter_expressions(clause)
+        if "not" in condition:
+            yield from self._iter_expressions(condition["not"])
+
+    def _parse(self, expression: str) -> ast.AST:
+        # Valida contra a whitelist do compilador antes de gerar código.
+        self.compiler.compile(expression)
+        return parse_expression(expression).body
+
+    def _emit_item_loop(
+        self, emitter: "_Emitter", item_rules: list[tuple[int, RuleDefinition]]
+    ) -> list[str]:
+        lines: list[str] = []
+        guards: dict[int, str] = {}
+        conditions: dict[int, dict[str, Any]] = {}
+        for index, rule in item_rules:
+            rule_guards, conditions[index] = split_invoice_guards(rule.when)
+            if rule_guards:
+                guards[index] = f"_g{index}"
+                rendered = self._emit_condition(
+                    emitter, {"all": rule_guards}, "invoice"
+                )
+                lines.append(
+                    f"    {guards[index]} = _bool({rendered}) if items else False"
+                )
+
+        loop = "    for item in items:"
+        indent = 2
+        if len(guards) == len(item_rules):
+            lines.append(f"    if {' or '.join(guards.values())}:")
+            loop = f"    {loop}"
+            indent = 3
+        lines.append(loop)
+        item_temps = emitter.temporaries("item")
+        if item_temps:
+            lines.append(f"{'    ' * indent}{' = '.join(item_temps)} = _U")
+        for index, rule in item_rules:
+            lines.extend(
+                self._emit_rule(
+                    emitter,
+                    rule,
+                    index,
+                    "item",
+                    indent=indent,
+                    condition=conditions[index],
+                    guard=guards.get(index),
+                )
+            )
+        return lines
+
+    def _emit_rule(
+        self,
+        emitter: "_Emitter",
+        rule: RuleDefinition,
+        index: int,
+        scope: str,
+        *,
+        indent: int,
+        condition: dict[str, Any] | None = None,
+        guard: str | None = None,
+    ) -> list[str]:
+        pad = "    " * indent
+        rendered = self._emit_condition(
+            emitter, rule.when if condition is None else condition, scope
+        )
+        if guard is not None:
+            rendered = f"{guard} and ({rendered})"
+        evidence = self._emit_evidence(emitter, rule, scope)
+        target = "item" if scope == "item" else "None"
+        return [
+            f"{pad}# {rule.id}",
+            f"{pad}if {rendered}:",
+            f"{pad}    _h{index}.append(({target}, {evidence}))",
+        ]
+
+    def _emit_condition(
+        self, emitter: "_Emitter", condition: dict[str, Any], scope: str
+    ) -> str:
+        if not condition:
+            return "True"
+        parts: list[str] = []
+        for clause in condition.get("all") or []:
+            parts.append(self._emit_clause(emitter, clause, scope))
+        any_clauses = condition.get("any") or []
+        if any_clauses:
+            parts.append(
+                " or ".join(
+                    self._emit_clause(emitter, clause, scope) for clause in any_clauses
+                )
+            )
+        if "not" in condition:
+            negated = self._emit_condition(emitter, condition["not"], scope)
+            parts.append(f"not ({negated})")
+        if not parts:
+            return "True"
+        return " and ".join(f"({part})" for part in parts)
+
+    def _emit_clause(self, emitter: "_Emitter", clause: Any, scope: str) -> str:
+        if isinstance(clause, str):
+            return emitter.emit(self._parse(clause), scope, truthy=True)
+        if isinstance(clause, dict):
+            return f"({self._emit_condition(emitter, clause, scope)})"
+        raise RuleEvaluationError("Cláusula de condição inválida")
+
+    def _emit_evidence(
+        self, emitter: "_Emitter", rule: RuleDefinition, scope: str
+    ) -> str:
+        payload = rule.then.get("evidence") or {}
+        if not payload:
+            return "None"
+        entries = []
+        for key, value in payload.items():
+            if isinstance(value, str):
+                rendered = emitter.emit(self._parse(value), scope)
+            else:
+                rendered = emitter.constant(value)
+            entries.append(f"{key!r}: {rendered}")
+        return "{" + ", ".join(entries) + "}"
+
+
+class _Emitter:
+    """Traduz nós da AST validada em código Python com subexpressões comuns."""
+
+    def __init__(self) -> None:
+        self._counts: Counter[tuple[str, str]] = Counter()
+        self._temps: dict[tuple[str, str], str] = {}
+        self._constants: dict[str, Any] = {}
+        self._builtins = ExpressionCompiler.allowed_builtins
+
+    @property
+    def shared_count(self) -> int:
+        return len(self._temps)
+
+    # -- contagem -------------------------------------------------------
+    def count(self, node: ast.AST, scope: str, *, is_callee: bool = False) -> None:
+        # O atributo chamado (``item.cfop.startswith``) é só a ligação do
+        # método: não vale memorizá-lo separadamente.
+        key = None if is_callee else self._cache_key(node, scope)
+        if key is not None:
+            self._counts[key] += 1
+        for field, value in ast.iter_fields(node):
+            children = value if isinstance(value, list) else [value]
+            for child in children:
+                if isinstance(child, ast.AST):
+                    callee = isinstance(node, ast.Call) and field == "func"
+                    self.count(child, scope, is_callee=callee)
+
+    def assign_temporaries(self) -> None:
+        for key, total in self._counts.items():
+            if total > 1:
+                self._temps[key] = f"_t{len(self._temps)}"
+
+    def temporaries(self, level: str) -> list[str]:
+        return [name for key, name in self._temps.items() if key[0] == level]
+
+    def namespace(self) -> dict[str, Any]:
+        namespace: dict[str, Any] = {
+            "_U": _UNSET,
+            "_bool": bool,
+            "_slice": slice,
+            "_missing": _missing,
+        }
+        namespace.update(
+            {f"_b_{name}": value for name, value in self._builtins.items()}
+        )
+        namespace.update(self._constants)
+        return namespace
+
+    def constant(self, value: Any) -> str:
+        if isinstance(value, _LITERAL_TYPES) or (
+            isinstance(value, float) and math.isfinite(value)
+        ):
+            return repr(value)
+        name = f"_k{len(self._constants)}"
+        self._constants[name] = value
+        return name
+
+    # -- emissão --------------------------------------------------------
+    def emit(
+        self,
+        node: ast.AST,
+        scope: str,
+        *,
+        is_callee: bool = False,
+        truthy: bool = False,
+    ) -> str:
+        """Renderiza ``node``; ``truthy`` indica que só a veracidade importa."""
+
+        key = None if is_callee else self._cache_key(node, scope)
+        temp = self._temps.get(key) if key is not None else None
+        if temp is None:
+            return self._emit_node(node, scope, truthy=truthy)
+        rendered = self._emit_node(node, scope, truthy=False)
+        return f"({temp} if {temp} is not _U else ({temp} := {rendered}))"
+
+    def _emit_node(self, node: ast.AST, scope: str, *, truthy: bool = False) -> str:
+        if isinstance(node, ast.BoolOp):
+            symbol = " and " if isinstance(node.op, ast.And) else " or "
+            operands = symbol.join(self.emit(value, scope) for value in node.values)
+            return f"({operands})" if truthy else f"_bool({operands})"
+        if isinstance(node, ast.BinOp):
+            symbol = _BINARY_SYMBOLS[type(node.op)]
+            left = self.emit(node.left, scope)
+            right = self.emit(node.right, scope)
+            return f"({left} {symbol} {right})"
+        if isinstance(node, ast.UnaryOp):
+            operand = self.emit(node.operand, scope)
+            if isinstance(node.op, ast.Not):
+                return f"(not {operand})"
+            symbol = "+" if isinstance(node.op, ast.UAdd) else "-"
+            return f"({symbol}{operand})"
+        if isinstance(node, ast.Compare):
+            parts = [self.emit(node.left, scope)]
+            for op, comparator in zip(node.ops, node.comparators, strict=True):
+                parts.append(_COMPARE_SYMBOLS[type(op)])
+                parts.append(self._emit_comparator(op, comparator, scope))
+            if truthy:
+                return f"({' '.join(parts)})"
+            return f"_bool({' '.join(parts)})"
+        if isinstance(node, ast.Call):
+            function = self.emit(node.func, scope, is_callee=True)
+            args = [self.emit(arg, scope) for arg in node.args]
+            args.extend(
+                f"{keyword.arg}={self.emit(keyword.value, scope)}"
+                for keyword in node.keywords
+            )
+            return f"{function}({', '.join(args)})"
+        if isinstance(node, ast.Name):
+            return self._emit_name(node.id, scope)
+        if isinstance(node, ast.Attribute):
+            return f"{self.emit(node.value, scope)}.{node.attr}"
+        if isinstance(node, ast.Subscript):
+            return f"{self.emit(node.value, scope)}[{self.emit(node.slice, scope)}]"
+        if isinstance(node, ast.Slice):
+            bounds = [
+                self.emit(part, scope) if part is not None else "None"
+                for part in (node.lower, node.upper, node.step)
+            ]
+            return f"_slice({', '.join(bounds)})"
+        if isinstance(node, ast.Constant):
+            return self.constant(node.value)
+        if isinstance(node, ast.List):
+            return f"[{', '.join(self.emit(element, scope) for element in node.elts)}]"
+        if isinstance(node, ast.Tuple):
+            elements = [self.emit(element, scope) for element in node.elts]
+            return f"({', '.join(elements)},)" if elements else "()"
+        if isinstance(node, ast.Dict):
+            pairs = ", ".join(
+                f"{self.emit(key, scope)}: {self.emit(value, scope)}"
+                for key, value in zip(node.keys, node.values, strict=True)
+            )
+            return f"{{{pairs}}}"
+        raise RuleEvaluationError(f"Expressão não suportada: {ast.dump(node)}")
+
+    def _emit_comparator(self, op: ast.cmpop, node: ast.AST, scope: str) -> str:
+        if (
+            isinstance(op, (ast.In, ast.NotIn))
+            and isinstance(node, (ast.List, ast.Tuple))
+            and all(isinstance(element, ast.Constant) for element in node.elts)
+        ):
+            return self.constant(tuple(element.value for element in node.elts))
+        return self.emit(node, scope)
+
+    def _emit_name(self, name: str, scope: str) -> str:
+        if name in self._scope_names(scope):
+            return name
+        if name in self._builtins:
+            return f"_b_{name}"
+        return f"_missing({name!r})"
+
+    # -- memorização ----------------------------------------------------
+    def _cache_key(self, node: ast.AST, scope: str) -> tuple[str, str] | None:
+        if not isinstance(
+            node,
+            (
+                ast.Call,
+                ast.Attribute,
+                ast.BinOp,
+                ast.BoolOp,
+                ast.Compare,
+                ast.UnaryOp,
+                ast.Subscript,
+            ),
+        ):
+            return None
+        names = {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+        allowed = self._scope_names(scope) | self._builtins.keys()
+        if not names <= allowed:
+            return None
+        level = "item" if "item" in names else "invoice"
+        return (level, ast.dump(node))
+
+    @staticmethod
+    def _scope_names(scope: str) -> frozenset[str]:
+        return _ITEM_NAMES if scope == "item" else _INVOICE_NAMES
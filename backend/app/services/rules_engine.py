@@ -1,19 +1,31 @@
 from __future__ import annotations
 
 import ast
+import functools
 import math
+import operator
 import re
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from decimal import Decimal
-from typing import Any, Iterable, Mapping
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Mapping, Sequence
 
 from app.services.rules_dsl import RuleDefinition
+from app.services.rules_optimizer import ClauseStatistics, reorder_condition
+
+if TYPE_CHECKING:  # pragma: no cover
+    from app.services.rules_codegen import FusedRuleSet
+    from app.services.rules_index import RuleIndex
+    from app.services.rules_vectorized import VectorizedRuleSet
 
 
 class RuleEvaluationError(ValueError):
     """Erro lançado quando uma expressão da DSL não pode ser avaliada."""
 
 
+Evaluator = Callable[[Mapping[str, Any]], Any]
+
+
 @dataclass(slots=True)
 class RuleResult:
     rule_id: str
@@ -27,33 +39,203 @@ class RuleResult:
     item: Any | None = None
 
 
+@dataclass(slots=True)
+class HelperCacheStats:
+    """Contadores de acertos/faltas do cache de helpers, por nome de helper."""
+
+    hits: dict[str, int] = field(default_factory=dict)
+    misses: dict[str, int] = field(default_factory=dict)
+
+    def record(self, name: str, hit: bool) -> None:
+        counters = self.hits if hit else self.misses
+        counters[name] = counters.get(name, 0) + 1
+
+    def hit_rate(self, name: str | None = None) -> float:
+        if name is None:
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        else:
+            hits, misses = self.hits.get(name, 0), self.misses.get(name, 0)
+        total = hits + misses
+        return hits / total if total else 0.0
+
+    def to_dict(self) -> dict[str, dict[str, float]]:
+        return {
+            name: {
+                "hits": self.hits.get(name, 0),
+                "misses": self.misses.get(name, 0),
+                "hit_rate": self.hit_rate(name),
+            }
+            for name in sorted(self.hits.keys() | self.misses.keys())
+        }
+
+    def reset(self) -> None:
+        self.hits.clear()
+        self.misses.clear()
+
+
+# Acumulado do processo, útil para métricas e benchmarks.
+HELPER_CACHE_STATS = HelperCacheStats()
+
+_HELPER_REGISTRY: dict[str, bool] = {}
+
+
+def rule_helper(func: Callable[..., Any] | None = None, *, cached: bool = True) -> Any:
+    """Registra um método de ``RuleHelper`` como helper da DSL.
+
+    Helpers com ``cached=True`` são memoizados por nota e por argumentos: a
+    primeira chamada calcula, as seguintes (de outras regras ou da evidência)
+    reaproveitam o valor. Use ``cached=False`` para funções triviais chamadas
+    com argumentos diferentes a cada item (ex.: ``value_or``).
+    """
+
+    def decorate(function: Callable[..., Any]) -> Callable[..., Any]:
+        name = function.__name__
+        _HELPER_REGISTRY[name] = cached
+        if not cached:
+            return function
+
+        @functools.wraps(function)
+        def memoized(self: RuleHelper, *args: Any, **kwargs: Any) -> Any:
+            key: tuple[Any, ...] = (name, args)
+            if kwargs:
+                key += (tuple(sorted(kwargs.items())),)
+            try:
+                value = self._memo[key]
+            except KeyError:
+                value = self._memo[key] = function(self, *args, **kwargs)
+                self._record(name, hit=False)
+                return value
+            except TypeError:  # argumentos não hasheáveis
+                return function(self, *args, **kwargs)
+            self._record(name, hit=True)
+            return value
+
+        return memoized
+
+    return decorate(func) if func is not None else decorate
+
+
 class RuleHelper:
-    """Funções auxiliares disponíveis para expressões."""
+    """Funções auxiliares disponíveis para expressões.
+
+    Uma instância é criada por nota. Os helpers registrados com
+    ``@rule_helper`` têm cache por argumentos (``helper_registry`` lista os
+    helpers e se são memoizados) e ``cache_stats`` conta os acertos. As somas
+    de ``precomputed_sums`` são calculadas juntas, numa única passada pelos
+    itens, na primeira vez em que alguma delas é pedida.
+    """
+
+    precomputed_sums: tuple[str, ...] = ("total_value",)
 
     def __init__(self, invoice: Any, items: list[Any]) -> None:
         self.invoice = invoice
         self.items = items
+        self._memo: dict[tuple[Any, ...], Any] = {}
+        self.cache_stats = HelperCacheStats()
+
+    def _precompute_sums(self) -> None:
+        totals = dict.fromkeys(self.precomputed_sums, 0.0)
+        for item in self.items:
+            for attr in self.precomputed_sums:
+                totals[attr] += float(getattr(item, attr, 0) or 0)
+        for attr, total in totals.items():
+            self._memo.setdefault(("items_sum", (attr,)), total)
 
+    @staticmethod
+    def helper_registry() -> dict[str, bool]:
+        return dict(_HELPER_REGISTRY)
+
+    def _record(self, name: str, *, hit: bool) -> None:
+        self.cache_stats.record(name, hit)
+        HELPER_CACHE_STATS.record(name, hit)
+
+    @rule_helper
     def items_sum(self, attr: str) -> float:
+        if attr in self.precomputed_sums:
+            self._precompute_sums()
+            return self._memo[("items_sum", (attr,))]
         total = 0.0
         for item in self.items:
             value = getattr(item, attr, 0) or 0
             total += float(value)
         return total
 
+    @rule_helper
     def total_variance(self) -> float:
         items_total = self.items_sum("total_value")
         freight = float(getattr(self.invoice, "freight_value", 0) or 0)
         invoice_total = float(getattr(self.invoice, "total_value", 0) or 0)
         return abs((items_total + freight) - invoice_total)
 
+    @rule_helper
     def count_items(self) -> int:
         return len(self.items)
 
+    @rule_helper(cached=False)
     def value_or(self, value: Any, default: float = 0.0) -> float:
         return float(value) if value is not None else float(default)
 
 
+_BOOLEAN_RE = re.compile(r"\b(true|false|null)\b", re.IGNORECASE)
+_BOOLEAN_TOKENS = {"true": "True", "false": "False", "null": "None"}
+
+
+def normalize_expression(expression: str) -> str:
+    """Converte literais ``true``/``false``/``null`` para a sintaxe Python."""
+
+    return _BOOLEAN_RE.sub(
+        lambda match: _BOOLEAN_TOKENS[match.group(1).lower()], expression
+    )
+
+
+def parse_expression(expression: str) -> ast.Expression:
+    try:
+        return ast.parse(normalize_expression(expression), mode="eval")
+    except SyntaxError as exc:  # pragma: no cover - erro sintático evidente
+        raise RuleEvaluationError(str(exc)) from exc
+
+
+INVOICE_SCOPE_NAMES = frozenset({"invoice", "helpers"})
+
+
+def expression_names(expression: str) -> set[str]:
+    """Nomes (variáveis de contexto ou builtins) referenciados na expressão."""
+
+    tree = parse_expression(expression)
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+
+
+def is_invoice_invariant(expression: str) -> bool:
+    """Indica se a expressão depende apenas da nota (e não do item)."""
+
+    allowed = INVOICE_SCOPE_NAMES | ExpressionEvaluator.allowed_builtins.keys()
+    return expression_names(expression) <= allowed
+
+
+def split_invoice_guards(condition: dict[str, Any]) -> tuple[list[str], dict[str, Any]]:
+    """Separa as cláusulas iniciais de ``all`` que só dependem da nota.
+
+    Essas cláusulas são invariantes no laço de itens de uma regra de escopo
+    ``item`` e podem ser avaliadas uma vez por nota. Só o prefixo anterior à
+    primeira cláusula que depende do item é separado: uma cláusula da nota que
+    vem depois pode levantar erro em casos que a cláusula do item descartaria
+    (``item.cfop is not None`` antes de ``invoice.total_value / invoice.qty``).
+    Retorna as guardas e a condição restante, a ser avaliada por item.
+    """
+
+    clauses = (condition or {}).get("all") or []
+    guards: list[str] = []
+    for clause in clauses:
+        if not (isinstance(clause, str) and is_invoice_invariant(clause)):
+            break
+        guards.append(clause)
+    if not guards:
+        return [], condition
+    remaining = dict(condition)
+    remaining["all"] = clauses[len(guards) :]
+    return guards, remaining
+
+
 class ExpressionEvaluator:
     allowed_builtins: Mapping[str, Any] = {
         "len": len,
@@ -68,33 +250,20 @@ class ExpressionEvaluator:
         "math": math,
     }
 
-    _BOOLEAN_RE = re.compile(r"\b(true|false|null)\b", re.IGNORECASE)
-
     def __init__(self, context: Mapping[str, Any]):
         self.context = context
 
     def evaluate(self, expression: str) -> Any:
-        normalized = self._normalize(expression)
-        try:
-            tree = ast.parse(normalized, mode="eval")
-        except SyntaxError as exc:  # pragma: no cover - erro sintático evidente
-            raise RuleEvaluationError(str(exc)) from exc
-        return self._eval_node(tree.body)
-
-    def _normalize(self, expression: str) -> str:
-        def replace(match: re.Match[str]) -> str:
-            token = match.group(1).lower()
-            return {"true": "True", "false": "False", "null": "None"}[token]
-
-        return self._BOOLEAN_RE.sub(replace, expression)
+        return self._eval_node(parse_expression(expression).body)
 
     def _eval_node(self, node: ast.AST) -> Any:
         if isinstance(node, ast.BoolOp):
-            values = [self._eval_node(value) for value in node.values]
+            # Curto-circuito: ``item.cfop is not None and item.cfop.startswith("6")``
+            # não pode avaliar o segundo operando quando o primeiro é falso.
             if isinstance(node.op, ast.And):
-                return all(values)
+                return all(self._eval_node(value) for value in node.values)
             if isinstance(node.op, ast.Or):
-                return any(values)
+                return any(self._eval_node(value) for value in node.values)
             raise RuleEvaluationError("Operador booleano não suportado")
         if isinstance(node, ast.BinOp):
             left = self._eval_node(node.left)
@@ -194,15 +363,396 @@ class ExpressionEvaluator:
         raise RuleEvaluationError("Operador de comparação não suportado")
 
 
+class CompiledExpression:
+    """Expressão da DSL já validada e convertida em uma árvore de closures."""
+
+    __slots__ = ("source", "_evaluator")
+
+    def __init__(self, source: str, evaluator: Evaluator) -> None:
+        self.source = source
+        self._evaluator = evaluator
+
+    def __call__(self, context: Mapping[str, Any]) -> Any:
+        return self._evaluator(context)
+
+    def __repr__(self) -> str:  # pragma: no cover - apoio a depuração
+        return f"CompiledExpression({self.source!r})"
+
+
+class ExpressionCompiler:
+    """Compila expressões da DSL uma única vez para reutilização.
+
+    Aplica a mesma normalização e a mesma whitelist de nós do
+    ``ExpressionEvaluator``, mas percorre a AST apenas na compilação: o
+    resultado é uma closure que recebe o contexto e devolve o valor, sem
+    ``ast.parse`` a cada avaliação. Expressões idênticas compartilham a mesma
+    instância compilada.
+    """
+
+    allowed_builtins = ExpressionEvaluator.allowed_builtins
+
+    _BINARY_OPERATORS: Mapping[type[ast.operator], Callable[[Any, Any], Any]] = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: operator.mul,
+        ast.Div: operator.truediv,
+        ast.Mod: operator.mod,
+    }
+
+    _COMPARE_OPERATORS: Mapping[type[ast.cmpop], Callable[[Any, Any], Any]] = {
+        ast.Eq: operator.eq,
+        ast.NotEq: operator.ne,
+        ast.Gt: operator.gt,
+        ast.GtE: operator.ge,
+        ast.Lt: operator.lt,
+        ast.LtE: operator.le,
+        ast.In: lambda left, right: left in right,
+        ast.NotIn: lambda left, right: left not in right,
+        ast.Is: operator.is_,
+        ast.IsNot: operator.is_not,
+    }
+
+    def __init__(self) -> None:
+        self._cache: dict[str, CompiledExpression] = {}
+
+    def compile(self, expression: str) -> CompiledExpression:
+        compiled = self._cache.get(expression)
+        if compiled is None:
+            tree = parse_expression(expression)
+            compiled = CompiledExpression(expression, self._compile_node(tree.body))
+            self._cache[expression] = compiled
+        return compiled
+
+    def _compile_node(self, node: ast.AST) -> Evaluator:
+        if isinstance(node, ast.BoolOp):
+            operands = [self._compile_node(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+
+                def conjunction(context: Mapping[str, Any]) -> bool:
+                    for operand in operands:
+                        if not operand(context):
+                            return False
+                    return True
+
+                return conjunction
+            if isinstance(node.op, ast.Or):
+
+                def disjunction(context: Mapping[str, Any]) -> bool:
+                    for operand in operands:
+                        if operand(context):
+                            return True
+                    return False
+
+                return disjunction
+            raise RuleEvaluationError("Operador booleano não suportado")
+        if isinstance(node, ast.BinOp):
+            binary = self._BINARY_OPERATORS.get(type(node.op))
+            if binary is None:
+                raise RuleEvaluationError("Operador matemático não suportado")
+            left = self._compile_node(node.left)
+            right = self._compile_node(node.right)
+            return lambda context: binary(left(context), right(context))
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile_node(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda context: not operand(context)
+            if isinstance(node.op, ast.UAdd):
+                return lambda context: +operand(context)
+            if isinstance(node.op, ast.USub):
+                return lambda context: -operand(context)
+            raise RuleEvaluationError("Operador unário não suportado")
+        if isinstance(node, ast.Compare):
+            return self._compile_compare(node)
+        if isinstance(node, ast.Call):
+            return self._compile_call(node)
+        if isinstance(node, ast.Name):
+            return self._compile_name(node.id)
+        if isinstance(node, ast.Attribute):
+            if node.attr.startswith("_"):
+                raise RuleEvaluationError("Acesso a atributos privados não permitido")
+            value = self._compile_node(node.value)
+            attr = node.attr
+            return lambda context: getattr(value(context), attr)
+        if isinstance(node, ast.Subscript):
+            value = self._compile_node(node.value)
+            key = self._compile_node(node.slice)
+            return lambda context: value(context)[key(context)]
+        if isinstance(node, ast.Slice):
+            lower = self._compile_optional(node.lower)
+            upper = self._compile_optional(node.upper)
+            step = self._compile_optional(node.step)
+            return lambda context: slice(lower(context), upper(context), step(context))
+        if isinstance(node, ast.Constant):
+            constant = node.value
+            return lambda context: constant
+        if isinstance(node, ast.List):
+            elements = [self._compile_node(element) for element in node.elts]
+            return lambda context: [element(context) for element in elements]
+        if isinstance(node, ast.Tuple):
+            elements = [self._compile_node(element) for element in node.elts]
+            return lambda context: tuple(element(context) for element in elements)
+        if isinstance(node, ast.Dict):
+            if any(key is None for key in node.keys):
+                raise RuleEvaluationError(f"Expressão não suportada: {ast.dump(node)}")
+            pairs = [
+                (self._compile_node(key), self._compile_node(value))
+                for key, value in zip(node.keys, node.values, strict=True)
+            ]
+            return lambda context: {
+                key(context): value(context) for key, value in pairs
+            }
+        raise RuleEvaluationError(f"Expressão não suportada: {ast.dump(node)}")
+
+    def _compile_optional(self, node: ast.AST | None) -> Evaluator:
+        if node is None:
+            return lambda context: None
+        return self._compile_node(node)
+
+    def _compile_compare(self, node: ast.Compare) -> Evaluator:
+        steps: list[tuple[Callable[[Any, Any], Any], Evaluator]] = []
+        for op, comparator in zip(node.ops, node.comparators, strict=True):
+            compare = self._COMPARE_OPERATORS.get(type(op))
+            if compare is None:
+                raise RuleEvaluationError("Operador de comparação não suportado")
+            steps.append((compare, self._compile_operand(op, comparator)))
+        left_operand = self._compile_node(node.left)
+
+        if len(steps) == 1:
+            compare, right_operand = steps[0]
+            return lambda context: bool(
+                compare(left_operand(context), right_operand(context))
+            )
+
+        def evaluate(context: Mapping[str, Any]) -> bool:
+            left = left_operand(context)
+            for compare, right_operand in steps:
+                right = right_operand(context)
+                if not compare(left, right):
+                    return False
+                left = right
+            return True
+
+        return evaluate
+
+    def _compile_operand(self, op: ast.cmpop, node: ast.AST) -> Evaluator:
+        # Listas literais usadas em ``in``/``not in`` viram tuplas pré-calculadas:
+        # a semântica de pertinência é a mesma e evita recriar a lista a cada item.
+        if (
+            isinstance(op, (ast.In, ast.NotIn))
+            and isinstance(node, (ast.List, ast.Tuple))
+            and all(isinstance(element, ast.Constant) for element in node.elts)
+        ):
+            members = tuple(element.value for element in node.elts)
+            return lambda context: members
+        return self._compile_node(node)
+
+    def _compile_call(self, node: ast.Call) -> Evaluator:
+        if any(keyword.arg is None for keyword in node.keywords):
+            raise RuleEvaluationError("Argumentos nomeados dinâmicos não suportados")
+        function = self._compile_node(node.func)
+        args = [self._compile_node(arg) for arg in node.args]
+        kwargs = [
+            (keyword.arg, self._compile_node(keyword.value))
+            for keyword in node.keywords
+        ]
+
+        def call(context: Mapping[str, Any]) -> Any:
+            func = function(context)
+            if not callable(func):
+                raise RuleEvaluationError("Chamada de função inválida")
+            return func(
+                *[arg(context) for arg in args],
+                **{name: value(context) for name, value in kwargs},
+            )
+
+        return call
+
+    def _compile_name(self, name: str) -> Evaluator:
+        has_builtin = name in self.allowed_builtins
+        builtin = self.allowed_builtins.get(name)
+
+        def load(context: Mapping[str, Any]) -> Any:
+            if name in context:
+                return context[name]
+            if has_builtin:
+                return builtin
+            raise RuleEvaluationError(f"Variável '{name}' não disponível no contexto")
+
+        return load
+
+
+@dataclass(slots=True)
+class CompiledRule:
+    """Regra com condição e evidências já compiladas."""
+
+    definition: RuleDefinition
+    condition: Callable[[Mapping[str, Any]], bool]
+    evidence: dict[str, Any]
+    guard: Callable[[Mapping[str, Any]], bool] | None = None
+
+
+# A partir deste número de regras o modo ``compiled`` usa, por padrão, o índice
+# de discriminação para pré-filtrar as regras candidatas de cada nota/item.
+INDEX_MIN_RULES = 50
+
+ENGINE_MODES = ("interpreted", "compiled", "fused")
+
+
 class RuleEngine:
-    def __init__(self, rules: Iterable[RuleDefinition]):
+    """Avalia regras DSL sobre notas e itens.
+
+    No modo ``compiled`` (padrão) cada expressão de ``when`` e
+    ``then.evidence`` é compilada uma única vez na construção do motor. O modo
+    ``fused`` gera uma única função Python para todo o conjunto de regras,
+    compartilhando subexpressões repetidas (ver ``RuleSetCodeGenerator``). O
+    modo ``interpreted`` mantém a avaliação via ``ExpressionEvaluator`` e serve
+    como referência de comportamento.
+
+    No modo ``compiled`` é possível, opcionalmente, medir custo e seletividade
+    de cada cláusula em ``statistics`` (``collect_statistics``) e usar medições
+    de execuções anteriores para reordenar as cláusulas comutativas de
+    ``all``/``any`` (``reorder_clauses``). Só trocam de lugar cláusulas
+    vizinhas que não levantam erro (comparações de um atributo com constantes,
+    ver ``is_reorderable``), de modo que os resultados e os erros não mudam.
+
+    Para conjuntos grandes o modo ``compiled`` monta índices de discriminação
+    (``use_index``; automático a partir de ``INDEX_MIN_RULES`` regras) a partir
+    de predicados como ``item.ncm in [...]``, ``invoice.uf == "AM"`` e
+    ``item.cfop.startswith("6")``, avaliando para cada item apenas as regras
+    cujos predicados podem casar.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[RuleDefinition],
+        *,
+        mode: str = "compiled",
+        statistics: ClauseStatistics | None = None,
+        collect_statistics: bool = False,
+        reorder_clauses: bool = False,
+        use_index: bool | None = None,
+    ):
+        if mode not in ENGINE_MODES:
+            raise ValueError(f"Modo de avaliação desconhecido: {mode}")
+        if collect_statistics or reorder_clauses:
+            if mode != "compiled":
+                raise ValueError("Estatísticas de cláusulas exigem o modo 'compiled'")
+            if statistics is None:
+                raise ValueError("Informe 'statistics' para coletar ou reordenar")
+        if use_index and mode != "compiled":
+            raise ValueError("O índice de discriminação exige o modo 'compiled'")
         self.rules = [rule for rule in rules if not rule.disabled]
+        self.mode = mode
+        self.statistics = statistics
+        self.collect_statistics = collect_statistics
+        self.reorder_clauses = reorder_clauses
+        self.compiler = ExpressionCompiler()
+        self.compiled_rules: list[CompiledRule] = []
+        self.fused: FusedRuleSet | None = None
+        self.invoice_index: RuleIndex | None = None
+        self.item_index: RuleIndex | None = None
+        self.vectorized: VectorizedRuleSet | None = None
+        if mode == "compiled":
+            self.compiled_rules = [self._compile_rule(rule) for rule in self.rules]
+            if use_index is None:
+                use_index = len(self.rules) >= INDEX_MIN_RULES
+            if use_index:
+                self._build_indexes()
+        elif mode == "fused":
+            # Import tardio: o gerador depende das classes deste módulo.
+            from app.services.rules_codegen import RuleSetCodeGenerator
+
+            self.fused = RuleSetCodeGenerator(self.compiler).generate(self.rules)
 
     def evaluate(self, *, invoice: Any, items: Iterable[Any] | None = None) -> list[RuleResult]:
         invoice_items = list(items or getattr(invoice, "items", []) or [])
         helper = RuleHelper(invoice, invoice_items)
+        if self.mode == "interpreted":
+            return self._evaluate_interpreted(invoice, invoice_items, helper)
+        if self.fused is not None:
+            return self._evaluate_fused(invoice, invoice_items, helper)
+        if self.item_index is not None:
+            return self._evaluate_indexed(invoice, invoice_items, helper)
+
+        results: list[RuleResult] = []
+        invoice_context = {"invoice": invoice, "helpers": helper}
+        for compiled in self.compiled_rules:
+            results.extend(
+                self._evaluate_compiled_rule(
+                    compiled, invoice, invoice_items, invoice_context
+                )
+            )
+        return results
+
+    def evaluate_batch(
+        self,
+        invoices: Sequence[Any],
+        items: Sequence[Iterable[Any] | None] | None = None,
+    ) -> list[list[RuleResult]]:
+        """Avalia várias notas de uma vez; devolve os resultados de cada nota.
+
+        No modo ``compiled``, com numpy instalado, as regras de escopo ``item``
+        são avaliadas por colunas sobre os itens de todas as notas (ver
+        ``VectorizedRuleSet``). Sem numpy, ou nos demais modos, equivale a
+        chamar ``evaluate`` para cada nota.
+        """
+
+        item_lists = [
+            list(
+                (items[index] if items is not None else None)
+                or getattr(invoice, "items", [])
+                or []
+            )
+            for index, invoice in enumerate(invoices)
+        ]
+        vectorized = self._vectorized_rules()
+        if vectorized is None:
+            return [
+                self.evaluate(invoice=invoice, items=invoice_items)
+                for invoice, invoice_items in zip(invoices, item_lists, strict=True)
+            ]
+        return vectorized.evaluate(invoices, item_lists)
+
+    def _vectorized_rules(self) -> VectorizedRuleSet | None:
+        if self.mode != "compiled" or self.collect_statistics:
+            return None
+        if self.vectorized is None:
+            # Import tardio: o vetorizador depende das classes deste módulo.
+            from app.services.rules_vectorized import HAS_NUMPY, VectorizedRuleSet
+
+            if not HAS_NUMPY:
+                return None
+            self.vectorized = VectorizedRuleSet(self)
+        return self.vectorized
+
+    def _evaluate_compiled_rule(
+        self,
+        compiled: CompiledRule,
+        invoice: Any,
+        invoice_items: list[Any],
+        invoice_context: dict[str, Any],
+    ) -> list[RuleResult]:
+        rule = compiled.definition
+        matches = compiled.condition
+        if rule.scope != "item":
+            if matches(invoice_context):
+                return [self._build_result(rule, invoice_context, None, compiled)]
+            return []
+        if not invoice_items:
+            return []
+        if compiled.guard is not None and not compiled.guard(invoice_context):
+            return []
         results: list[RuleResult] = []
+        for item in invoice_items:
+            context = {**invoice_context, "item": item}
+            if matches(context):
+                results.append(self._build_result(rule, context, item, compiled))
+        return results
 
+    def _evaluate_interpreted(
+        self, invoice: Any, invoice_items: list[Any], helper: RuleHelper
+    ) -> list[RuleResult]:
+        results: list[RuleResult] = []
         for rule in self.rules:
             if rule.scope == "item":
                 for item in invoice_items:
@@ -215,6 +765,171 @@ class RuleEngine:
                     results.append(self._build_result(rule, context, None))
         return results
 
+    def _evaluate_indexed(
+        self, invoice: Any, invoice_items: list[Any], helper: RuleHelper
+    ) -> list[RuleResult]:
+        assert self.invoice_index is not None and self.item_index is not None
+        invoice_context = {"invoice": invoice, "helpers": helper}
+        hits: list[list[RuleResult]] = [[] for _ in self.compiled_rules]
+        active = [False] * len(self.compiled_rules)
+        any_active = False
+        for position in self.invoice_index.candidates(invoice):
+            compiled = self.compiled_rules[position]
+            if compiled.definition.scope == "item":
+                if invoice_items and (
+                    compiled.guard is None or compiled.guard(invoice_context)
+                ):
+                    active[position] = any_active = True
+            elif compiled.condition(invoice_context):
+                hits[position].append(
+                    self._build_result(
+                        compiled.definition, invoice_context, None, compiled
+                    )
+                )
+
+        if any_active:
+            for item in invoice_items:
+                context = {"invoice": invoice, "item": item, "helpers": helper}
+                for position in self.item_index.candidates(item):
+                    if not active[position]:
+                        continue
+                    compiled = self.compiled_rules[position]
+                    if compiled.condition(context):
+                        hits[position].append(
+                            self._build_result(
+                                compiled.definition, context, item, compiled
+                            )
+                        )
+        # Mantém a ordem do modo sem índice: por regra e, dentro dela, por item.
+        return [result for rule_hits in hits for result in rule_hits]
+
+    def _evaluate_fused(
+        self, invoice: Any, invoice_items: list[Any], helper: RuleHelper
+    ) -> list[RuleResult]:
+        assert self.fused is not None
+        hits = self.fused(invoice, invoice_items, helper)
+        results: list[RuleResult] = []
+        for rule, rule_hits in zip(self.rules, hits, strict=True):
+            for item, evidence in rule_hits:
+                results.append(self._make_result(rule, item, evidence))
+        return results
+
+    # ------------------------------------------------------------------
+    def _build_indexes(self) -> None:
+        # Import tardio: o índice reaproveita o parser deste módulo.
+        from app.services.rules_index import RuleIndex
+
+        invoice_clauses: dict[int, list[Any]] = {}
+        item_clauses: dict[int, list[Any]] = {}
+        for position, rule in enumerate(self.rules):
+            if rule.scope == "item":
+                guards, condition = split_invoice_guards(rule.when)
+                invoice_clauses[position] = guards
+                item_clauses[position] = (condition or {}).get("all") or []
+            else:
+                invoice_clauses[position] = (rule.when or {}).get("all") or []
+        self.invoice_index = RuleIndex("invoice", invoice_clauses)
+        self.item_index = RuleIndex("item", item_clauses)
+
+    def _compile_rule(self, rule: RuleDefinition) -> CompiledRule:
+        evidence: dict[str, Any] = {}
+        for key, value in (rule.then.get("evidence") or {}).items():
+            if isinstance(value, str):
+                value = self.compiler.compile(value)
+            evidence[key] = value
+
+        # Cláusulas iniciais que só dependem da nota são avaliadas uma vez por
+        # nota, fora do laço de itens; se falharem, a regra nem percorre os itens.
+        guard = None
+        condition = rule.when
+        if rule.scope == "item":
+            guards, condition = split_invoice_guards(rule.when)
+            if guards:
+                guard = self._compile_ordered({"all": guards})
+        return CompiledRule(
+            definition=rule,
+            condition=self._compile_ordered(condition),
+            evidence=evidence,
+            guard=guard,
+        )
+
+    def _compile_ordered(
+        self, condition: dict[str, Any]
+    ) -> Callable[[Mapping[str, Any]], bool]:
+        original = self._compile_condition(condition)
+        if not self.reorder_clauses:
+            return original
+        assert self.statistics is not None
+        reordered = reorder_condition(condition, self.statistics)
+        if reordered == condition:
+            return original
+        optimized = self._compile_condition(reordered)
+
+        def matches(context: Mapping[str, Any]) -> bool:
+            try:
+                return optimized(context)
+            except Exception:
+                # Só comparações simples trocam de lugar, mas um atributo
+                # ausente ainda levanta erro: se a ordem nova falhar, a original
+                # decide o resultado, inclusive o erro.
+                return original(context)
+
+        return matches
+
+    def _compile_condition(
+        self, condition: dict[str, Any]
+    ) -> Callable[[Mapping[str, Any]], bool]:
+        if not condition:
+            return lambda context: True
+
+        all_clauses = [
+            self._compile_clause(clause) for clause in condition.get("all") or []
+        ]
+        any_clauses = [
+            self._compile_clause(clause) for clause in condition.get("any") or []
+        ]
+        negated = (
+            self._compile_condition(condition["not"]) if "not" in condition else None
+        )
+
+        def matches(context: Mapping[str, Any]) -> bool:
+            for clause in all_clauses:
+                if not clause(context):
+                    return False
+            if any_clauses and not any(clause(context) for clause in any_clauses):
+                return False
+            if negated is not None and negated(context):
+                return False
+            return True
+
+        return matches
+
+    def _compile_clause(self, clause: Any) -> Callable[[Mapping[str, Any]], Any]:
+        if isinstance(clause, str):
+            compiled = self.compiler.compile(clause)
+            if self.collect_statistics:
+                assert self.statistics is not None
+                return self._profile_clause(clause, compiled, self.statistics)
+            return compiled
+        if isinstance(clause, dict):
+            return self._compile_condition(clause)
+        raise RuleEvaluationError("Cláusula de condição inválida")
+
+    @staticmethod
+    def _profile_clause(
+        clause: str, compiled: CompiledExpression, statistics: ClauseStatistics
+    ) -> Callable[[Mapping[str, Any]], Any]:
+        clock = time.perf_counter
+
+        def profiled(context: Mapping[str, Any]) -> Any:
+            started = clock()
+            result = compiled(context)
+            statistics.record(clause, clock() - started, bool(result))
+            return result
+
+        return profiled
+
+    # ------------------------------------------------------------------
     def _matches(self, condition: dict[str, Any], context: Mapping[str, Any]) -> bool:
         if not condition:
             return True
@@ -245,20 +960,33 @@ class RuleEngine:
         raise RuleEvaluationError("Cláusula de condição inválida")
 
     def _build_result(
-        self, rule: RuleDefinition, context: Mapping[str, Any], item: Any | None
+        self,
+        rule: RuleDefinition,
+        context: Mapping[str, Any],
+        item: Any | None,
+        compiled: CompiledRule | None = None,
     ) -> RuleResult:
-        then = rule.then
-        evidence_payload = then.get("evidence") or {}
+        evidence_payload = compiled.evidence if compiled else rule.then.get("evidence")
         evidence: dict[str, Any] | None = None
         if evidence_payload:
             evidence = {}
             for key, value in evidence_payload.items():
-                if isinstance(value, str):
-                    evaluated = ExpressionEvaluator(context).evaluate(value)
+                if isinstance(value, CompiledExpression):
+                    evidence[key] = value(context)
+                elif isinstance(value, str):
+                    evidence[key] = ExpressionEvaluator(context).evaluate(value)
                 else:
-                    evaluated = value
-                evidence[key] = self._serialize_value(evaluated)
+                    evidence[key] = value
+        return self._make_result(rule, item, evidence)
 
+    def _make_result(
+        self, rule: RuleDefinition, item: Any | None, evidence: dict[str, Any] | None
+    ) -> RuleResult:
+        then = rule.then
+        if evidence:
+            evidence = {
+                key: self._serialize_value(value) for key, value in evidence.items()
+            }
         references = then.get("references")
         if references:
             references = list(references)
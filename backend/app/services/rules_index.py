@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import ast
+from dataclasses import dataclass
+from typing import Any, Iterable, Mapping
+
+from app.services.rules_engine import parse_expression
+
+_MISSING = object()
+
+
+@dataclass(frozen=True, slots=True)
+class Discriminator:
+    """Predicado necessário de uma regra sobre um atributo do alvo.
+
+    ``kind`` é ``"eq"`` (``alvo.attr == c`` / ``alvo.attr in [c1, c2]``) ou
+    ``"prefix"`` (``alvo.attr.startswith("6")``).
+    """
+
+    kind: str
+    attribute: str
+    values: tuple[Any, ...]
+
+
+def _target_attribute(node: ast.AST, target: str) -> str | None:
+    if (
+        isinstance(node, ast.Attribute)
+        and isinstance(node.value, ast.Name)
+        and node.value.id == target
+    ):
+        return node.attr
+    return None
+
+
+def _constants(node: ast.AST) -> tuple[Any, ...] | None:
+    if isinstance(node, ast.Constant):
+        return (node.value,)
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)) and all(
+        isinstance(element, ast.Constant) for element in node.elts
+    ):
+        return tuple(element.value for element in node.elts)
+    return None
+
+
+def _discriminator(node: ast.AST, target: str) -> Discriminator | None:
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+        left, op, right = node.left, node.ops[0], node.comparators[0]
+        if isinstance(op, ast.Eq):
+            attribute = _target_attribute(left, target)
+            constant = right
+            if attribute is None:
+                attribute, constant = _target_attribute(right, target), left
+            if attribute is not None and isinstance(constant, ast.Constant):
+                return Discriminator("eq", attribute, (constant.value,))
+        elif isinstance(op, ast.In) and not isinstance(right, ast.Constant):
+            attribute = _target_attribute(left, target)
+            values = _constants(right)
+            if attribute is not None and values is not None:
+                return Discriminator("eq", attribute, values)
+        return None
+
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "startswith"
+        and len(node.args) == 1
+        and not node.keywords
+    ):
+        attribute = _target_attribute(node.func.value, target)
+        values = _constants(node.args[0])
+        if (
+            attribute is not None
+            and values
+            and all(isinstance(value, str) for value in values)
+        ):
+            return Discriminator("prefix", attribute, values)
+    return None
+
+
+def extract_discriminators(clause: str, target: str) -> list[Discriminator]:
+    """Predicados indexáveis que precisam ser verdadeiros para a cláusula passar.
+
+    Considera a cláusula inteira ou cada operando de um ``and`` no topo.
+    """
+
+    body = parse_expression(clause).body
+    operands = (
+        body.values
+        if isinstance(body, ast.BoolOp) and isinstance(body.op, ast.And)
+        else [body]
+    )
+    found = []
+    for operand in operands:
+        discriminator = _discriminator(operand, target)
+        if discriminator is not None:
+            found.append(discriminator)
+    return found
+
+
+def _selectivity(discriminator: Discriminator) -> tuple[int, int]:
+    # Igualdade discrimina melhor que prefixo; menos valores, melhor.
+    return (discriminator.kind != "eq", len(discriminator.values))
+
+
+class RuleIndex:
+    """Índice de discriminação (pré-filtro no estilo Rete) para um alvo.
+
+    Cada regra é indexada pelo seu predicado mais seletivo sobre ``target``
+    (``item`` ou ``invoice``), em tabelas hash (igualdade/pertinência) ou de
+    prefixos (``startswith``). ``candidates`` devolve, em ordem, as posições
+    das regras que ainda podem casar com o objeto; regras sem predicado
+    indexável são sempre candidatas. Na dúvida (atributo ausente, valor não
+    hasheável ou que não é texto) o índice devolve as regras daquele atributo,
+    deixando a decisão para a avaliação completa.
+    """
+
+    max_memo_entries = 4096
+
+    def __init__(self, target: str, clauses: Mapping[int, Iterable[Any]]) -> None:
+        self.target = target
+        self.positions = tuple(sorted(clauses))
+        self._always: list[int] = []
+        self._hash: dict[str, dict[Any, list[int]]] = {}
+        self._prefix: dict[str, dict[str, list[int]]] = {}
+        self._by_attribute: dict[str, list[int]] = {}
+        self.indexed_rules = 0
+
+        for position in self.positions:
+            discriminators = [
+                discriminator
+                for clause in clauses[position]
+                if isinstance(clause, str)
+                for discriminator in extract_discriminators(clause, target)
+            ]
+            if not discriminators:
+                self._always.append(position)
+                continue
+            best = min(discriminators, key=_selectivity)
+            table = self._hash if best.kind == "eq" else self._prefix
+            buckets = table.setdefault(best.attribute, {})
+            for value in dict.fromkeys(best.values):
+                buckets.setdefault(value, []).append(position)
+            self._by_attribute.setdefault(best.attribute, []).append(position)
+            self.indexed_rules += 1
+
+        self._attributes = tuple(self._by_attribute)
+        self._prefix_lengths = {
+            attribute: sorted({len(prefix) for prefix in buckets})
+            for attribute, buckets in self._prefix.items()
+        }
+        self._memo: dict[tuple[Any, ...], tuple[int, ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def candidates(self, obj: Any) -> tuple[int, ...]:
+        values = tuple(
+            getattr(obj, attribute, _MISSING) for attribute in self._attributes
+        )
+        try:
+            return self._memo[values]
+        except KeyError:
+            pass
+        except TypeError:
+            return self._lookup(values)
+        result = self._lookup(values)
+        if len(self._memo) >= self.max_memo_entries:
+            self._memo.clear()
+        self._memo[values] = result
+        return result
+
+    def _lookup(self, values: tuple[Any, ...]) -> tuple[int, ...]:
+        selected = set(self._always)
+        for attribute, value in zip(self._attributes, values, strict=True):
+            if value is _MISSING:
+                selected.update(self._by_attribute[attribute])
+                continue
+            buckets = self._hash.get(attribute)
+            if buckets:
+                try:
+                    selected.update(buckets.get(value, ()))
+                except TypeError:
+                    selected.update(self._by_attribute[attribute])
+                    continue
+            prefixes = self._prefix.get(attribute)
+            if prefixes:
+                if not isinstance(value, str):
+                    selected.update(self._by_attribute[attribute])
+                    continue
+                for length in self._prefix_lengths[attribute]:
+                    if length > len(value):
+                        break
+                    selected.update(prefixes.get(value[:length], ()))
+        return tuple(sorted(selected))
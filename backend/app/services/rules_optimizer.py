@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import ast
+import math
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Mapping
+
+
+@dataclass(slots=True)
+class ClauseStat:
+    evaluations: int = 0
+    passes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def pass_rate(self) -> float:
+        return self.passes / self.evaluations if self.evaluations else 0.0
+
+    @property
+    def mean_cost(self) -> float:
+        return self.seconds / self.evaluations if self.evaluations else 0.0
+
+
+class ClauseStatistics:
+    """Custo e seletividade observados por cláusula da DSL.
+
+    As estatísticas são coletadas por um ``RuleEngine`` construído com
+    ``statistics=...`` e ``collect_statistics=True`` e podem ser serializadas
+    (``to_dict``/``from_dict``) para alimentar a reordenação de cláusulas em
+    execuções seguintes.
+    """
+
+    def __init__(self, *, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._stats: dict[str, ClauseStat] = {}
+        self._lock = threading.Lock()
+
+    def record(self, clause: str, seconds: float, passed: bool) -> None:
+        with self._lock:
+            stat = self._stats.get(clause)
+            if stat is None:
+                stat = self._stats[clause] = ClauseStat()
+            stat.evaluations += 1
+            stat.passes += int(passed)
+            stat.seconds += seconds
+
+    def get(self, clause: str) -> ClauseStat | None:
+        return self._stats.get(clause)
+
+    def rank(self, clause: Any, block: str) -> float:
+        """Custo esperado por decisão; menor significa avaliar antes.
+
+        Em ``all`` a cláusula decide quando falha, em ``any`` quando passa. A
+        ordem ótima para cláusulas independentes é crescente em
+        ``custo / probabilidade de decidir``. Cláusulas sem amostras suficientes
+        (ou blocos aninhados) ficam no fim, preservando a ordem original.
+        """
+
+        if not isinstance(clause, str):
+            return math.inf
+        stat = self._stats.get(clause)
+        if stat is None or stat.evaluations < self.min_samples:
+            return math.inf
+        decisive = 1.0 - stat.pass_rate if block == "all" else stat.pass_rate
+        if decisive <= 0:
+            return math.inf
+        return stat.mean_cost / decisive
+
+    def to_dict(self) -> dict[str, dict[str, float]]:
+        return {
+            clause: {
+                "evaluations": stat.evaluations,
+                "passes": stat.passes,
+                "seconds": stat.seconds,
+            }
+            for clause, stat in self._stats.items()
+        }
+
+    @classmethod
+    def from_dict(
+        cls, payload: Mapping[str, Mapping[str, Any]], *, min_samples: int = 20
+    ) -> "ClauseStatistics":
+        statistics = cls(min_samples=min_samples)
+        for clause, values in payload.items():
+            statistics._stats[clause] = ClauseStat(
+                evaluations=int(values.get("evaluations", 0)),
+                passes=int(values.get("passes", 0)),
+                seconds=float(values.get("seconds", 0.0)),
+            )
+        return statistics
+
+
+def reorder_condition(
+    condition: dict[str, Any], statistics: ClauseStatistics
+) -> dict[str, Any]:
+    """Reordena as cláusulas comutativas de ``all``/``any`` pelo custo esperado.
+
+    Só trocam de lugar cláusulas vizinhas que não podem levantar erro (ver
+    ``is_reorderable``); as demais ficam onde estão e separam os trechos
+    reordenáveis. Assim a ordem nova nunca pula uma cláusula que falharia na
+    ordem original nem avalia antes uma cláusula que outra protegia.
+    """
+
+    if not condition:
+        return condition
+    reordered = dict(condition)
+    for block in ("all", "any"):
+        clauses = condition.get(block)
+        if not clauses:
+            continue
+        result: list[Any] = []
+        run: list[Any] = []
+        for clause in clauses:
+            if is_reorderable(clause):
+                run.append(clause)
+                continue
+            result.extend(_sorted_run(run, block, statistics))
+            run = []
+            result.append(
+                reorder_condition(clause, statistics)
+                if isinstance(clause, dict)
+                else clause
+            )
+        result.extend(_sorted_run(run, block, statistics))
+        reordered[block] = result
+    if "not" in condition:
+        reordered["not"] = reorder_condition(condition["not"], statistics)
+    return reordered
+
+
+def _sorted_run(
+    run: list[Any], block: str, statistics: ClauseStatistics
+) -> list[Any]:
+    return sorted(run, key=lambda clause: statistics.rank(clause, block))
+
+
+_SAFE_COMPARISONS = (ast.Eq, ast.NotEq, ast.Is, ast.IsNot)
+_MEMBERSHIP = (ast.In, ast.NotIn)
+
+
+def is_reorderable(clause: Any) -> bool:
+    """Indica se a cláusula não levanta erro, qualquer que seja a ordem.
+
+    Vale para comparações de um atributo direto do contexto (``item.ncm``,
+    ``invoice.uf``) com constantes por ``==``, ``!=``, ``is``/``is not`` ou
+    ``in``/``not in`` com uma lista de constantes. Qualquer outra expressão
+    (métodos, aritmética, ``<`` com ``None``, helpers) pode falhar em casos
+    que uma cláusula anterior descartaria.
+    """
+
+    return isinstance(clause, str) and _is_safe_comparison(clause)
+
+
+@lru_cache(maxsize=4096)
+def _is_safe_comparison(expression: str) -> bool:
+    # Import tardio: o motor importa este módulo.
+    from app.services.rules_engine import parse_expression
+
+    try:
+        node = parse_expression(expression).body
+    except Exception:
+        return False
+    if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+        return False
+    operator, left, right = node.ops[0], node.left, node.comparators[0]
+    if isinstance(operator, _MEMBERSHIP):
+        return _is_field(left) and _is_constant_collection(right)
+    if isinstance(operator, _SAFE_COMPARISONS):
+        return (_is_field(left) and _is_constant(right)) or (
+            _is_constant(left) and _is_field(right)
+        )
+    return False
+
+
+def _is_field(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Attribute)
+        and isinstance(node.value, ast.Name)
+        and not node.attr.startswith("_")
+    )
+
+
+def _is_constant(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant)
+
+
+def _is_constant_collection(node: ast.AST) -> bool:
+    return isinstance(node, (ast.List, ast.Tuple, ast.Set)) and all(
+        _is_constant(element) for element in node.elts
+    )
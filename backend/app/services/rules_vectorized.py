@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+import ast
+from operator import attrgetter
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Callable, Sequence
+
+from app.services.rules_engine import (
+    ExpressionEvaluator,
+    RuleEvaluationError,
+    RuleHelper,
+    RuleResult,
+    parse_expression,
+)
+
+try:  # pragma: no cover - dependência opcional
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+if TYPE_CHECKING:  # pragma: no cover
+    from app.services.rules_engine import CompiledRule, RuleEngine
+
+HAS_NUMPY = np is not None
+
+_MISSING = object()
+_SIMPLE_TYPES = (str, int, bool, type(None))
+# Helpers sem estado, que podem ser avaliados por valor distinto da coluna.
+_PURE_HELPERS = frozenset({"value_or"})
+_PURE_HELPER = RuleHelper(None, [])
+
+
+class _UnsupportedExpressionError(Exception):
+    """Construção que o vetorizador não sabe transformar em máscara."""
+
+
+class _ScalarFallbackError(Exception):
+    """Alguma linha ativa levantaria erro: a regra volta ao avaliador escalar."""
+
+
+def _category_key(value: Any) -> Any:
+    # Tipo + valor (ou repr) evita fundir 1, 1.0, True e Decimal("1.00"), que
+    # são iguais para o dicionário mas podem divergir em expressões. Textos,
+    # o caso comum, são a própria chave.
+    value_type = type(value)
+    if value_type is str:
+        return value
+    if value_type in _SIMPLE_TYPES:
+        return value_type, value
+    return value_type, repr(value)
+
+
+class ColumnBatch:
+    """Itens de várias notas dispostos em colunas codificadas por dicionário.
+
+    Cada coluna guarda um vetor de códigos inteiros e a lista de valores
+    distintos. Predicados sobre uma única coluna são avaliados uma vez por
+    valor distinto e projetados nas linhas por indexação.
+    """
+
+    def __init__(
+        self, invoices: Sequence[Any], item_lists: Sequence[list[Any]]
+    ) -> None:
+        assert np is not None
+        self.invoices = invoices
+        self.helpers = [
+            RuleHelper(invoice, items)
+            for invoice, items in zip(invoices, item_lists, strict=True)
+        ]
+        self.items = [item for items in item_lists for item in items]
+        self.row_invoice = np.repeat(
+            np.arange(len(invoices), dtype=np.intp),
+            [len(items) for items in item_lists],
+        )
+        self.size = len(self.items)
+        self._columns: dict[str, tuple[Any, list[Any]]] = {}
+        self._leaves: dict[str, tuple[Any, Any]] = {}
+
+    def invoice_context(self, index: int) -> dict[str, Any]:
+        return {"invoice": self.invoices[index], "helpers": self.helpers[index]}
+
+    def column(self, attribute: str) -> tuple[Any, list[Any]]:
+        cached = self._columns.get(attribute)
+        if cached is not None:
+            return cached
+        index: dict[Any, int] = {}
+        categories: list[Any] = []
+        row_codes: list[int] = []
+        append = row_codes.append
+        try:
+            values = list(map(attrgetter(attribute), self.items))
+        except AttributeError:
+            values = [getattr(item, attribute, _MISSING) for item in self.items]
+        for value in values:
+            key = value if type(value) is str else _category_key(value)
+            code = index.get(key)
+            if code is None:
+                code = index[key] = len(categories)
+                categories.append(value)
+            append(code)
+        codes = np.fromiter(row_codes, dtype=np.intp, count=self.size)
+        self._columns[attribute] = (codes, categories)
+        return codes, categories
+
+    def invariant_leaf(self, source: str, evaluator: Callable) -> tuple[Any, Any]:
+        """Verdade/erro por linha de uma expressão que só depende da nota."""
+
+        cached = self._leaves.get(source)
+        if cached is not None:
+            return cached
+        count = len(self.invoices)
+        truth = np.zeros(count, dtype=bool)
+        errors = np.zeros(count, dtype=bool)
+        for index in range(count):
+            try:
+                truth[index] = bool(evaluator(self.invoice_context(index)))
+            except Exception:
+                errors[index] = True
+        result = (truth[self.row_invoice], errors[self.row_invoice])
+        self._leaves[source] = result
+        return result
+
+    def column_leaf(
+        self, source: str, attribute: str, evaluator: Callable
+    ) -> tuple[Any, Any]:
+        """Verdade/erro por linha de um predicado sobre ``item.<attribute>``."""
+
+        cached = self._leaves.get(source)
+        if cached is not None:
+            return cached
+        codes, categories = self.column(attribute)
+        truth = np.zeros(len(categories), dtype=bool)
+        errors = np.zeros(len(categories), dtype=bool)
+        for code, value in enumerate(categories):
+            item = (
+                SimpleNamespace()
+                if value is _MISSING
+                else SimpleNamespace(**{attribute: value})
+            )
+            try:
+                truth[code] = bool(evaluator({"item": item, "helpers": _PURE_HELPER}))
+            except Exception:
+                errors[code] = True
+        result = (truth[codes], errors[codes])
+        self._leaves[source] = result
+        return result
+
+
+MaskFunction = Callable[[ColumnBatch, Any], Any]
+
+
+class _MaskBuilder:
+    """Transforma condições da DSL em funções ``(batch, ativos) -> máscara``.
+
+    A máscara devolvida contém apenas linhas ativas em que a condição é
+    verdadeira. ``and``/``or``/``not`` e os blocos ``all``/``any``/``not``
+    estreitam o conjunto de linhas ativas como o curto-circuito do avaliador
+    escalar, de modo que erros só contam em linhas que o escalar avaliaria.
+    """
+
+    _builtins = frozenset(ExpressionEvaluator.allowed_builtins)
+
+    def __init__(self, engine: RuleEngine) -> None:
+        self.compiler = engine.compiler
+
+    def condition(self, condition: dict[str, Any]) -> MaskFunction:
+        if not condition:
+            return lambda batch, active: active
+        all_masks = [self.clause(clause) for clause in condition.get("all") or []]
+        any_masks = [self.clause(clause) for clause in condition.get("any") or []]
+        negated = self.condition(condition["not"]) if "not" in condition else None
+
+        def mask(batch: ColumnBatch, active: Any) -> Any:
+            for clause in all_masks:
+                active = clause(batch, active)
+            if any_masks:
+                matched = np.zeros_like(active)
+                remaining = active
+                for clause in any_masks:
+                    passed = clause(batch, remaining)
+                    matched |= passed
+                    remaining = remaining & ~passed
+                active = matched
+            if negated is not None:
+                active = active & ~negated(batch, active)
+            return active
+
+        return mask
+
+    def clause(self, clause: Any) -> MaskFunction:
+        if isinstance(clause, dict):
+            return self.condition(clause)
+        if isinstance(clause, str):
+            return self.node(parse_expression(clause).body)
+        raise RuleEvaluationError("Cláusula de condição inválida")
+
+    def node(self, node: ast.AST) -> MaskFunction:
+        if isinstance(node, ast.BoolOp):
+            operands = [self.node(value) for value in node.values]
+            if isinstance(node.op, ast.And):
+
+                def conjunction(batch: ColumnBatch, active: Any) -> Any:
+                    for operand in operands:
+                        active = operand(batch, active)
+                    return active
+
+                return conjunction
+
+            def disjunction(batch: ColumnBatch, active: Any) -> Any:
+                matched = np.zeros_like(active)
+                remaining = active
+                for operand in operands:
+                    passed = operand(batch, remaining)
+                    matched |= passed
+                    remaining = remaining & ~passed
+                return matched
+
+            return disjunction
+
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self.node(node.operand)
+            return lambda batch, active: active & ~operand(batch, active)
+
+        return self.leaf(node)
+
+    def leaf(self, node: ast.AST) -> MaskFunction:
+        source = ast.unparse(node)
+        evaluator = self.compiler.compile(source)
+        names = {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+        if "item" not in names:
+
+            def invariant(batch: ColumnBatch, active: Any) -> Any:
+                truth, errors = batch.invariant_leaf(source, evaluator)
+                return _apply(truth, errors, active)
+
+            return invariant
+
+        attribute = self._single_attribute(node, names)
+
+        def column(batch: ColumnBatch, active: Any) -> Any:
+            truth, errors = batch.column_leaf(source, attribute, evaluator)
+            return _apply(truth, errors, active)
+
+        return column
+
+    def _single_attribute(self, node: ast.AST, names: set[str]) -> str:
+        if not names <= {"item", "helpers"} | self._builtins:
+            raise _UnsupportedExpressionError(ast.unparse(node))
+        parents = {
+            id(child): parent
+            for parent in ast.walk(node)
+            for child in ast.iter_child_nodes(parent)
+        }
+        attributes = set()
+        for child in ast.walk(node):
+            if not isinstance(child, ast.Name):
+                continue
+            parent = parents.get(id(child))
+            if not isinstance(parent, ast.Attribute):
+                raise _UnsupportedExpressionError(ast.unparse(node))
+            if child.id == "item":
+                attributes.add(parent.attr)
+            elif child.id == "helpers":
+                call = parents.get(id(parent))
+                if (
+                    parent.attr not in _PURE_HELPERS
+                    or not isinstance(call, ast.Call)
+                    or call.func is not parent
+                ):
+                    raise _UnsupportedExpressionError(ast.unparse(node))
+        if len(attributes) != 1:
+            raise _UnsupportedExpressionError(ast.unparse(node))
+        return attributes.pop()
+
+
+def _apply(truth: Any, errors: Any, active: Any) -> Any:
+    if (errors & active).any():
+        raise _ScalarFallbackError
+    return truth & active
+
+
+class VectorizedRuleSet:
+    """Avaliação em lote, por colunas, das regras de escopo ``item``.
+
+    As regras cujas condições podem ser decompostas em predicados de uma
+    coluna (``item.ncm in [...]``, ``item.cfop.startswith("6")``,
+    ``helpers.value_or(item.icms_st_value, 0) == 0``) e em expressões que só
+    dependem da nota viram máscaras NumPy; apenas as linhas que casam são
+    materializadas em ``RuleResult``. As demais regras, e qualquer regra cuja
+    avaliação levantaria erro em alguma linha, usam o avaliador escalar.
+    """
+
+    def __init__(self, engine: RuleEngine) -> None:
+        if np is None:
+            raise RuntimeError("Avaliação vetorizada requer numpy")
+        self.engine = engine
+        builder = _MaskBuilder(engine)
+        self.masks: list[MaskFunction | None] = []
+        for compiled in engine.compiled_rules:
+            mask = None
+            if compiled.definition.scope == "item":
+                try:
+                    mask = builder.condition(compiled.definition.when)
+                except _UnsupportedExpressionError:
+                    mask = None
+            self.masks.append(mask)
+
+    @property
+    def vectorized_rules(self) -> int:
+        return sum(mask is not None for mask in self.masks)
+
+    def evaluate(
+        self, invoices: Sequence[Any], item_lists: Sequence[list[Any]]
+    ) -> list[list[RuleResult]]:
+        batch = ColumnBatch(invoices, item_lists)
+        all_rows = np.ones(batch.size, dtype=bool)
+        hits: list[list[RuleResult]] = [[] for _ in invoices]
+        for compiled, mask in zip(self.engine.compiled_rules, self.masks, strict=True):
+            if mask is not None:
+                try:
+                    matched = mask(batch, all_rows)
+                except _ScalarFallbackError:
+                    pass
+                else:
+                    self._materialize(batch, compiled, matched, hits)
+                    continue
+            for index, items in enumerate(item_lists):
+                hits[index].extend(
+                    self.engine._evaluate_compiled_rule(
+                        compiled,
+                        invoices[index],
+                        items,
+                        batch.invoice_context(index),
+                    )
+                )
+        return hits
+
+    def _materialize(
+        self,
+        batch: ColumnBatch,
+        compiled: CompiledRule,
+        matched: Any,
+        hits: list[list[RuleResult]],
+    ) -> None:
+        rule = compiled.definition
+        for row in np.flatnonzero(matched):
+            index = int(batch.row_invoice[row])
+            item = batch.items[row]
+            context = {**batch.invoice_context(index), "item": item}
+            hits[index].append(self.engine._build_result(rule, context, item, compiled))
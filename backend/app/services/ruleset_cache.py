@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.services.rules_dsl import RuleDefinition, RuleDocument
+from app.services.rules_engine import RuleEngine
+
+RuleSetKey = tuple[int, int | None]
+RuleSetVersions = tuple[str, str | None]
+
+
+@dataclass(slots=True)
+class CachedRuleSet:
+    """Conjunto composto (baseline + override) já validado e pronto para uso.
+
+    Não guarda objetos ORM: pode ser compartilhado entre sessões e threads.
+    O ``RuleEngine`` é compilado na primeira vez em que é pedido.
+    """
+
+    versions: RuleSetVersions
+    document: RuleDocument
+    rules: list[RuleDefinition]
+    yaml: str
+    _engine: RuleEngine | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def engine(self) -> RuleEngine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = RuleEngine(self.rules)
+        return self._engine
+
+
+class RuleSetCache:
+    """LRU de conjuntos compostos por ``(baseline.id, override.id)``.
+
+    ``RuleSetService.compose_for_org`` continua consultando a tabela
+    ``rulesets`` para descobrir as versões vigentes; a chave e as versões
+    funcionam como verificação contra o banco, de modo que uma nova versão
+    salva em qualquer processo é percebida na consulta seguinte. Gravações
+    locais (``save_global``/``save_override``) ainda removem as entradas do
+    registro substituído, que não seriam mais pedidas.
+    """
+
+    def __init__(self, max_entries: int = 32) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[RuleSetKey, CachedRuleSet] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_build(
+        self,
+        key: RuleSetKey,
+        versions: RuleSetVersions,
+        build: Callable[[], CachedRuleSet],
+    ) -> CachedRuleSet:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.versions == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # A composição acontece fora do lock; duas threads podem compor a mesma
+        # chave ao mesmo tempo, e a última gravação vence.
+        entry = build()
+        if self.max_entries <= 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, ruleset_id: int | None = None) -> None:
+        """Remove as entradas que usam ``ruleset_id`` (ou todas)."""
+
+        with self._lock:
+            if ruleset_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if ruleset_id in key]:
+                del self._entries[key]
+
+    def stats(self) -> dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+ruleset_cache = RuleSetCache(max_entries=settings.ruleset_cache_size)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import copy
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Any
@@ -13,6 +14,8 @@ from app.services.rules_dsl import (
     RuleDocument,
     RuleDSLParser,
 )
+from app.services.rules_engine import RuleEngine
+from app.services.ruleset_cache import CachedRuleSet, ruleset_cache
 
 
 @dataclass(slots=True)
@@ -23,6 +26,14 @@ class ComposedRuleSet:
     rules: list[RuleDefinition]
     yaml: str
     metadata: dict[str, Any]
+    compiled: CachedRuleSet | None = None
+
+    def build_engine(self) -> RuleEngine:
+        """Motor do conjunto; reaproveita o já compilado quando vem do cache."""
+
+        if self.compiled is not None:
+            return self.compiled.engine()
+        return RuleEngine(self.rules)
 
 
 class RuleSetService:
@@ -58,6 +69,7 @@ class RuleSetService:
         created_by: int | None = None,
     ) -> RuleSet:
         document = self.parser.parse(yaml_text)
+        superseded = self.get_latest_global()
         record = RuleSet(
             name=name or document.name or "Baseline Global",
             version=version or document.version or self._timestamp_version(),
@@ -67,6 +79,9 @@ class RuleSetService:
         )
         self.session.add(record)
         self.session.flush()
+        # Composições com o baseline anterior não serão mais pedidas.
+        if superseded is not None:
+            ruleset_cache.invalidate(superseded.id)
         return record
 
     def save_override(
@@ -79,6 +94,7 @@ class RuleSetService:
         created_by: int | None = None,
     ) -> RuleSet:
         document = self.parser.parse(yaml_text)
+        superseded = self.get_latest_override(org_id)
         record = RuleSet(
             org_id=org_id,
             name=name or document.name or f"Override org {org_id}",
@@ -88,6 +104,10 @@ class RuleSetService:
         )
         self.session.add(record)
         self.session.flush()
+        # A entrada ``(baseline, None)`` de uma org sem override anterior é
+        # compartilhada com as demais orgs sem override e continua valendo.
+        if superseded is not None:
+            ruleset_cache.invalidate(superseded.id)
         return record
 
     # ------------------------------------------------------------------
@@ -96,22 +116,16 @@ class RuleSetService:
         if not baseline:
             raise ValueError("Nenhum baseline global cadastrado.")
 
-        baseline_doc = self.parser.materialize(baseline.content or {})
         override = self.get_latest_override(org_id)
-        override_doc = (
-            self.parser.materialize(override.content or {}) if override else RuleDocument()
-        )
-
-        rules = self.composer.compose(baseline_doc.rules, override_doc.rules)
-        merged_metadata = {**baseline_doc.metadata}
-        merged_metadata.update(override_doc.metadata)
 
-        merged_document = RuleDocument(
-            name=override_doc.name or baseline_doc.name,
-            version=override_doc.version or baseline_doc.version,
-            metadata=merged_metadata,
-            rules=rules,
+        # As consultas acima são a verificação de versão: o parse, a validação
+        # e a composição só rodam quando baseline/override mudam.
+        compiled = ruleset_cache.get_or_build(
+            (baseline.id, override.id if override else None),
+            (baseline.version, override.version if override else None),
+            lambda: self._compose(baseline, override),
         )
+        merged_document = compiled.document
 
         metadata = {
             "sources": {
@@ -120,16 +134,40 @@ class RuleSetService:
                     {"id": override.id, "version": override.version} if override else None
                 ),
             },
-            "document": merged_metadata,
+            "document": copy.deepcopy(merged_document.metadata),
         }
 
         return ComposedRuleSet(
             baseline=baseline,
             override=override,
             document=merged_document,
+            rules=list(compiled.rules),
+            yaml=compiled.yaml,
+            metadata=metadata,
+            compiled=compiled,
+        )
+
+    def _compose(self, baseline: RuleSet, override: RuleSet | None) -> CachedRuleSet:
+        baseline_doc = self.parser.materialize(baseline.content or {})
+        override_doc = (
+            self.parser.materialize(override.content or {}) if override else RuleDocument()
+        )
+
+        rules = self.composer.compose(baseline_doc.rules, override_doc.rules)
+        merged_metadata = {**baseline_doc.metadata}
+        merged_metadata.update(override_doc.metadata)
+
+        merged_document = RuleDocument(
+            name=override_doc.name or baseline_doc.name,
+            version=override_doc.version or baseline_doc.version,
+            metadata=merged_metadata,
+            rules=rules,
+        )
+        return CachedRuleSet(
+            versions=(baseline.version, override.version if override else None),
+            document=merged_document,
             rules=rules,
             yaml=merged_document.to_yaml(),
-            metadata=metadata,
         )
 
     # ------------------------------------------------------------------
@@ -4,6 +4,7 @@ from functools import lru_cache
 
 from app.core.config import settings
 from app.services.storage.base import StorageBackend
+from app.services.storage.cache import CachedStorageBackend, DiskCache
 from app.services.storage.local import LocalStorageBackend
 
 try:
@@ -21,7 +22,17 @@ def _get_local_backend() -> StorageBackend:
 def _get_s3_backend() -> StorageBackend:
     if S3StorageBackend is None:
         raise RuntimeError("Backend S3/MinIO indisponível: dependências não carregadas")
-    return S3StorageBackend()
+    backend: StorageBackend = S3StorageBackend()
+    if settings.storage_cache_dir:
+        backend = CachedStorageBackend(
+            backend,
+            DiskCache(
+                settings.storage_cache_dir,
+                max_bytes=settings.storage_cache_max_bytes,
+                max_object_size=settings.storage_cache_max_object_size,
+            ),
+        )
+    return backend
 
 
 def get_storage_backend(name: str | None = None) -> StorageBackend:
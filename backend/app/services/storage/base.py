@@ -1,7 +1,25 @@
 from __future__ import annotations
 
+import io
+import os
 from dataclasses import dataclass
-from typing import Protocol
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Callable,
+    ContextManager,
+    Iterator,
+    Protocol,
+    Sequence,
+    Union,
+)
+
+# Tamanho dos blocos lidos/escritos ao copiar arquivos entre disco, rede e hash.
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Conteúdo aceito por ``store``: bytes em memória ou arquivo binário aberto
+# (ex.: o temporário de um upload), lido em blocos a partir da posição atual.
+StorageContent = Union[bytes, BinaryIO]
 
 
 @dataclass(slots=True)
@@ -13,6 +31,15 @@ class StoredObject:
     size: int | None = None
 
 
+@dataclass(slots=True)
+class ObjectStat:
+    """Metadados de um objeto armazenado, sem ler o conteúdo."""
+
+    path: str
+    size: int
+    content_type: str | None = None
+
+
 class StorageBackend(Protocol):
     """Interface simples para serviços de storage."""
 
@@ -23,10 +50,146 @@ class StorageBackend(Protocol):
         *,
         org_id: int,
         file_name: str,
-        content: bytes,
+        content: StorageContent,
         content_type: str | None = None,
     ) -> StoredObject:
         ...
 
     def read(self, *, path: str) -> bytes:
         ...
+
+    def read_many(
+        self, *, paths: Sequence[str], concurrency: int | None = None
+    ) -> list[bytes]:
+        """Conteúdo de vários objetos, na ordem de ``paths``."""
+        ...
+
+    def stream(
+        self, *, path: str, offset: int = 0, length: int | None = None
+    ) -> Iterator[bytes]:
+        """Blocos do objeto a partir de ``offset`` (``length`` bytes ou até o fim)."""
+        ...
+
+    def stat(self, *, path: str) -> ObjectStat:
+        """Tamanho e tipo do objeto; ``FileNotFoundError`` se não existir."""
+        ...
+
+    def read_range(self, *, path: str, offset: int, length: int) -> bytes:
+        """``length`` bytes a partir de ``offset`` (menos se o objeto acabar antes)."""
+        ...
+
+    def open(self, *, path: str) -> BinaryIO:
+        """Arquivo somente leitura e com ``seek``, lido por faixas sob demanda."""
+        ...
+
+    def local_file(self, *, path: str) -> ContextManager[Path]:
+        """Caminho local do objeto; backends remotos baixam para um temporário."""
+        ...
+
+    def delete(self, *, path: str) -> None:
+        """Remove o objeto; ignorar objetos que já não existem."""
+        ...
+
+
+def iter_chunks(
+    stream: BinaryIO, chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[bytes]:
+    while chunk := stream.read(chunk_size):
+        yield chunk
+
+
+def iter_file_range(
+    path: str | os.PathLike, *, offset: int = 0, length: int | None = None
+) -> Iterator[bytes]:
+    """Blocos de um arquivo em disco a partir de ``offset`` (``length`` bytes)."""
+
+    remaining = length
+    with Path(path).open("rb") as source:
+        source.seek(offset)
+        while remaining is None or remaining > 0:
+            size = STREAM_CHUNK_SIZE
+            if remaining is not None:
+                size = min(size, remaining)
+            chunk = source.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class RangeReader(io.RawIOBase):
+    """Arquivo somente leitura sobre ``fetch(offset, length)`` (ex.: ``Range`` GET).
+
+    Cada busca traz ao menos ``read_ahead`` bytes, e as leituras seguintes
+    dentro desse bloco não vão ao backend: quem lê em sequência (membros
+    vizinhos de um ZIP) faz poucas requisições, e quem pula para o fim do
+    arquivo (diretório central) não baixa o começo. ``read`` só devolve menos
+    que o pedido no fim do objeto, como um arquivo em disco.
+    """
+
+    def __init__(
+        self,
+        *,
+        size: int,
+        fetch: Callable[[int, int], bytes],
+        read_ahead: int = STREAM_CHUNK_SIZE,
+        name: str | None = None,
+    ) -> None:
+        super().__init__()
+        self.size = size
+        self.name = name
+        self._fetch = fetch
+        self._read_ahead = max(1, read_ahead)
+        self._position = 0
+        self._block = b""
+        self._block_start = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"whence inválido: {whence}")
+        if position < 0:
+            raise ValueError("Posição negativa")
+        self._position = position
+        return position
+
+    def readinto(self, buffer: bytearray | memoryview) -> int:  # type: ignore[override]
+        view = memoryview(buffer).cast("B")
+        wanted = max(0, min(len(view), self.size - self._position))
+        filled = 0
+        while filled < wanted:
+            position = self._position + filled
+            offset = position - self._block_start
+            if not 0 <= offset < len(self._block):
+                length = min(
+                    max(wanted - filled, self._read_ahead), self.size - position
+                )
+                self._block = self._fetch(position, length)
+                self._block_start = position
+                offset = 0
+                if not self._block:
+                    break
+            taken = min(wanted - filled, len(self._block) - offset)
+            view[filled : filled + taken] = self._block[offset : offset + taken]
+            filled += taken
+        self._position += filled
+        return filled
+
+    def close(self) -> None:
+        self._block = b""
+        super().close()
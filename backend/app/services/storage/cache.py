@@ -0,0 +1,345 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Sequence
+
+from prometheus_client import Counter
+
+from app.services.storage.base import (
+    ObjectStat,
+    StorageBackend,
+    StorageContent,
+    StoredObject,
+    iter_file_range,
+)
+
+CACHE_REQUESTS = Counter(
+    "storage_cache_requests_total",
+    "Leituras do cache de disco do storage",
+    ["result"],
+)
+CACHE_EVICTIONS = Counter(
+    "storage_cache_evictions_total", "Entradas removidas do cache de disco do storage"
+)
+CACHE_EVICTED_BYTES = Counter(
+    "storage_cache_evicted_bytes_total", "Bytes removidos do cache de disco do storage"
+)
+
+# Locks de preenchimento por faixa de chave: um arquivo por prefixo, em vez de
+# um por objeto, para não acumular arquivos vazios no diretório do cache.
+_LOCK_STRIPES = 256
+# Temporários abandonados (processo morto no meio da cópia) saem na limpeza.
+_STALE_TEMP_SECONDS = 3600
+
+
+class DiskCache:
+    """Cache em disco com limite de tamanho, compartilhado entre processos.
+
+    Cada entrada fica em ``<dir>/<xx>/<sha256(chave)>-<sha256>-<tamanho>``: é
+    escrita em um temporário no mesmo diretório e publicada com ``os.replace``
+    (quem lê nunca vê um arquivo pela metade), com o hash calculado durante a
+    gravação. ``get`` confere só o tamanho, para que leituras por faixa não
+    releiam o arquivo inteiro; ``read``, que já tem os bytes em memória,
+    confere o hash. Entradas inválidas são descartadas. O preenchimento de
+    uma chave é serializado por ``flock`` para que processos do mesmo host não
+    baixem o mesmo objeto ao mesmo tempo. A remoção é LRU pelo ``mtime``,
+    atualizado a cada acerto, e derruba o cache para 90% de ``max_bytes``.
+    """
+
+    def __init__(
+        self, directory: str | os.PathLike, *, max_bytes: int, max_object_size: int
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_object_size = min(max_object_size, max_bytes)
+        (self.directory / "locks").mkdir(parents=True, exist_ok=True)
+        # Estimativa local do tamanho; a varredura da limpeza corrige o valor.
+        self._size: int | None = None
+
+    def get(self, key: str) -> Path | None:
+        """Caminho da entrada de ``key`` com o tamanho esperado, ou ``None``."""
+
+        shard, digest = self._locate(key)
+        for entry in shard.glob(f"{digest}-*"):
+            try:
+                valid = entry.stat().st_size == _content_size(entry)
+            except FileNotFoundError:  # removida por outro processo
+                continue
+            if valid and self._touch(entry):
+                return entry
+            if not valid:
+                self._discard(entry)
+        return None
+
+    def read(self, key: str) -> bytes | None:
+        """Conteúdo da entrada válida de ``key``, lido e conferido de uma vez."""
+
+        shard, digest = self._locate(key)
+        for entry in shard.glob(f"{digest}-*"):
+            try:
+                content = entry.read_bytes()
+            except FileNotFoundError:
+                continue
+            if (
+                len(content) != _content_size(entry)
+                or hashlib.sha256(content).hexdigest() != _content_hash(entry)
+            ):
+                self._discard(entry)
+                continue
+            self._touch(entry)
+            return content
+        return None
+
+    def put(self, key: str, chunks: Iterable[bytes]) -> Path:
+        """Grava ``chunks`` como a entrada de ``key`` e devolve o caminho final."""
+
+        shard, digest = self._locate(key)
+        shard.mkdir(exist_ok=True)
+        descriptor, temp_name = tempfile.mkstemp(dir=shard, prefix=".tmp-")
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(descriptor, "wb") as target:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    target.write(chunk)
+                    size += len(chunk)
+            entry = shard / f"{digest}-{hasher.hexdigest()}-{size}"
+            os.replace(temp_name, entry)
+        except BaseException:
+            Path(temp_name).unlink(missing_ok=True)
+            raise
+        for stale in shard.glob(f"{digest}-*"):
+            if stale != entry:
+                stale.unlink(missing_ok=True)
+        self._account(size)
+        return entry
+
+    def discard(self, key: str) -> None:
+        shard, digest = self._locate(key)
+        for entry in shard.glob(f"{digest}-*"):
+            entry.unlink(missing_ok=True)
+
+    @contextmanager
+    def lock(self, key: str) -> Iterator[None]:
+        _, digest = self._locate(key)
+        stripe = int(digest[:4], 16) % _LOCK_STRIPES
+        with open(self.directory / "locks" / f"{stripe:03d}.lock", "a+b") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def evict(self) -> int:
+        """Remove as entradas menos usadas até 90% de ``max_bytes``.
+
+        Só um processo limpa por vez; os demais seguem sem esperar. Devolve o
+        número de entradas removidas.
+        """
+
+        with open(self.directory / "locks" / "evict.lock", "a+b") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            try:
+                return self._evict()
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    def _locate(self, key: str) -> tuple[Path, str]:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return self.directory / digest[:2], digest
+
+    def _touch(self, entry: Path) -> bool:
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            return False
+        CACHE_REQUESTS.labels(result="hit").inc()
+        return True
+
+    def _discard(self, entry: Path) -> None:
+        CACHE_REQUESTS.labels(result="invalid").inc()
+        entry.unlink(missing_ok=True)
+
+    def _account(self, size: int) -> None:
+        if self._size is None:
+            self._size = sum(stat.st_size for _, stat in self._scan())
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _scan(self) -> list[tuple[Path, os.stat_result]]:
+        entries = []
+        now = time.time()
+        for shard in self.directory.iterdir():
+            if shard.name == "locks" or not shard.is_dir():
+                continue
+            for entry in shard.iterdir():
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith(".tmp-"):
+                    if now - stat.st_mtime > _STALE_TEMP_SECONDS:
+                        entry.unlink(missing_ok=True)
+                    continue
+                entries.append((entry, stat))
+        return entries
+
+    def _evict(self) -> int:
+        entries = sorted(self._scan(), key=lambda item: item[1].st_mtime)
+        total = sum(stat.st_size for _, stat in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for entry, stat in entries:
+            if total <= target:
+                break
+            entry.unlink(missing_ok=True)
+            total -= stat.st_size
+            removed += 1
+            CACHE_EVICTIONS.inc()
+            CACHE_EVICTED_BYTES.inc(stat.st_size)
+        self._size = total
+        return removed
+
+
+class CachedStorageBackend(StorageBackend):
+    """Cache de leitura em disco na frente de outro backend (ex.: S3/MinIO).
+
+    ``read``, ``read_many`` e ``local_file`` preenchem o cache com objetos de
+    até ``max_object_size``; ``stream``, ``read_range`` e ``open`` usam a
+    entrada em disco quando ela existe e, senão, vão direto ao backend, sem
+    baixar o objeto inteiro. Gravações passam direto: os objetos têm chave
+    única por upload e não mudam depois de gravados.
+    """
+
+    def __init__(self, backend: StorageBackend, cache: DiskCache) -> None:
+        self.backend = backend
+        self.cache = cache
+        self.name = backend.name
+
+    def _key(self, path: str) -> str:
+        return f"{self.backend.name}:{path}"
+
+    def store(
+        self,
+        *,
+        org_id: int,
+        file_name: str,
+        content: StorageContent,
+        content_type: str | None = None,
+    ) -> StoredObject:
+        return self.backend.store(
+            org_id=org_id,
+            file_name=file_name,
+            content=content,
+            content_type=content_type,
+        )
+
+    def read(self, *, path: str) -> bytes:
+        key = self._key(path)
+        content = self.cache.read(key)
+        if content is not None:
+            return content
+        with self.cache.lock(key):
+            content = self.cache.read(key)
+            if content is None:
+                CACHE_REQUESTS.labels(result="miss").inc()
+                content = self.backend.read(path=path)
+                if len(content) <= self.cache.max_object_size:
+                    self.cache.put(key, [content])
+        return content
+
+    def read_many(
+        self, *, paths: Sequence[str], concurrency: int | None = None
+    ) -> list[bytes]:
+        contents: dict[str, bytes] = {}
+        missing: list[str] = []
+        for path in dict.fromkeys(paths):
+            content = self.cache.read(self._key(path))
+            if content is None:
+                missing.append(path)
+            else:
+                contents[path] = content
+        if missing:
+            CACHE_REQUESTS.labels(result="miss").inc(len(missing))
+            fetched = self.backend.read_many(paths=missing, concurrency=concurrency)
+            for path, content in zip(missing, fetched, strict=True):
+                contents[path] = content
+                if len(content) <= self.cache.max_object_size:
+                    self.cache.put(self._key(path), [content])
+        return [contents[path] for path in paths]
+
+    def stream(
+        self, *, path: str, offset: int = 0, length: int | None = None
+    ) -> Iterator[bytes]:
+        entry = self.cache.get(self._key(path))
+        if entry is None:
+            return self.backend.stream(path=path, offset=offset, length=length)
+        return iter_file_range(entry, offset=offset, length=length)
+
+    def stat(self, *, path: str) -> ObjectStat:
+        return self.backend.stat(path=path)
+
+    def read_range(self, *, path: str, offset: int, length: int) -> bytes:
+        entry = self.cache.get(self._key(path))
+        if entry is None:
+            return self.backend.read_range(path=path, offset=offset, length=length)
+        try:
+            with entry.open("rb") as source:
+                source.seek(offset)
+                return source.read(length)
+        except FileNotFoundError:  # removida entre o acerto e a leitura
+            return self.backend.read_range(path=path, offset=offset, length=length)
+
+    def open(self, *, path: str) -> BinaryIO:
+        entry = self.cache.get(self._key(path))
+        if entry is None:
+            return self.backend.open(path=path)
+        try:
+            return entry.open("rb")
+        except FileNotFoundError:  # removida entre o acerto e a abertura
+            return self.backend.open(path=path)
+
+    @contextmanager
+    def local_file(self, *, path: str) -> Iterator[Path]:
+        key = self._key(path)
+        entry = self.cache.get(key)
+        if entry is None and self.stat(path=path).size <= self.cache.max_object_size:
+            with self.cache.lock(key):
+                entry = self.cache.get(key)
+                if entry is None:
+                    CACHE_REQUESTS.labels(result="miss").inc()
+                    entry = self.cache.put(key, self.backend.stream(path=path))
+        if entry is None:
+            CACHE_REQUESTS.labels(result="miss").inc()
+            with self.backend.local_file(path=path) as local_path:
+                yield local_path
+            return
+        yield entry
+
+    def delete(self, *, path: str) -> None:
+        self.backend.delete(path=path)
+        self.cache.discard(self._key(path))
+
+
+def _content_hash(entry: Path) -> str:
+    return entry.name.split("-")[1]
+
+
+def _content_size(entry: Path) -> int:
+    """Tamanho gravado no nome; ``-1`` (nunca confere) em nomes de outro formato."""
+
+    size = entry.name.split("-")[2:3]
+    return int(size[0]) if size and size[0].isdigit() else -1
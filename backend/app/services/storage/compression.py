@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import tempfile
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, BinaryIO, Iterator, Sequence
+
+from app.services.storage import get_storage_backend
+from app.services.storage.base import (
+    STREAM_CHUNK_SIZE,
+    StorageBackend,
+    StorageContent,
+    iter_chunks,
+)
+from app.services.storage.segments import stored_bytes, stored_bytes_many
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependência opcional
+    zstandard = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from app.models.file import File
+
+COMPRESSION_CODECS = ("none", "gzip", "zstd")
+# Sufixo do objeto no storage, para que o arquivo se descreva sozinho.
+CODEC_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+# Uploads em streaming são comprimidos para um temporário que fica em memória
+# até este tamanho e passa para o disco depois.
+_SPOOL_SIZE = 16 * 1024 * 1024
+
+
+def resolve_codec(name: str | None) -> str | None:
+    """Codec efetivo de ``STORAGE_COMPRESSION``; ``None`` grava sem compressão.
+
+    ``zstd`` exige o pacote ``zstandard`` e, sem ele, cai para ``gzip``.
+    """
+
+    codec = (name or "none").lower()
+    if codec not in COMPRESSION_CODECS:
+        raise ValueError(f"Compressão desconhecida: {name}")
+    if codec == "none":
+        return None
+    if codec == "zstd" and zstandard is None:
+        return "gzip"
+    return codec
+
+
+def is_compressible(file_name: str, mime: str) -> bool:
+    """XMLs comprimem ~10x; ZIPs já vêm comprimidos e são lidos por faixas."""
+
+    return file_name.lower().endswith(".xml") or "xml" in mime.lower()
+
+
+def compress(content: StorageContent, codec: str) -> tuple[StorageContent, int]:
+    """Conteúdo comprimido com ``codec`` e o tamanho original em bytes.
+
+    Bytes são comprimidos em memória; arquivos abertos, em blocos para um
+    temporário posicionado no início.
+    """
+
+    if isinstance(content, bytes):
+        if codec == "zstd":
+            return _zstd().ZstdCompressor().compress(content), len(content)
+        return gzip.compress(content, mtime=0), len(content)
+
+    target = tempfile.SpooledTemporaryFile(max_size=_SPOOL_SIZE)
+    size = 0
+    if codec == "zstd":
+        writer = _zstd().ZstdCompressor().stream_writer(target, closefd=False)
+    else:
+        writer = gzip.GzipFile(fileobj=target, mode="wb", mtime=0)
+    with writer:
+        for chunk in iter_chunks(content):
+            writer.write(chunk)
+            size += len(chunk)
+    target.seek(0)
+    return target, size  # type: ignore[return-value]
+
+
+def decompress(data: bytes, codec: str | None) -> bytes:
+    if codec is None or codec == "none":
+        return data
+    if codec == "zstd":
+        # ``decompress`` sem tamanho no quadro exige ``max_output_size``.
+        with _zstd().ZstdDecompressor().stream_reader(data) as reader:
+            return reader.read()
+    return gzip.decompress(data)
+
+
+def open_decompressed(stream: BinaryIO, codec: str | None) -> BinaryIO:
+    """Leitura em streaming do conteúdo original de ``stream``.
+
+    Fechar o leitor devolvido não fecha ``stream``.
+    """
+
+    if codec is None or codec == "none":
+        return stream
+    if codec == "zstd":
+        return _zstd().ZstdDecompressor().stream_reader(  # type: ignore[return-value]
+            stream, read_size=STREAM_CHUNK_SIZE, closefd=False
+        )
+    return gzip.GzipFile(fileobj=stream, mode="rb")  # type: ignore[return-value]
+
+
+def read_file(file_record: File, storage: StorageBackend | None = None) -> bytes:
+    """Conteúdo original de um ``File``, descomprimido conforme ``compression``.
+
+    Membros de segmento são lidos por faixa e conferidos contra ``sha256``.
+    """
+
+    return _original(file_record, stored_bytes(file_record, storage))
+
+
+def read_files(
+    file_records: Sequence[File], storage: StorageBackend | None = None
+) -> list[bytes]:
+    """``read_file`` em lote: objetos em ``read_many``, segmentos por faixas."""
+
+    return [
+        _original(record, content)
+        for record, content in zip(
+            file_records, stored_bytes_many(file_records, storage), strict=True
+        )
+    ]
+
+
+@contextmanager
+def open_file(
+    file_record: File, storage: StorageBackend | None = None
+) -> Iterator[BinaryIO]:
+    """Arquivo de leitura com o conteúdo original, descomprimido em blocos."""
+
+    if file_record.segment_offset is not None:
+        # Membros de segmento são XMLs pequenos: uma faixa basta.
+        yield io.BytesIO(read_file(file_record, storage))
+        return
+    storage = storage or get_storage_backend(file_record.storage_backend)
+    with storage.open(path=file_record.storage_path) as raw:
+        with open_decompressed(raw, file_record.compression) as stream:
+            yield stream
+
+
+def _original(file_record: File, content: bytes) -> bytes:
+    content = decompress(content, file_record.compression)
+    if (
+        file_record.segment_offset is not None
+        and hashlib.sha256(content).hexdigest() != file_record.sha256
+    ):
+        raise ValueError(
+            f"Conteúdo de {file_record.file_name} não confere com o segmento "
+            f"{file_record.storage_path}"
+        )
+    return content
+
+
+def _zstd():  # type: ignore[no-untyped-def]
+    if zstandard is None:
+        raise RuntimeError("Compressão zstd requer o pacote zstandard")
+    return zstandard
@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+import shutil
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
+from typing import BinaryIO, Iterator, Sequence
 
 from app.core.config import settings
-from app.services.storage.base import StoredObject, StorageBackend
+from app.services.storage.base import (
+    STREAM_CHUNK_SIZE,
+    ObjectStat,
+    StorageBackend,
+    StorageContent,
+    StoredObject,
+    iter_file_range,
+)
 
 
 class LocalStorageBackend(StorageBackend):
@@ -19,7 +29,7 @@ class LocalStorageBackend(StorageBackend):
         *,
         org_id: int,
         file_name: str,
-        content: bytes,
+        content: StorageContent,
         content_type: str | None = None,
     ) -> StoredObject:
         target_dir = self.base_path / str(org_id)
@@ -27,12 +37,46 @@ class LocalStorageBackend(StorageBackend):
         timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
         safe_name = file_name.replace("/", "_")
         disk_path = target_dir / f"{timestamp}_{safe_name}"
-        disk_path.write_bytes(content)
+        if isinstance(content, bytes):
+            disk_path.write_bytes(content)
+            size = len(content)
+        else:
+            with disk_path.open("wb") as target:
+                shutil.copyfileobj(content, target, STREAM_CHUNK_SIZE)
+                size = target.tell()
         return StoredObject(
             path=str(disk_path),
             content_type=content_type,
-            size=len(content),
+            size=size,
         )
 
     def read(self, *, path: str) -> bytes:
         return Path(path).read_bytes()
+
+    def read_many(
+        self, *, paths: Sequence[str], concurrency: int | None = None
+    ) -> list[bytes]:
+        return [self.read(path=path) for path in paths]
+
+    def stream(
+        self, *, path: str, offset: int = 0, length: int | None = None
+    ) -> Iterator[bytes]:
+        return iter_file_range(path, offset=offset, length=length)
+
+    def stat(self, *, path: str) -> ObjectStat:
+        return ObjectStat(path=path, size=Path(path).stat().st_size)
+
+    def read_range(self, *, path: str, offset: int, length: int) -> bytes:
+        with Path(path).open("rb") as source:
+            source.seek(offset)
+            return source.read(length)
+
+    def open(self, *, path: str) -> BinaryIO:
+        return Path(path).open("rb")
+
+    @contextmanager
+    def local_file(self, *, path: str) -> Iterator[Path]:
+        yield Path(path)
+
+    def delete(self, *, path: str) -> None:
+        Path(path).unlink(missing_ok=True)
@@ -1,37 +1,90 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import hmac
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Iterable
+from functools import partial
+from pathlib import Path
+from typing import (
+    Any,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    Sequence,
+    TypeVar,
+)
 from urllib.parse import quote
+from xml.etree import ElementTree
 
 import httpx
 
 from app.core.config import settings
-from app.services.storage.base import StoredObject, StorageBackend
+from app.services.storage.base import (
+    STREAM_CHUNK_SIZE,
+    ObjectStat,
+    RangeReader,
+    StorageBackend,
+    StorageContent,
+    StoredObject,
+    iter_chunks,
+)
+
+T = TypeVar("T")
+
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+# Limite do S3 para partes de multipart (exceto a última).
+MIN_PART_SIZE = 5 * 1024 * 1024
 
 
 class S3StorageBackend(StorageBackend):
     name = "s3"
 
-    def __init__(self) -> None:
-        if not settings.s3_bucket:
-            raise RuntimeError("S3_BUCKET não configurado para backend s3/minio")
-        if not settings.s3_access_key or not settings.s3_secret_key:
-            raise RuntimeError("Credenciais S3 não configuradas para backend s3/minio")
-        self.bucket = settings.s3_bucket
-        self.client = _SimpleS3Client(
-            endpoint_url=(
-                str(settings.s3_endpoint_url) if settings.s3_endpoint_url else None
-            ),
-            access_key=settings.s3_access_key,
-            secret_key=settings.s3_secret_key,
-            region=settings.s3_region,
-            use_ssl=settings.s3_secure,
-        )
+    def __init__(
+        self,
+        *,
+        client: _SimpleS3Client | None = None,
+        bucket: str | None = None,
+        read_ahead: int | None = None,
+    ) -> None:
+        if client is None:
+            if not settings.s3_bucket:
+                raise RuntimeError("S3_BUCKET não configurado para backend s3/minio")
+            if not settings.s3_access_key or not settings.s3_secret_key:
+                raise RuntimeError(
+                    "Credenciais S3 não configuradas para backend s3/minio"
+                )
+            client = _SimpleS3Client(
+                endpoint_url=(
+                    str(settings.s3_endpoint_url) if settings.s3_endpoint_url else None
+                ),
+                access_key=settings.s3_access_key,
+                secret_key=settings.s3_secret_key,
+                region=settings.s3_region,
+                use_ssl=settings.s3_secure,
+            )
+        self.bucket = bucket or settings.s3_bucket
+        self.client = client
+        self.read_ahead = read_ahead or settings.s3_read_ahead
         self._ensure_bucket()
 
+    def async_client(self) -> _AsyncS3Client:
+        """Cliente assíncrono com as mesmas credenciais (usar com ``async with``)."""
+
+        return _AsyncS3Client(
+            endpoint_url=str(self.client._base_url),
+            access_key=self.client.access_key,
+            secret_key=self.client.secret_key,
+            region=self.client.region,
+            use_ssl=self.client.use_ssl,
+        )
+
     def _ensure_bucket(self) -> None:
         if not self.client.bucket_exists(self.bucket):
             self.client.create_bucket(self.bucket)
@@ -41,13 +94,13 @@ class S3StorageBackend(StorageBackend):
         *,
         org_id: int,
         file_name: str,
-        content: bytes,
+        content: StorageContent,
         content_type: str | None = None,
     ) -> StoredObject:
         timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
         safe_name = file_name.replace("/", "_")
         object_key = f"org-{org_id}/{timestamp}_{safe_name}"
-        self.client.put_object(
+        size = self.client.put_object(
             bucket=self.bucket,
             key=object_key,
             data=content,
@@ -56,15 +109,66 @@ class S3StorageBackend(StorageBackend):
         return StoredObject(
             path=object_key,
             content_type=content_type,
-            size=len(content),
+            size=size,
         )
 
     def read(self, *, path: str) -> bytes:
         return self.client.get_object(bucket=self.bucket, key=path)
 
+    def read_many(
+        self, *, paths: Sequence[str], concurrency: int | None = None
+    ) -> list[bytes]:
+        return self.client.get_many(
+            bucket=self.bucket, keys=paths, concurrency=concurrency
+        )
+
+    def stream(
+        self, *, path: str, offset: int = 0, length: int | None = None
+    ) -> Iterator[bytes]:
+        return self.client.iter_object(
+            bucket=self.bucket, key=path, offset=offset, length=length
+        )
+
+    def stat(self, *, path: str) -> ObjectStat:
+        size, content_type = self.client.head_object(bucket=self.bucket, key=path)
+        return ObjectStat(path=path, size=size, content_type=content_type)
+
+    def read_range(self, *, path: str, offset: int, length: int) -> bytes:
+        return self.client.get_range(
+            bucket=self.bucket, key=path, offset=offset, length=length
+        )
+
+    def open(self, *, path: str) -> BinaryIO:
+        """Objeto como arquivo com ``seek``: um ``HEAD`` e ``Range`` GETs depois."""
+
+        size = self.stat(path=path).size
+        return RangeReader(  # type: ignore[return-value]
+            size=size,
+            fetch=lambda offset, length: self.read_range(
+                path=path, offset=offset, length=length
+            ),
+            read_ahead=self.read_ahead,
+            name=path,
+        )
+
+    @contextmanager
+    def local_file(self, *, path: str) -> Iterator[Path]:
+        with tempfile.NamedTemporaryFile(suffix=Path(path).suffix) as target:
+            self.client.download_object(bucket=self.bucket, key=path, target=target)
+            target.flush()
+            yield Path(target.name)
+
+    def delete(self, *, path: str) -> None:
+        self.client.delete_object(bucket=self.bucket, key=path)
+
 
-class _SimpleS3Client:
-    """Cliente mínimo compatível com S3 usando assinatura SigV4."""
+class _S3Signer:
+    """Configuração e assinatura SigV4 comuns aos clientes síncrono e assíncrono.
+
+    A chave derivada (quatro HMACs sobre data, região e serviço) muda só uma
+    vez por dia: fica em cache por data, e cada requisição faz apenas o HMAC
+    final da assinatura.
+    """
 
     def __init__(
         self,
@@ -78,17 +182,210 @@ class _SimpleS3Client:
         self.access_key = access_key
         self.secret_key = secret_key
         self.region = region or "us-east-1"
+        self.use_ssl = use_ssl
         base_url = self._resolve_base_url(endpoint_url, use_ssl)
         self._base_url = httpx.URL(base_url)
         if self._base_url.path not in ("", "/"):
             raise RuntimeError("S3 endpoint não deve conter caminho extra")
-        verify = use_ssl if self._base_url.scheme == "https" else False
-        self._client = httpx.Client(
-            base_url=self._base_url,
-            timeout=httpx.Timeout(30.0),
-            verify=verify,
+        self._host_header = self._base_url.netloc.decode("ascii")
+        self._signing_key: tuple[str, bytes] | None = None
+
+    def _client_options(self) -> dict[str, Any]:
+        """Opções do ``httpx`` (pool, keep-alive, HTTP/2) vindas das settings."""
+
+        if settings.s3_http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError as exc:  # pragma: no cover - dependência opcional
+                raise RuntimeError(
+                    "S3_HTTP2 requer o pacote h2 (instale httpx[http2])"
+                ) from exc
+        return {
+            "base_url": self._base_url,
+            "timeout": httpx.Timeout(30.0),
+            "verify": self.use_ssl if self._base_url.scheme == "https" else False,
+            "http2": settings.s3_http2,
+            "limits": httpx.Limits(
+                max_connections=settings.s3_max_connections,
+                max_keepalive_connections=settings.s3_max_keepalive_connections,
+                keepalive_expiry=settings.s3_keepalive_expiry,
+            ),
+        }
+
+    def _resolve_base_url(self, endpoint_url: str | None, use_ssl: bool) -> str:
+        if endpoint_url:
+            return endpoint_url.rstrip("/")
+        scheme = "https" if use_ssl else "http"
+        host = f"s3.{self.region}.amazonaws.com"
+        return f"{scheme}://{host}"
+
+    def _sign(
+        self,
+        method: str,
+        *,
+        bucket: str,
+        key: str | None,
+        query: dict[str, str] | None,
+        data: StorageContent | str | None,
+        headers: dict[str, str] | None,
+        payload_hash: str | None,
+    ) -> tuple[str, dict[str, str], bytes | Iterator[bytes]]:
+        """Caminho, cabeçalhos assinados e corpo prontos para o ``httpx``."""
+
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        headers.setdefault("host", self._host_header)
+        body: bytes | Iterator[bytes]
+        if data is not None and not isinstance(data, (bytes, str)):
+            # Arquivo aberto: quem chama informa ``content-length`` e o hash.
+            if payload_hash is None or "content-length" not in headers:
+                raise ValueError("Envio em blocos exige content-length e hash")
+            body = iter_chunks(data)
+        else:
+            body = self._coerce_body(data)
+            headers.setdefault("content-length", str(len(body)))
+            payload_hash = payload_hash or hashlib.sha256(body).hexdigest()
+        canonical_uri = self._build_canonical_uri(bucket=bucket, key=key)
+        canonical_query = "&".join(
+            f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+            for name, value in sorted((query or {}).items())
+        )
+        amz_date = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        headers["x-amz-date"] = amz_date
+        headers["x-amz-content-sha256"] = payload_hash
+        canonical_headers = "".join(
+            f"{k}:{headers[k].strip()}\n" for k in sorted(headers)
+        )
+        signed_headers = ";".join(sorted(headers))
+        canonical_request = (
+            f"{method}\n{canonical_uri}\n{canonical_query}\n"
+            f"{canonical_headers}\n{signed_headers}\n{payload_hash}"
+        )
+        credential_scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = (
+            "AWS4-HMAC-SHA256\n"
+            f"{amz_date}\n"
+            f"{credential_scope}\n"
+            f"{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}"
+        )
+        signing_key = self._signature_key(amz_date[:8])
+        signature = hmac.new(
+            signing_key,
+            string_to_sign.encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+        headers["authorization"] = (
+            "AWS4-HMAC-SHA256 "
+            f"Credential={self.access_key}/{credential_scope}, "
+            f"SignedHeaders={signed_headers}, "
+            f"Signature={signature}"
+        )
+        request_path = canonical_uri
+        if canonical_query:
+            request_path = f"{canonical_uri}?{canonical_query}"
+        return request_path, headers, body
+
+    def _build_canonical_uri(self, *, bucket: str, key: str | None) -> str:
+        encoded = quote(bucket, safe="-_.~")
+        if key:
+            key_encoded = quote(key, safe="/-_.~")
+            return f"/{encoded}/{key_encoded}"
+        return f"/{encoded}"
+
+    def _coerce_body(self, data: bytes | str | None) -> bytes:
+        if data is None:
+            return b""
+        if isinstance(data, bytes):
+            return data
+        return data.encode("utf-8")
+
+    def _signature_key(self, datestamp: str) -> bytes:
+        # Tupla trocada de uma vez: leituras concorrentes veem a antiga ou a nova.
+        cached = self._signing_key
+        if cached is not None and cached[0] == datestamp:
+            return cached[1]
+        key_date = hmac.new(
+            ("AWS4" + self.secret_key).encode("utf-8"),
+            datestamp.encode("utf-8"),
+            hashlib.sha256,
+        ).digest()
+        key_region = hmac.new(
+            key_date,
+            self.region.encode("utf-8"),
+            hashlib.sha256,
+        ).digest()
+        key_service = hmac.new(key_region, b"s3", hashlib.sha256).digest()
+        signing_key = hmac.new(key_service, b"aws4_request", hashlib.sha256).digest()
+        self._signing_key = (datestamp, signing_key)
+        return signing_key
+
+    @staticmethod
+    def _check_status(
+        response: httpx.Response, allowed_statuses: Iterable[int] | None
+    ) -> None:
+        if response.status_code not in set(allowed_statuses or {200}):
+            detail = response.text[:200]
+            raise RuntimeError(
+                f"Erro ao comunicar com S3 ({response.status_code}): {detail}"
+            )
+
+
+class _SimpleS3Client(_S3Signer):
+    """Cliente mínimo compatível com S3 usando assinatura SigV4.
+
+    Objetos a partir de ``S3_MULTIPART_THRESHOLD`` (ou arquivos sem tamanho
+    conhecido) são enviados em multipart: as partes são lidas em sequência e
+    até ``S3_UPLOAD_CONCURRENCY`` seguem em paralelo, então a memória fica em
+    torno de ``(concorrência + 1) * S3_MULTIPART_PART_SIZE``. Leituras podem
+    ser feitas em blocos e por faixa (``Range``) com ``iter_object`` e
+    ``get_range``.
+
+    O ``httpx.Client`` é compartilhado entre threads, com pool e keep-alive
+    configuráveis (``S3_MAX_CONNECTIONS``, ``S3_MAX_KEEPALIVE_CONNECTIONS``,
+    ``S3_KEEPALIVE_EXPIRY``, ``S3_HTTP2``); ``get_many``/``put_many`` usam
+    esse pool com até ``S3_BULK_CONCURRENCY`` requisições simultâneas.
+    """
+
+    def __init__(
+        self,
+        *,
+        endpoint_url: str | None,
+        access_key: str,
+        secret_key: str,
+        region: str | None,
+        use_ssl: bool,
+        multipart_threshold: int | None = None,
+        part_size: int | None = None,
+        upload_concurrency: int | None = None,
+        unsigned_payload: bool | None = None,
+        transport: httpx.BaseTransport | None = None,
+    ) -> None:
+        super().__init__(
+            endpoint_url=endpoint_url,
+            access_key=access_key,
+            secret_key=secret_key,
+            region=region,
+            use_ssl=use_ssl,
+        )
+        self.multipart_threshold = (
+            multipart_threshold
+            if multipart_threshold is not None
+            else settings.s3_multipart_threshold
         )
-        self._host_header = self._client.base_url.netloc
+        self.part_size = max(
+            part_size or settings.s3_multipart_part_size, MIN_PART_SIZE
+        )
+        self.upload_concurrency = max(
+            1, upload_concurrency or settings.s3_upload_concurrency
+        )
+        self.unsigned_payload = (
+            settings.s3_unsigned_payload
+            if unsigned_payload is None
+            else unsigned_payload
+        )
+        self._client = httpx.Client(transport=transport, **self._client_options())
+
+    def close(self) -> None:
+        self._client.close()
 
     def bucket_exists(self, bucket: str) -> bool:
         response = self._request(
@@ -124,20 +421,60 @@ class _SimpleS3Client:
         *,
         bucket: str,
         key: str,
-        data: bytes,
+        data: StorageContent,
         content_type: str | None,
-    ) -> None:
+    ) -> int:
+        """Envia o objeto e devolve o tamanho em bytes.
+
+        Arquivos abaixo do limite de multipart vão em um único ``PUT`` em
+        streaming, assinado com ``UNSIGNED-PAYLOAD`` (ou com o sha256 calculado
+        em uma leitura prévia, se ``S3_UNSIGNED_PAYLOAD=false``).
+        """
+
         headers: dict[str, str] = {}
         if content_type:
             headers["content-type"] = content_type
+        if isinstance(data, bytes):
+            if len(data) >= self.multipart_threshold:
+                return self._put_multipart(
+                    bucket=bucket,
+                    key=key,
+                    parts=_split_bytes(data, self.part_size),
+                    headers=headers,
+                )
+            self._request(
+                "PUT",
+                bucket=bucket,
+                key=key,
+                data=data,
+                headers=headers,
+                allowed_statuses={200},
+            )
+            return len(data)
+
+        size = _remaining_size(data)
+        if size is None or size >= self.multipart_threshold:
+            return self._put_multipart(
+                bucket=bucket,
+                key=key,
+                parts=_read_parts(data, self.part_size),
+                headers=headers,
+            )
+        if self.unsigned_payload:
+            payload_hash = UNSIGNED_PAYLOAD
+        else:
+            payload_hash, size = _hash_stream(data)
+        headers["content-length"] = str(size)
         self._request(
             "PUT",
             bucket=bucket,
             key=key,
             data=data,
             headers=headers,
+            payload_hash=payload_hash,
             allowed_statuses={200},
         )
+        return size
 
     def get_object(self, *, bucket: str, key: str) -> bytes:
         response = self._request(
@@ -148,12 +485,213 @@ class _SimpleS3Client:
         )
         return response.content
 
-    def _resolve_base_url(self, endpoint_url: str | None, use_ssl: bool) -> str:
-        if endpoint_url:
-            return endpoint_url.rstrip("/")
-        scheme = "https" if use_ssl else "http"
-        host = f"s3.{self.region}.amazonaws.com"
-        return f"{scheme}://{host}"
+    def delete_object(self, *, bucket: str, key: str) -> None:
+        self._request(
+            "DELETE",
+            bucket=bucket,
+            key=key,
+            allowed_statuses={200, 204, 404},
+        )
+
+    def head_object(self, *, bucket: str, key: str) -> tuple[int, str | None]:
+        """Tamanho e ``content-type`` do objeto, via ``HEAD``."""
+
+        response = self._request(
+            "HEAD",
+            bucket=bucket,
+            key=key,
+            allowed_statuses={200, 404},
+        )
+        if response.status_code == 404:
+            raise FileNotFoundError(key)
+        return (
+            int(response.headers["content-length"]),
+            response.headers.get("content-type"),
+        )
+
+    def get_range(self, *, bucket: str, key: str, offset: int, length: int) -> bytes:
+        """``length`` bytes a partir de ``offset`` em um único ``Range`` GET."""
+
+        if length <= 0:
+            return b""
+        response = self._request(
+            "GET",
+            bucket=bucket,
+            key=key,
+            headers={"range": f"bytes={offset}-{offset + length - 1}"},
+            allowed_statuses={200, 206, 416},
+        )
+        if response.status_code == 416:
+            return b""
+        if response.status_code == 200:
+            # Servidor que ignora ``Range`` devolve o objeto inteiro.
+            return response.content[offset : offset + length]
+        return response.content
+
+    def iter_object(
+        self,
+        *,
+        bucket: str,
+        key: str,
+        offset: int = 0,
+        length: int | None = None,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+    ) -> Iterator[bytes]:
+        """Blocos do objeto a partir de ``offset`` (``length`` bytes ou até o fim)."""
+
+        if length == 0:
+            return
+        headers: dict[str, str] = {}
+        if offset or length is not None:
+            end = "" if length is None else str(offset + length - 1)
+            headers["range"] = f"bytes={offset}-{end}"
+        response = self._request(
+            "GET",
+            bucket=bucket,
+            key=key,
+            headers=headers,
+            allowed_statuses={200, 206},
+            stream=True,
+        )
+        try:
+            yield from response.iter_bytes(chunk_size)
+        finally:
+            response.close()
+
+    def download_object(self, *, bucket: str, key: str, target: BinaryIO) -> int:
+        """Grava o objeto em ``target`` em blocos; devolve o total de bytes."""
+
+        written = 0
+        for chunk in self.iter_object(bucket=bucket, key=key):
+            target.write(chunk)
+            written += len(chunk)
+        return written
+
+    def get_many(
+        self, *, bucket: str, keys: Sequence[str], concurrency: int | None = None
+    ) -> list[bytes]:
+        """Conteúdo de cada chave, na ordem de ``keys``; o primeiro erro propaga."""
+
+        return _run_bounded(
+            [partial(self.get_object, bucket=bucket, key=key) for key in keys],
+            concurrency,
+        )
+
+    def put_many(
+        self,
+        *,
+        bucket: str,
+        objects: Sequence[tuple[str, bytes]],
+        content_type: str | None = None,
+        concurrency: int | None = None,
+    ) -> list[int]:
+        """Envia pares ``(chave, conteúdo)``; devolve os tamanhos, na mesma ordem."""
+
+        return _run_bounded(
+            [
+                partial(
+                    self.put_object,
+                    bucket=bucket,
+                    key=key,
+                    data=data,
+                    content_type=content_type,
+                )
+                for key, data in objects
+            ],
+            concurrency,
+        )
+
+    # ------------------------------------------------------------------
+    def _put_multipart(
+        self,
+        *,
+        bucket: str,
+        key: str,
+        parts: Iterable[bytes],
+        headers: dict[str, str],
+    ) -> int:
+        response = self._request(
+            "POST",
+            bucket=bucket,
+            key=key,
+            query={"uploads": ""},
+            headers=headers,
+            allowed_statuses={200},
+        )
+        upload_id = _xml_text(response.content, "UploadId")
+        if not upload_id:
+            raise RuntimeError("S3 não devolveu UploadId para o multipart")
+
+        etags: list[tuple[int, str]] = []
+        size = 0
+        try:
+            with ThreadPoolExecutor(
+                max_workers=self.upload_concurrency,
+                thread_name_prefix="s3-multipart",
+            ) as pool:
+                pending: deque[tuple[int, Future[str]]] = deque()
+                for number, part in enumerate(parts, start=1):
+                    size += len(part)
+                    pending.append(
+                        (
+                            number,
+                            pool.submit(
+                                self._upload_part, bucket, key, upload_id, number, part
+                            ),
+                        )
+                    )
+                    # Partes já lidas ficam na memória até subirem: limita a fila.
+                    if len(pending) >= self.upload_concurrency:
+                        done_number, future = pending.popleft()
+                        etags.append((done_number, future.result()))
+                for done_number, future in pending:
+                    etags.append((done_number, future.result()))
+            if not etags:
+                # Arquivo vazio: o multipart exige ao menos uma parte.
+                etags.append((1, self._upload_part(bucket, key, upload_id, 1, b"")))
+
+            body = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in etags
+            )
+            response = self._request(
+                "POST",
+                bucket=bucket,
+                key=key,
+                query={"uploadId": upload_id},
+                data=f"<CompleteMultipartUpload>{body}</CompleteMultipartUpload>",
+                headers={"content-type": "application/xml"},
+                allowed_statuses={200},
+            )
+            # O S3 pode responder 200 com um erro no corpo.
+            if _xml_text(response.content, "Code"):
+                raise RuntimeError(
+                    f"Erro ao concluir multipart no S3: {response.text[:200]}"
+                )
+        except BaseException:
+            self._request(
+                "DELETE",
+                bucket=bucket,
+                key=key,
+                query={"uploadId": upload_id},
+                allowed_statuses={200, 204, 404},
+            )
+            raise
+        return size
+
+    def _upload_part(
+        self, bucket: str, key: str, upload_id: str, number: int, part: bytes
+    ) -> str:
+        response = self._request(
+            "PUT",
+            bucket=bucket,
+            key=key,
+            query={"partNumber": str(number), "uploadId": upload_id},
+            data=part,
+            payload_hash=UNSIGNED_PAYLOAD if self.unsigned_payload else None,
+            allowed_statuses={200},
+        )
+        return response.headers["etag"]
 
     def _request(
         self,
@@ -161,88 +699,227 @@ class _SimpleS3Client:
         *,
         bucket: str,
         key: str | None = None,
-        data: bytes | str | None = None,
+        query: dict[str, str] | None = None,
+        data: StorageContent | str | None = None,
         headers: dict[str, str] | None = None,
         allowed_statuses: Iterable[int] | None = None,
+        payload_hash: str | None = None,
+        stream: bool = False,
     ) -> httpx.Response:
-        body = self._coerce_body(data)
-        headers = {k.lower(): v for k, v in (headers or {}).items()}
-        headers.setdefault("host", self._host_header)
-        headers.setdefault("content-length", str(len(body)))
-        canonical_uri = self._build_canonical_uri(bucket=bucket, key=key)
-        canonical_query = ""
-        payload_hash = hashlib.sha256(body).hexdigest()
-        amz_date = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-        headers["x-amz-date"] = amz_date
-        headers["x-amz-content-sha256"] = payload_hash
-        canonical_headers = "".join(
-            f"{k}:{headers[k].strip()}\n" for k in sorted(headers)
+        request_path, signed_headers, body = self._sign(
+            method,
+            bucket=bucket,
+            key=key,
+            query=query,
+            data=data,
+            headers=headers,
+            payload_hash=payload_hash,
         )
-        signed_headers = ";".join(sorted(headers))
-        canonical_request = (
-            f"{method}\n{canonical_uri}\n{canonical_query}\n"
-            f"{canonical_headers}\n{signed_headers}\n{payload_hash}"
+        request = self._client.build_request(
+            method,
+            request_path,
+            headers=signed_headers,
+            content=body,
         )
-        credential_scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
-        string_to_sign = (
-            "AWS4-HMAC-SHA256\n"
-            f"{amz_date}\n"
-            f"{credential_scope}\n"
-            f"{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}"
+        response = self._client.send(request, stream=stream)
+        if stream and response.status_code not in set(allowed_statuses or {200}):
+            response.read()
+            response.close()
+        self._check_status(response, allowed_statuses)
+        return response
+
+
+class _AsyncS3Client(_S3Signer):
+    """Variante ``httpx.AsyncClient`` para uso no event loop (ex.: rotas da API).
+
+    Cobre leitura e gravação de objetos inteiros e os envios/leituras em lote;
+    multipart e streaming continuam no cliente síncrono. Usar com ``async with``
+    ou chamar ``aclose``.
+    """
+
+    def __init__(
+        self,
+        *,
+        endpoint_url: str | None,
+        access_key: str,
+        secret_key: str,
+        region: str | None,
+        use_ssl: bool,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        super().__init__(
+            endpoint_url=endpoint_url,
+            access_key=access_key,
+            secret_key=secret_key,
+            region=region,
+            use_ssl=use_ssl,
         )
-        signing_key = self._signature_key(amz_date[:8])
-        signature = hmac.new(
-            signing_key,
-            string_to_sign.encode("utf-8"),
-            hashlib.sha256,
-        ).hexdigest()
-        headers["authorization"] = (
-            "AWS4-HMAC-SHA256 "
-            f"Credential={self.access_key}/{credential_scope}, "
-            f"SignedHeaders={signed_headers}, "
-            f"Signature={signature}"
+        self._client = httpx.AsyncClient(transport=transport, **self._client_options())
+
+    async def __aenter__(self) -> _AsyncS3Client:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def get_object(self, *, bucket: str, key: str) -> bytes:
+        response = await self._request("GET", bucket=bucket, key=key)
+        return response.content
+
+    async def put_object(
+        self,
+        *,
+        bucket: str,
+        key: str,
+        data: bytes,
+        content_type: str | None = None,
+    ) -> int:
+        headers = {"content-type": content_type} if content_type else {}
+        await self._request("PUT", bucket=bucket, key=key, data=data, headers=headers)
+        return len(data)
+
+    async def get_many(
+        self, *, bucket: str, keys: Sequence[str], concurrency: int | None = None
+    ) -> list[bytes]:
+        return await _gather_bounded(
+            [partial(self.get_object, bucket=bucket, key=key) for key in keys],
+            concurrency,
         )
-        request_path = canonical_uri
-        if canonical_query:
-            request_path = f"{canonical_uri}?{canonical_query}"
-        response = self._client.request(
+
+    async def put_many(
+        self,
+        *,
+        bucket: str,
+        objects: Sequence[tuple[str, bytes]],
+        content_type: str | None = None,
+        concurrency: int | None = None,
+    ) -> list[int]:
+        return await _gather_bounded(
+            [
+                partial(
+                    self.put_object,
+                    bucket=bucket,
+                    key=key,
+                    data=data,
+                    content_type=content_type,
+                )
+                for key, data in objects
+            ],
+            concurrency,
+        )
+
+    async def _request(
+        self,
+        method: str,
+        *,
+        bucket: str,
+        key: str | None = None,
+        data: bytes | None = None,
+        headers: dict[str, str] | None = None,
+        allowed_statuses: Iterable[int] | None = None,
+    ) -> httpx.Response:
+        request_path, signed_headers, body = self._sign(
             method,
-            request_path,
+            bucket=bucket,
+            key=key,
+            query=None,
+            data=data,
             headers=headers,
-            content=body,
+            payload_hash=None,
         )
-        allowed = set(allowed_statuses or {200})
-        if response.status_code not in allowed:
-            detail = response.text[:200]
-            raise RuntimeError(
-                f"Erro ao comunicar com S3 ({response.status_code}): {detail}"
-            )
+        response = await self._client.request(
+            method, request_path, headers=signed_headers, content=body
+        )
+        self._check_status(response, allowed_statuses)
         return response
 
-    def _build_canonical_uri(self, *, bucket: str, key: str | None) -> str:
-        encoded = quote(bucket, safe="-_.~")
-        if key:
-            key_encoded = quote(key, safe="/-_.~")
-            return f"/{encoded}/{key_encoded}"
-        return f"/{encoded}"
 
-    def _coerce_body(self, data: bytes | str | None) -> bytes:
-        if data is None:
-            return b""
-        if isinstance(data, bytes):
-            return data
-        return data.encode("utf-8")
+def _bulk_concurrency(concurrency: int | None) -> int:
+    return max(1, concurrency or settings.s3_bulk_concurrency)
 
-    def _signature_key(self, datestamp: str) -> bytes:
-        key_date = hmac.new(
-            ("AWS4" + self.secret_key).encode("utf-8"),
-            datestamp.encode("utf-8"),
-            hashlib.sha256,
-        ).digest()
-        key_region = hmac.new(
-            key_date,
-            self.region.encode("utf-8"),
-            hashlib.sha256,
-        ).digest()
-        key_service = hmac.new(key_region, b"s3", hashlib.sha256).digest()
-        return hmac.new(key_service, b"aws4_request", hashlib.sha256).digest()
+
+def _run_bounded(calls: Sequence[Callable[[], T]], concurrency: int | None) -> list[T]:
+    if not calls:
+        return []
+    workers = min(_bulk_concurrency(concurrency), len(calls))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-bulk") as pool:
+        futures = [pool.submit(call) for call in calls]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+async def _gather_bounded(
+    calls: Sequence[Callable[[], Awaitable[T]]], concurrency: int | None
+) -> list[T]:
+    semaphore = asyncio.Semaphore(_bulk_concurrency(concurrency))
+
+    async def run(call: Callable[[], Awaitable[T]]) -> T:
+        async with semaphore:
+            return await call()
+
+    return list(await asyncio.gather(*(run(call) for call in calls)))
+
+
+def _hash_stream(stream: BinaryIO) -> tuple[str, int]:
+    """sha256 e tamanho do restante de ``stream``, que volta à posição inicial."""
+
+    start = stream.tell()
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter_chunks(stream):
+        digest.update(chunk)
+        size += len(chunk)
+    stream.seek(start)
+    return digest.hexdigest(), size
+
+
+def _remaining_size(stream: BinaryIO) -> int | None:
+    """Bytes entre a posição atual e o fim, ou ``None`` sem ``seek``."""
+
+    try:
+        start = stream.tell()
+        end = stream.seek(0, 2)
+        stream.seek(start)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return end - start
+
+
+def _split_bytes(data: bytes, part_size: int) -> Iterator[bytes]:
+    view = memoryview(data)
+    for start in range(0, len(data), part_size):
+        yield bytes(view[start : start + part_size])
+
+
+def _read_parts(stream: BinaryIO, part_size: int) -> Iterator[bytes]:
+    """Partes de ``part_size`` bytes lidas de ``stream``; só a última é menor.
+
+    ``read(n)`` pode devolver menos que ``n`` antes do fim (pipes, leitores
+    gzip/zstd) e o S3 recusa partes intermediárias abaixo de 5 MB, então as
+    leituras são acumuladas até completar cada parte.
+    """
+
+    buffer = bytearray()
+    while chunk := stream.read(part_size - len(buffer)):
+        buffer += chunk
+        if len(buffer) >= part_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def _xml_text(content: bytes, tag: str) -> str | None:
+    if not content:
+        return None
+    root = ElementTree.fromstring(content)
+    if root.tag.rsplit("}", 1)[-1] == tag:
+        return root.text
+    return root.findtext(f".//{{*}}{tag}") or root.findtext(f".//{tag}")
@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.file import File
+from app.services.storage import get_storage_backend
+from app.services.storage.base import StorageBackend
+
+SEGMENT_FILE_NAME = "segment.seg"
+SEGMENT_MIME = "application/octet-stream"
+# Membros do mesmo segmento separados por até isto vêm no mesmo ``Range``.
+_MAX_RANGE_GAP = 1024 * 1024
+
+
+def stored_bytes(file_record: File, storage: StorageBackend | None = None) -> bytes:
+    """Bytes gravados de um ``File`` (ainda comprimidos, se for o caso)."""
+
+    storage = storage or get_storage_backend(file_record.storage_backend)
+    if file_record.segment_offset is None:
+        return storage.read(path=file_record.storage_path)
+    return storage.read_range(
+        path=file_record.storage_path,
+        offset=file_record.segment_offset,
+        length=file_record.segment_length or 0,
+    )
+
+
+def stored_bytes_many(
+    file_records: Sequence[File], storage: StorageBackend | None = None
+) -> list[bytes]:
+    """Bytes gravados de vários ``File``, na ordem recebida.
+
+    Objetos próprios vão em um ``read_many`` por backend; membros de segmento
+    são agrupados por segmento e lidos em faixas contíguas, um ``read_range``
+    por trecho em vez de um por arquivo.
+    """
+
+    contents: list[bytes] = [b""] * len(file_records)
+    loose: dict[str, list[int]] = defaultdict(list)
+    packed: dict[tuple[str, str], list[int]] = defaultdict(list)
+    for index, record in enumerate(file_records):
+        if record.segment_offset is None:
+            loose[record.storage_backend].append(index)
+        else:
+            packed[(record.storage_backend, record.storage_path)].append(index)
+
+    for backend, indexes in loose.items():
+        backend_storage = storage or get_storage_backend(backend)
+        fetched = backend_storage.read_many(
+            paths=[file_records[index].storage_path for index in indexes]
+        )
+        for index, content in zip(indexes, fetched, strict=True):
+            contents[index] = content
+
+    for (backend, path), indexes in packed.items():
+        backend_storage = storage or get_storage_backend(backend)
+        indexes.sort(key=lambda index: file_records[index].segment_offset or 0)
+        for span in _contiguous_spans(file_records, indexes):
+            start = file_records[span[0]].segment_offset or 0
+            end = max(_member_end(file_records[index]) for index in span)
+            block = backend_storage.read_range(
+                path=path, offset=start, length=end - start
+            )
+            for index in span:
+                offset = (file_records[index].segment_offset or 0) - start
+                contents[index] = block[
+                    offset : offset + (file_records[index].segment_length or 0)
+                ]
+    return contents
+
+
+def _member_end(record: File) -> int:
+    return (record.segment_offset or 0) + (record.segment_length or 0)
+
+
+def _contiguous_spans(
+    file_records: Sequence[File], indexes: list[int]
+) -> list[list[int]]:
+    spans: list[list[int]] = []
+    end = 0
+    for index in indexes:
+        record = file_records[index]
+        if spans and (record.segment_offset or 0) - end <= _MAX_RANGE_GAP:
+            spans[-1].append(index)
+            end = max(end, _member_end(record))
+        else:
+            spans.append([index])
+            end = _member_end(record)
+    return spans
+
+
+@dataclass(slots=True)
+class CompactionResult:
+    files: int = 0
+    segments: int = 0
+    bytes_written: int = 0
+    # Objetos que nenhum ``File`` referencia mais; remover após o commit.
+    obsolete_paths: list[str] = field(default_factory=list)
+
+
+class SegmentCompactor:
+    """Junta os XMLs pequenos de uma organização em segmentos grandes.
+
+    Cada XML enviado sozinho vira um objeto próprio no storage. A compactação
+    copia os bytes gravados (comprimidos ou não) de arquivos de até
+    ``STORAGE_SEGMENT_MAX_MEMBER_SIZE`` para segmentos de até
+    ``STORAGE_SEGMENT_SIZE`` e registra em cada ``File`` o segmento
+    (``storage_path``), o ``segment_offset`` e o ``segment_length``; o
+    ``sha256`` do arquivo continua valendo para conferir a leitura. Segmentos
+    com menos de ``STORAGE_SEGMENT_MIN_LIVE_RATIO`` dos bytes ainda em uso, ou
+    pequenos demais, são regravados junto com os arquivos novos.
+
+    ``compact`` só altera a sessão; os objetos antigos devem ser apagados com
+    ``purge`` depois do commit, para que uma falha no meio não deixe ``File``
+    apontando para um objeto removido.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        storage: StorageBackend | None = None,
+        *,
+        segment_size: int | None = None,
+        max_member_size: int | None = None,
+        min_live_ratio: float | None = None,
+    ) -> None:
+        self.session = session
+        self.storage = storage or get_storage_backend()
+        self.segment_size = segment_size or settings.storage_segment_size
+        self.max_member_size = min(
+            max_member_size or settings.storage_segment_max_member_size,
+            self.segment_size,
+        )
+        self.min_live_ratio = (
+            settings.storage_segment_min_live_ratio
+            if min_live_ratio is None
+            else min_live_ratio
+        )
+
+    def compact(self, org_id: int) -> CompactionResult:
+        result = CompactionResult()
+        candidates = self._candidates(org_id)
+        if not candidates:
+            return result
+
+        old_paths = {record.storage_path for record in candidates}
+        for group in self._groups(candidates):
+            contents = stored_bytes_many(group, self.storage)
+            stored = self.storage.store(
+                org_id=org_id,
+                file_name=SEGMENT_FILE_NAME,
+                content=b"".join(contents),
+                content_type=SEGMENT_MIME,
+            )
+            offset = 0
+            for record, content in zip(group, contents, strict=True):
+                record.storage_path = stored.path
+                record.segment_offset = offset
+                record.segment_length = len(content)
+                offset += len(content)
+            result.files += len(group)
+            result.segments += 1
+            result.bytes_written += offset
+        self.session.flush()
+
+        still_used = set(
+            self.session.scalars(
+                select(File.storage_path).where(
+                    File.storage_backend == self.storage.name,
+                    File.storage_path.in_(old_paths),
+                )
+            )
+        )
+        result.obsolete_paths = sorted(old_paths - still_used)
+        return result
+
+    def purge(self, paths: Sequence[str]) -> None:
+        for path in paths:
+            self.storage.delete(path=path)
+
+    # ------------------------------------------------------------------
+    def _candidates(self, org_id: int) -> list[File]:
+        loose = list(
+            self.session.scalars(
+                select(File)
+                .where(
+                    File.org_id == org_id,
+                    File.storage_backend == self.storage.name,
+                    File.segment_offset.is_(None),
+                    File.size_bytes <= self.max_member_size,
+                    or_(File.file_name.ilike("%.xml"), File.mime.ilike("%xml%")),
+                )
+                .order_by(File.id)
+            )
+        )
+        sparse: list[str] = []
+        small: list[str] = []
+        for path, live_bytes in self.session.execute(
+            select(File.storage_path, func.sum(File.segment_length))
+            .where(
+                File.org_id == org_id,
+                File.storage_backend == self.storage.name,
+                File.segment_offset.is_not(None),
+            )
+            .group_by(File.storage_path)
+        ):
+            size = self.storage.stat(path=path).size
+            if live_bytes < self.min_live_ratio * size:
+                sparse.append(path)
+            elif size < self.min_live_ratio * self.segment_size:
+                small.append(path)
+        # Segmentos pequenos só valem a regravação se houver com o que juntá-los.
+        rewrite = sparse + (small if loose or len(small) > 1 else [])
+        if not rewrite:
+            return loose if len(loose) > 1 else []
+        packed = self.session.scalars(
+            select(File)
+            .where(
+                File.storage_backend == self.storage.name,
+                File.storage_path.in_(rewrite),
+            )
+            .order_by(File.storage_path, File.segment_offset)
+        )
+        return list(packed) + loose
+
+    def _groups(self, candidates: list[File]) -> list[list[File]]:
+        groups: list[list[File]] = []
+        size = 0
+        for record in candidates:
+            length = record.segment_length or record.size_bytes
+            if not groups or size + length > self.segment_size:
+                groups.append([])
+                size = 0
+            groups[-1].append(record)
+            size += length
+        return groups
@@ -1,28 +1,36 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Iterable
+from typing import Any, Iterable, Sequence
 
-from sqlalchemy import delete
+from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 
 from app.models.audit_finding import AuditFinding
 from app.models.audit_run import AuditRun, AuditStatus
 from app.models.invoice import Invoice
 from app.models.invoice_item import InvoiceItem
-from app.services.rules_engine import RuleEngine
+from app.services.bulk_persistence import BulkWriter
+from app.services.rules_engine import RuleResult
 from app.services.ruleset_service import RuleSetService
 
 
 class RuleAuditCalculator:
     """Executa regras DSL para gerar achados de auditoria."""
 
-    def __init__(self, session: Session, org_id: int) -> None:
+    def __init__(
+        self,
+        session: Session,
+        org_id: int,
+        *,
+        persistence_strategy: str | None = None,
+    ) -> None:
         self.session = session
         self.org_id = org_id
+        self.writer = BulkWriter(session, persistence_strategy)
         self.rulesets = RuleSetService(session)
         self.composed = self.rulesets.compose_for_org(org_id)
-        self.engine = RuleEngine(self.composed.rules)
+        self.engine = self.composed.build_engine()
 
     def bind_to_run(self, audit_run: AuditRun) -> None:
         target_ruleset = self.composed.override or self.composed.baseline
@@ -33,13 +41,29 @@ class RuleAuditCalculator:
         summary["metadata"] = metadata
         audit_run.summary = summary
 
+    def evaluate_batch(self, invoices: Sequence[Invoice]) -> list[list[RuleResult]]:
+        """Avalia várias notas de uma vez (ver ``RuleEngine.evaluate_batch``)."""
+
+        return self.engine.evaluate_batch(invoices)
+
     def persist_results(
         self,
         *,
         audit_run: AuditRun,
         invoice: Invoice,
         items: Iterable[InvoiceItem] | None = None,
-    ) -> list[AuditFinding]:
+        results: list[RuleResult] | None = None,
+    ) -> list[AuditFinding] | list[dict[str, Any]]:
+        """Substitui os achados da nota nesta auditoria.
+
+        Com ``PERSISTENCE_STRATEGY`` ``insert``/``copy`` os achados são gravados
+        em lote, sem objetos ORM, e o retorno são as linhas inseridas; com
+        ``orm`` são devolvidos os ``AuditFinding`` adicionados à sessão.
+        """
+
+        if not self.writer.uses_orm:
+            return self._persist_bulk(audit_run, invoice, items, results)
+
         audit_run.started_at = audit_run.started_at or datetime.utcnow()
         audit_run.status = AuditStatus.RUNNING
         self.session.flush()
@@ -52,7 +76,10 @@ class RuleAuditCalculator:
         )
         self.session.flush()
 
-        results = self.engine.evaluate(invoice=invoice, items=items or invoice.items)
+        if results is None:
+            results = self.engine.evaluate(
+                invoice=invoice, items=items or invoice.items
+            )
         findings: list[AuditFinding] = []
         for result in results:
             finding = AuditFinding(
@@ -73,6 +100,107 @@ class RuleAuditCalculator:
         self.session.flush()
         return findings
 
+    def reuse_findings(
+        self,
+        *,
+        audit_run: AuditRun,
+        invoice: Invoice,
+    ) -> list[AuditFinding] | list[dict[str, Any]] | None:
+        """Copia para ``audit_run`` os achados da última auditoria da nota.
+
+        Só vale quando essa auditoria terminou depois da última gravação da
+        nota (``indexed_at``) e usou as mesmas versões de baseline/override;
+        caso contrário devolve ``None`` e quem chamou deve usar
+        ``persist_results``. Auditorias sem achados para a nota não servem de
+        referência, então notas sem achados são sempre reavaliadas.
+        """
+
+        if invoice.indexed_at is None:
+            return None
+        previous = self.session.scalars(
+            select(AuditRun)
+            .where(
+                AuditRun.org_id == self.org_id,
+                AuditRun.id != audit_run.id,
+                AuditRun.status == AuditStatus.DONE,
+                AuditRun.finished_at >= invoice.indexed_at,
+                AuditRun.findings.any(AuditFinding.invoice_id == invoice.id),
+            )
+            .order_by(AuditRun.finished_at.desc(), AuditRun.id.desc())
+            .limit(1)
+        ).first()
+        if previous is None:
+            return None
+        rules = ((previous.summary or {}).get("metadata") or {}).get("rules")
+        if rules != self.composed.metadata["sources"]:
+            return None
+
+        previous_findings = self.session.scalars(
+            select(AuditFinding)
+            .where(
+                AuditFinding.audit_run_id == previous.id,
+                AuditFinding.invoice_id == invoice.id,
+            )
+            .order_by(AuditFinding.id)
+        ).all()
+        rows = [
+            {
+                "audit_run_id": audit_run.id,
+                "invoice_id": invoice.id,
+                "item_id": finding.item_id,
+                "rule_id": finding.rule_id,
+                "inconsistency_code": finding.inconsistency_code,
+                "severity": finding.severity,
+                "message_pt": finding.message_pt,
+                "suggestion_code": finding.suggestion_code,
+                "references": finding.references,
+                "evidence": finding.evidence or {},
+            }
+            for finding in previous_findings
+        ]
+
+        audit_run.started_at = audit_run.started_at or datetime.utcnow()
+        audit_run.status = AuditStatus.RUNNING
+        self.session.flush()
+        self.session.execute(
+            delete(AuditFinding).where(
+                AuditFinding.audit_run_id == audit_run.id,
+                AuditFinding.invoice_id == invoice.id,
+            )
+        )
+        if not self.writer.uses_orm:
+            self.writer.insert_rows(AuditFinding, rows)
+            return rows
+        findings = [AuditFinding(**row) for row in rows]
+        self.session.add_all(findings)
+        self.session.flush()
+        return findings
+
+    def _persist_bulk(
+        self,
+        audit_run: AuditRun,
+        invoice: Invoice,
+        items: Iterable[InvoiceItem] | None,
+        results: list[RuleResult] | None,
+    ) -> list[dict[str, Any]]:
+        # Um único flush, e só quando a run ainda não foi marcada como iniciada.
+        if audit_run.status != AuditStatus.RUNNING or audit_run.started_at is None:
+            audit_run.started_at = audit_run.started_at or datetime.utcnow()
+            audit_run.status = AuditStatus.RUNNING
+            self.session.flush()
+
+        self.session.execute(
+            delete(AuditFinding).where(
+                AuditFinding.audit_run_id == audit_run.id,
+                AuditFinding.invoice_id == invoice.id,
+            )
+        )
+        if results is None:
+            results = self.engine.evaluate(
+                invoice=invoice, items=items or invoice.items
+            )
+        return self.writer.insert_findings(audit_run.id, invoice.id, results)
+
 
 # Compatibilidade com código existente
 ZFMAuditCalculator = RuleAuditCalculator
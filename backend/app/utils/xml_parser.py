@@ -2,11 +2,12 @@ from __future__ import annotations
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import date, datetime
 from decimal import Decimal
+from io import BytesIO
 from pathlib import Path
-from typing import Any, Iterable
+from typing import IO, Any, Iterable
 
 from lxml import etree
 
@@ -54,17 +55,69 @@ class XMLParser:
     relevantes para o motor de auditoria.
     """
 
-    def __init__(self, validate_xsd: bool = False) -> None:
+    def __init__(
+        self,
+        validate_xsd: bool = False,
+        *,
+        streaming: bool = False,
+        strategy: str = "dispatch",
+    ) -> None:
+        if strategy not in PARSER_STRATEGIES:
+            raise ValueError(f"Estratégia de parser desconhecida: {strategy}")
         self.validate_xsd = validate_xsd
+        self.streaming = streaming
+        self.strategy = strategy
+        self._item_parser = (
+            self._parse_item_dispatch if strategy == "dispatch" else self._parse_item
+        )
 
     def parse(self, file_path: Path) -> ParsedInvoice:
+        if self.streaming:
+            return self.parse_stream(str(file_path))
         tree = etree.parse(str(file_path))
         return self._parse_tree(tree)
 
     def parse_bytes(self, payload: bytes) -> ParsedInvoice:
+        if self.streaming:
+            return self.parse_stream(BytesIO(payload))
         tree = etree.fromstring(payload)
         return self._parse_tree(etree.ElementTree(tree))
 
+    def parse_stream(self, source: str | Path | IO[bytes]) -> ParsedInvoice:
+        """Lê o XML com ``iterparse``, sem manter a árvore inteira em memória.
+
+        Cabeçalho (``ide``, ``emit``, ``dest``, ``ICMSTot``) e itens (``det``)
+        são extraídos no evento de fim de cada elemento, que em seguida é
+        descartado junto com os irmãos já processados. O resultado é idêntico
+        ao de ``parse``/``parse_bytes``.
+        """
+
+        state = _StreamState()
+        context = etree.iterparse(
+            str(source) if isinstance(source, Path) else source,
+            events=('start', 'end'),
+            tag=_STREAM_TAGS,
+        )
+        for event, elem in context:
+            if elem.getparent() is None:
+                # ``.//`` nunca casa com a raiz no parser em árvore.
+                continue
+            tag = elem.tag.rpartition('}')[2]
+            if event == 'start':
+                state.start(tag, elem)
+                continue
+            if tag == 'det':
+                state.items.append(self._item_parser(elem))
+            elif elem is state.pending.get(tag):
+                state.finish(self, tag, elem)
+            elif tag == 'ide' and state.cnf is None:
+                state.cnf = elem.findtext('{*}cNF')
+            elif tag == 'chNFe' and state.chnfe is None:
+                state.chnfe = elem.text or ''
+            if tag in _RELEASED_TAGS:
+                self._release(elem)
+        return state.build(self)
+
     # ------------------------------------------------------------------
     def _parse_tree(self, tree: etree._ElementTree) -> ParsedInvoice:
         root = tree.getroot()
@@ -81,7 +134,7 @@ class XMLParser:
         total_value = self._decimal(self._text(total, 'vNF'))
         freight_value = self._decimal(self._text(total, 'vFrete'), allow_none=True)
 
-        items = [self._parse_item(node) for node in root.findall('.//{*}det')]
+        items = [self._item_parser(node) for node in root.findall('.//{*}det')]
         has_st = any(item.icms_st_value and item.icms_st_value > 0 for item in items)
 
         metadata = {
@@ -152,6 +205,81 @@ class XMLParser:
             other_taxes=other_taxes,
         )
 
+    def _parse_item_dispatch(self, node: etree._Element) -> ParsedInvoiceItem:
+        """Mesmo resultado de ``_parse_item`` percorrendo cada subárvore uma vez.
+
+        Em vez de uma busca ``.//{*}`` por tributo e por campo, coleta o
+        primeiro texto de cada tag de ``prod`` e dos grupos ``ICMS``, ``IPI``,
+        ``PIS`` e ``COFINS`` em uma única passada, buscando primeiro pelo
+        namespace da NF-e e só então pelo curinga.
+        """
+
+        prod = imposto = None
+        if node.tag.startswith(_NFE_PREFIX):
+            prod = node.find(_NFE_PROD)
+            imposto = node.find(_NFE_IMPOSTO)
+        # Filhos fora do namespace do ``det`` (XMLs mistos) só o curinga acha.
+        if prod is None:
+            prod = node.find('{*}prod')
+        if imposto is None:
+            imposto = node.find('{*}imposto')
+
+        prod_texts = _first_texts(prod, recursive=False)
+        groups: dict[str, etree._Element] = {}
+        if imposto is not None:
+            for elem in imposto.iter(_TAX_GROUP_TAGS):
+                groups.setdefault(_local_name(elem.tag), elem)
+        icms = _first_texts(groups.get('ICMS'))
+        decimal = self._decimal
+
+        def first(texts: dict[str, str], *tags: str) -> str | None:
+            for tag in tags:
+                value = texts.get(tag)
+                if value:
+                    return value
+            return None
+
+        other_taxes: dict[str, Any] = {}
+        for tag, (alias, value_tag) in _OTHER_TAXES.items():
+            text_value = first(_first_texts(groups.get(tag)), value_tag)
+            value = (
+                decimal(text_value, allow_none=True) if text_value is not None else None
+            )
+            if value is not None:
+                other_taxes[alias] = float(value)
+
+        prod_text = prod_texts.get if prod is not None else _no_text
+        return ParsedInvoiceItem(
+            seq=int(node.get('nItem', '0') or 0),
+            product_code=prod_text('cProd') or '',
+            description=prod_text('xProd') or '',
+            ncm=prod_text('NCM'),
+            cest=prod_text('CEST'),
+            cfop=prod_text('CFOP'),
+            cst=first(icms, 'CSOSN', 'CST'),
+            quantity=decimal(prod_text('qCom') or '0'),
+            unit_value=decimal(prod_text('vUnCom') or '0'),
+            total_value=decimal(prod_text('vProd') or '0'),
+            freight_alloc=decimal(prod_text('vFrete'), allow_none=True),
+            discount=decimal(prod_text('vDesc'), allow_none=True),
+            bc_icms=decimal(first(icms, 'vBC', 'vBCOp'), allow_none=True),
+            icms_value=decimal(first(icms, 'vICMS', 'vICMSOp'), allow_none=True),
+            bc_st=decimal(first(icms, 'vBCST', 'vBCSTRet'), allow_none=True),
+            icms_st_value=decimal(
+                first(icms, 'vICMSST', 'vICMSSTDeson'), allow_none=True
+            ),
+            other_taxes=other_taxes,
+        )
+
+    @staticmethod
+    def _release(elem: etree._Element) -> None:
+        elem.clear()
+        parent = elem.getparent()
+        if parent is None:  # pragma: no cover - raiz nunca é liberada
+            return
+        while elem.getprevious() is not None:
+            del parent[0]
+
     # ------------------------------------------------------------------
     def _extract_access_key(self, root: etree._Element) -> str:
         inf_nfe = root.find('.//{*}infNFe')
@@ -195,3 +323,133 @@ class XMLParser:
             return Decimal(value.replace(',', '.'))
         except Exception:  # pragma: no cover - valores inesperados
             return None if allow_none else Decimal('0')
+
+
+PARSER_STRATEGIES = ('wildcard', 'dispatch')
+
+NFE_NAMESPACE = 'http://www.portalfiscal.inf.br/nfe'
+_NFE_PREFIX = f'{{{NFE_NAMESPACE}}}'
+_NFE_PROD = f'{_NFE_PREFIX}prod'
+_NFE_IMPOSTO = f'{_NFE_PREFIX}imposto'
+_TAX_GROUP_TAGS = [
+    f'{{*}}{tag}' for tag in ('ICMS', 'IPI', 'PIS', 'COFINS')
+]
+_OTHER_TAXES = {
+    'IPI': ('ipi', 'vIPI'),
+    'PIS': ('pis', 'vPIS'),
+    'COFINS': ('cofins', 'vCOFINS'),
+}
+_LOCAL_NAMES: dict[str, str] = {}
+
+
+def _local_name(tag: str) -> str:
+    name = _LOCAL_NAMES.get(tag)
+    if name is None:
+        name = _LOCAL_NAMES[tag] = tag.rpartition('}')[2]
+    return name
+
+
+def _no_text(tag: str) -> None:
+    return None
+
+
+def _first_texts(
+    node: etree._Element | None, *, recursive: bool = True
+) -> dict[str, str]:
+    """Texto do primeiro elemento de cada tag (como ``findtext``), numa passada.
+
+    Com ``recursive=False`` considera só os filhos diretos (``{*}tag``); caso
+    contrário, todos os descendentes (``.//{*}tag``).
+    """
+
+    texts: dict[str, str] = {}
+    if node is None:
+        return texts
+    elements = node.iterdescendants() if recursive else node.iterchildren()
+    for elem in elements:
+        tag = elem.tag
+        if isinstance(tag, str):
+            name = _local_name(tag)
+            if name not in texts:
+                texts[name] = elem.text or ''
+    return texts
+
+
+_HEADER_TAGS = ('ide', 'emit', 'dest', 'ICMSTot')
+_STREAM_TAGS = [
+    f'{{*}}{tag}' for tag in (*_HEADER_TAGS, 'det', 'infNFe', 'chNFe')
+]
+# Elementos descartados após o evento de fim (junto com os irmãos anteriores).
+_RELEASED_TAGS = frozenset({*_HEADER_TAGS, 'det'})
+
+
+@dataclass(slots=True)
+class _StreamState:
+    """Valores coletados durante ``XMLParser.parse_stream``."""
+
+    pending: dict[str, etree._Element] = field(default_factory=dict)
+    header: dict[str, str | None] = field(default_factory=dict)
+    seen: set[str] = field(default_factory=set)
+    items: list[ParsedInvoiceItem] = field(default_factory=list)
+    infnfe_id: str | None = None
+    chnfe: str | None = None
+    cnf: str | None = None
+
+    def start(self, tag: str, elem: etree._Element) -> None:
+        if tag == 'infNFe':
+            if 'infNFe' not in self.seen:
+                self.seen.add('infNFe')
+                self.infnfe_id = elem.get('Id')
+            return
+        if tag not in _HEADER_TAGS or tag in self.seen:
+            return
+        if tag == 'ICMSTot':
+            parent = elem.getparent()
+            if parent is None or parent.tag.rpartition('}')[2] != 'total':
+                return
+        # Primeiro elemento em ordem de documento, como ``find('.//{*}tag')``.
+        self.seen.add(tag)
+        self.pending[tag] = elem
+
+    def finish(self, parser: XMLParser, tag: str, elem: etree._Element) -> None:
+        del self.pending[tag]
+        text = parser._text
+        if tag == 'ide':
+            for child in ('UF', 'dhEmi', 'dEmi', 'mod', 'serie', 'nNF'):
+                self.header[f'ide.{child}'] = text(elem, child)
+            if self.cnf is None:
+                self.cnf = elem.findtext('{*}cNF')
+        elif tag == 'emit':
+            self.header['emit.CNPJ'] = text(elem, 'CNPJ')
+        elif tag == 'dest':
+            self.header['dest.CNPJ'] = text(elem, 'CNPJ')
+            self.header['dest.UF'] = text(elem, 'UF')
+        else:
+            self.header['total.vNF'] = text(elem, 'vNF')
+            self.header['total.vFrete'] = text(elem, 'vFrete')
+
+    def build(self, parser: XMLParser) -> ParsedInvoice:
+        header = self.header.get
+        if self.infnfe_id:
+            access_key = self.infnfe_id.replace('NFe', '')
+        else:
+            access_key = self.chnfe or self.cnf or ''
+        items = self.items
+        return ParsedInvoice(
+            access_key=access_key,
+            emitente_cnpj=header('emit.CNPJ'),
+            destinatario_cnpj=header('dest.CNPJ'),
+            uf=header('ide.UF') or header('dest.UF') or "",
+            issue_date=parser._parse_issue_date(
+                header('ide.dhEmi') or header('ide.dEmi')
+            ),
+            total_value=parser._decimal(header('total.vNF')),
+            freight_value=parser._decimal(header('total.vFrete'), allow_none=True),
+            has_st=any(item.icms_st_value and item.icms_st_value > 0 for item in items),
+            items=items,
+            metadata={
+                'model': header('ide.mod'),
+                'series': header('ide.serie'),
+                'number': header('ide.nNF'),
+            },
+        )
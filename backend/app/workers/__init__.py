@@ -13,6 +13,10 @@ celery_app.conf.beat_schedule = {
         "task": "app.workers.tasks.reset_monthly_limits",
         "schedule": 60 * 60 * 24,
     },
+    "compact-storage-segments": {
+        "task": "app.workers.tasks.compact_storage_segments",
+        "schedule": 60 * 60 * 24,
+    },
 }
 
 celery_app.autodiscover_tasks(["app.workers"])
@@ -1,30 +1,211 @@
 from __future__ import annotations
 
-import zipfile
+from contextlib import closing
 from datetime import datetime
-from io import BytesIO
-from pathlib import Path
 
-from celery import shared_task
-from sqlalchemy.orm import Session
+from celery import chord, shared_task
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
 
+from app.core.config import settings
 from app.db.session import SessionLocal
 from app.models.audit_run import AuditRun, AuditStatus
 from app.models.file import File
 from app.models.invoice import Invoice
 from app.models.org_setting import OrgSetting
-from app.services.invoice_ingestion import InvoiceIngestor
-from app.services.storage import get_storage_backend
+from app.services.batch_ingestion import (
+    StoredZip,
+    ZipBatchParser,
+    ZipSource,
+    merge_chunk_results,
+    open_zip,
+    plan_chunks,
+    record_chunk_progress,
+    xml_members,
+)
+from app.services.invoice_ingestion import UPSERT_BATCH_SIZE, InvoiceIngestor
+from app.services.storage.segments import SegmentCompactor
 from app.services.zfm_calculator import ZFMAuditCalculator
+from app.services.audit_events import get_event_broker
 from app.services.audit_summary import AuditSummaryBuilder
 from app.services.audit_report import AuditReportBuilder
 from app.services.org_plan_limits import OrgPlanLimiter, PlanLimitError
+from app.utils.xml_parser import ParsedInvoice
+
+
+# Notas avaliadas por vez em ``run_audit`` (avaliação em lote por colunas).
+AUDIT_BATCH_SIZE = 500
 
 
 def _get_session() -> Session:
     return SessionLocal()
 
 
+def _stored_zip(
+    session: Session, raw_file_id: int, zip_path: str
+) -> tuple[File, StoredZip]:
+    """Arquivo de origem e o ZIP como ``StoredZip``, lido direto do storage.
+
+    O ``ZipBatchParser`` abre o objeto com ``storage.open``: em disco é o
+    próprio arquivo; no S3, só o diretório central e os membros da faixa
+    chegam por ``Range`` GETs. Subtarefas e retentativas de um lote baixam
+    apenas os próprios bytes, e o lote nunca passa inteiro pela memória.
+    """
+
+    raw_file = session.get(File, raw_file_id)
+    if not raw_file:
+        raise ValueError('Arquivo de origem não encontrado')
+    return raw_file, StoredZip(backend=raw_file.storage_backend, path=zip_path)
+
+
+def _ingest_zip_members(
+    session: Session,
+    *,
+    zip_source: ZipSource,
+    org_id: int,
+    audit_run: AuditRun,
+    raw_file: File,
+    calculator: ZFMAuditCalculator,
+    start: int = 0,
+    stop: int | None = None,
+) -> tuple[int, int]:
+    """Grava e audita os XMLs ``[start, stop)`` do ZIP em ``session``.
+
+    A cota de uploads é verificada e registrada uma vez por faixa, logo antes
+    do commit, para que o bloqueio da linha de ``org_settings`` dure pouco
+    mesmo com várias subtarefas do mesmo lote em paralelo.
+    """
+
+    ingestor = InvoiceIngestor()
+    processed = 0
+    total_findings = 0
+
+    # Descompactação e parse acontecem no pool; a gravação continua em uma
+    # única sessão, na ordem dos membros do ZIP.
+    batch_parser = ZipBatchParser(
+        workers=settings.ingestion_workers,
+        executor=settings.ingestion_executor,
+    )
+    members = batch_parser.iter_parsed(zip_source, start=start, stop=stop)
+
+    def flush_batch(batch: list[ParsedInvoice]) -> None:
+        nonlocal processed, total_findings
+        invoices = [
+            ingest_result.invoice
+            for ingest_result in ingestor.ingest_parsed_batch(
+                session=session,
+                org_id=org_id,
+                parsed_invoices=batch,
+                file_record=raw_file,
+            )
+        ]
+        # Chaves repetidas no lote já foram gravadas com a última ocorrência.
+        unique = list({invoice.id: invoice for invoice in invoices}.values())
+        for invoice, results in zip(
+            unique, calculator.evaluate_batch(unique), strict=True
+        ):
+            findings = calculator.persist_results(
+                audit_run=audit_run, invoice=invoice, results=results
+            )
+            total_findings += len(findings)
+        processed += len(batch)
+
+    with closing(members):
+        batch: list[ParsedInvoice] = []
+        for member in members:
+            batch.append(member.parsed)
+            if len(batch) >= UPSERT_BATCH_SIZE:
+                flush_batch(batch)
+                batch = []
+        if batch:
+            flush_batch(batch)
+
+    if processed:
+        limiter = OrgPlanLimiter(session)
+        try:
+            setting = limiter.ensure_upload_quota(org_id, new_files=processed)
+        except PlanLimitError as exc:
+            raise ValueError(exc.message) from exc
+        limiter.register_usage(setting, uploaded_files=processed)
+    return processed, total_findings
+
+
+def _lock_audit_run(session: Session, audit_run_id: int) -> AuditRun:
+    # Subtarefas do mesmo lote atualizam ``summary`` em paralelo: relê a linha
+    # sob bloqueio antes de alterar o JSON.
+    audit_run = (
+        session.query(AuditRun)
+        .filter(AuditRun.id == audit_run_id)
+        .with_for_update()
+        .populate_existing()
+        .one_or_none()
+    )
+    if not audit_run:
+        raise ValueError('Audit run not found')
+    return audit_run
+
+
+def _finish_zip_audit(
+    session: Session, audit_run: AuditRun, raw_file: File, processed: int
+) -> None:
+    metadata = dict((audit_run.summary or {}).get('metadata') or {})
+    metadata.update(
+        {
+            'source': 'zip_batch',
+            'file_id': raw_file.id,
+            'file_name': raw_file.file_name,
+        }
+    )
+    summary_builder = AuditSummaryBuilder(session)
+    audit_run.summary = summary_builder.build(
+        audit_run,
+        processed_invoices=processed,
+        existing_summary={**(audit_run.summary or {}), 'metadata': metadata},
+    )
+    audit_run.status = AuditStatus.DONE
+    audit_run.finished_at = datetime.utcnow()
+
+
+def _mark_failed(session: Session, audit_run_id: int, exc: Exception) -> None:
+    audit_run = _lock_audit_run(session, audit_run_id)
+    audit_run.status = AuditStatus.FAILED
+    audit_run.finished_at = datetime.utcnow()
+    audit_run.summary = {**(audit_run.summary or {}), 'error': str(exc)}
+    session.add(audit_run)
+    session.commit()
+    _publish_status(audit_run)
+
+
+def _publish_progress(audit_run: AuditRun, *, new_findings: int = 0) -> None:
+    """Avisa os assinantes (SSE) do progresso gravado em ``summary``."""
+
+    progress = ((audit_run.summary or {}).get('metadata') or {}).get('progress') or {}
+    get_event_broker().publish(
+        audit_run.id,
+        {
+            'type': 'progress',
+            'audit_run_id': audit_run.id,
+            **progress,
+            'new_findings': new_findings,
+        },
+    )
+
+
+def _publish_status(audit_run: AuditRun) -> None:
+    summary = audit_run.summary or {}
+    get_event_broker().publish(
+        audit_run.id,
+        {
+            'type': 'status',
+            'audit_run_id': audit_run.id,
+            'status': audit_run.status,
+            'processed_invoices': summary.get('processed_invoices', 0),
+            'total_findings': summary.get('total_findings', 0),
+            'error': summary.get('error'),
+        },
+    )
+
+
 @shared_task
 def parse_xml_batch(
     zip_path: str,
@@ -33,6 +214,14 @@ def parse_xml_batch(
     raw_file_id: int,
     requested_by: int | None = None,
 ) -> dict:
+    """Processa um ZIP de XMLs.
+
+    Lotes com até ``INGESTION_CHUNK_SIZE`` XMLs são processados nesta mesma
+    task. Lotes maiores são divididos em faixas, cada uma processada por uma
+    subtarefa ``parse_xml_chunk`` sobre o ZIP armazenado; um chord chama
+    ``finalize_xml_batch`` ao final para consolidar o resumo uma única vez.
+    """
+
     session = _get_session()
     audit_run: AuditRun | None = None
     try:
@@ -40,67 +229,66 @@ def parse_xml_batch(
         if not audit_run:
             raise ValueError('Audit run not found')
 
-        raw_file = session.get(File, raw_file_id)
-        if not raw_file:
-            raise ValueError('Arquivo de origem não encontrado')
-
-        storage = get_storage_backend(raw_file.storage_backend)
-        zip_bytes = storage.read(path=zip_path)
+        raw_file, zip_source = _stored_zip(session, raw_file_id, zip_path)
+        with open_zip(zip_source) as archive:
+            total_invoices = len(xml_members(archive))
+        chunks = plan_chunks(total_invoices, settings.ingestion_chunk_size)
 
         audit_run.status = AuditStatus.RUNNING
         audit_run.started_at = datetime.utcnow()
-        session.flush()
-
-        ingestor = InvoiceIngestor()
-        limiter = OrgPlanLimiter(session)
         calculator = ZFMAuditCalculator(session, org_id)
         calculator.bind_to_run(audit_run)
-        processed = 0
-        total_findings = 0
+        audit_run.summary = record_chunk_progress(
+            audit_run.summary,
+            total_chunks=len(chunks),
+            total_invoices=total_invoices,
+        )
+        # Publica ``RUNNING`` e o total de XMLs para quem acompanha o progresso.
+        session.commit()
+        _publish_progress(audit_run)
 
-        with zipfile.ZipFile(BytesIO(zip_bytes)) as archive:
-            for info in archive.infolist():
-                if info.is_dir() or not info.filename.lower().endswith('.xml'):
-                    continue
-                payload = archive.read(info)
-                try:
-                    setting = limiter.ensure_upload_quota(org_id, new_files=1)
-                except PlanLimitError as exc:
-                    raise ValueError(exc.message) from exc
-                ingest_result = ingestor.ingest_invoice(
-                    session=session,
+        if len(chunks) > 1:
+            header = [
+                parse_xml_chunk.s(
+                    zip_path=zip_path,
                     org_id=org_id,
-                    payload=payload,
-                    file_name=Path(info.filename).name,
-                    mime='application/xml',
-                    uploaded_by=requested_by,
-                    raw_file=raw_file,
+                    audit_run_id=audit_run_id,
+                    raw_file_id=raw_file_id,
+                    start=start,
+                    stop=stop,
                 )
-                findings = calculator.persist_results(
-                    audit_run=audit_run,
-                    invoice=ingest_result.invoice,
+                for start, stop in chunks
+            ]
+            chord(header)(
+                finalize_xml_batch.s(
+                    audit_run_id=audit_run_id, raw_file_id=raw_file_id
                 )
-                limiter.register_usage(setting, uploaded_files=1)
-                processed += 1
-                total_findings += len(findings)
-
-        metadata = dict((audit_run.summary or {}).get('metadata') or {})
-        metadata.update(
-            {
-                'source': 'zip_batch',
-                'file_id': raw_file_id,
-                'file_name': raw_file.file_name,
+            )
+            return {
+                'audit_run_id': audit_run.id,
+                'status': AuditStatus.RUNNING,
+                'chunks': len(chunks),
+                'total_invoices': total_invoices,
             }
+
+        processed, total_findings = _ingest_zip_members(
+            session,
+            zip_source=zip_source,
+            org_id=org_id,
+            audit_run=audit_run,
+            raw_file=raw_file,
+            calculator=calculator,
         )
-        summary_builder = AuditSummaryBuilder(session)
-        audit_run.summary = summary_builder.build(
-            audit_run,
+        audit_run.summary = record_chunk_progress(
+            audit_run.summary,
             processed_invoices=processed,
-            existing_summary={**(audit_run.summary or {}), 'metadata': metadata},
+            completed_chunks=len(chunks),
+            findings=total_findings,
         )
-        audit_run.status = AuditStatus.DONE
-        audit_run.finished_at = datetime.utcnow()
+        _finish_zip_audit(session, audit_run, raw_file, processed)
         session.commit()
+        _publish_progress(audit_run, new_findings=total_findings)
+        _publish_status(audit_run)
         return {
             'audit_run_id': audit_run.id,
             'processed_invoices': processed,
@@ -109,11 +297,82 @@ def parse_xml_batch(
     except Exception as exc:  # pragma: no cover - erros críticos
         session.rollback()
         if audit_run:
-            audit_run.status = AuditStatus.FAILED
-            audit_run.finished_at = datetime.utcnow()
-            audit_run.summary = {**(audit_run.summary or {}), 'error': str(exc)}
-            session.add(audit_run)
-            session.commit()
+            _mark_failed(session, audit_run_id, exc)
+        raise
+    finally:
+        session.close()
+
+
+@shared_task
+def parse_xml_chunk(
+    zip_path: str,
+    org_id: int,
+    audit_run_id: int,
+    raw_file_id: int,
+    start: int,
+    stop: int,
+) -> dict:
+    """Processa os XMLs ``[start, stop)`` de um lote e registra o progresso."""
+
+    session = _get_session()
+    try:
+        audit_run = session.get(AuditRun, audit_run_id)
+        if not audit_run:
+            raise ValueError('Audit run not found')
+        calculator = ZFMAuditCalculator(session, org_id)
+        raw_file, zip_source = _stored_zip(session, raw_file_id, zip_path)
+        processed, total_findings = _ingest_zip_members(
+            session,
+            zip_source=zip_source,
+            org_id=org_id,
+            audit_run=audit_run,
+            raw_file=raw_file,
+            calculator=calculator,
+            start=start,
+            stop=stop,
+        )
+        audit_run = _lock_audit_run(session, audit_run_id)
+        audit_run.summary = record_chunk_progress(
+            audit_run.summary,
+            processed_invoices=processed,
+            completed_chunks=1,
+            findings=total_findings,
+        )
+        session.commit()
+        _publish_progress(audit_run, new_findings=total_findings)
+        return {'processed_invoices': processed, 'total_findings': total_findings}
+    except Exception as exc:  # pragma: no cover - erros críticos
+        session.rollback()
+        _mark_failed(session, audit_run_id, exc)
+        raise
+    finally:
+        session.close()
+
+
+@shared_task
+def finalize_xml_batch(
+    chunk_results: list[dict], audit_run_id: int, raw_file_id: int
+) -> dict:
+    """Callback do chord: soma as faixas e consolida o resumo uma única vez."""
+
+    session = _get_session()
+    try:
+        totals = merge_chunk_results(chunk_results)
+        audit_run = _lock_audit_run(session, audit_run_id)
+        raw_file = session.get(File, raw_file_id)
+        if not raw_file:
+            raise ValueError('Arquivo de origem não encontrado')
+        _finish_zip_audit(session, audit_run, raw_file, totals['processed_invoices'])
+        session.commit()
+        _publish_status(audit_run)
+        return {
+            'audit_run_id': audit_run.id,
+            'processed_invoices': totals['processed_invoices'],
+            'total_findings': totals['total_findings'],
+        }
+    except Exception as exc:  # pragma: no cover - erros críticos
+        session.rollback()
+        _mark_failed(session, audit_run_id, exc)
         raise
     finally:
         session.close()
@@ -133,21 +392,46 @@ def run_audit(audit_run_id: int, invoice_ids: list[int] | None = None) -> dict:
         query = session.query(Invoice).filter(Invoice.org_id == audit_run.org_id)
         if invoice_ids:
             query = query.filter(Invoice.id.in_(invoice_ids))
-        invoices = query.order_by(Invoice.issue_date).all()
+        invoices = (
+            query.options(selectinload(Invoice.items))
+            .order_by(Invoice.issue_date)
+            .all()
+        )
 
         audit_run.started_at = datetime.utcnow()
         audit_run.status = AuditStatus.RUNNING
+        batches = plan_chunks(len(invoices), AUDIT_BATCH_SIZE)
+        audit_run.summary = record_chunk_progress(
+            audit_run.summary,
+            total_chunks=len(batches),
+            total_invoices=len(invoices),
+        )
         session.flush()
+        _publish_progress(audit_run)
 
         processed = 0
         total_findings = 0
-        for invoice in invoices:
-            findings = calculator.persist_results(
-                audit_run=audit_run,
-                invoice=invoice,
+        for start, stop in batches:
+            chunk = invoices[start:stop]
+            batch_results = calculator.evaluate_batch(chunk)
+            batch_findings = 0
+            for invoice, results in zip(chunk, batch_results, strict=True):
+                findings = calculator.persist_results(
+                    audit_run=audit_run,
+                    invoice=invoice,
+                    results=results,
+                )
+                batch_findings += len(findings)
+                processed += 1
+            total_findings += batch_findings
+            # Achados já gravados na sessão; o commit acontece ao final da run.
+            audit_run.summary = record_chunk_progress(
+                audit_run.summary,
+                processed_invoices=len(chunk),
+                completed_chunks=1,
+                findings=batch_findings,
             )
-            total_findings += len(findings)
-            processed += 1
+            _publish_progress(audit_run, new_findings=batch_findings)
 
         summary_builder = AuditSummaryBuilder(session)
         audit_run.summary = summary_builder.build(
@@ -158,6 +442,7 @@ def run_audit(audit_run_id: int, invoice_ids: list[int] | None = None) -> dict:
         audit_run.status = AuditStatus.DONE
         audit_run.finished_at = datetime.utcnow()
         session.commit()
+        _publish_status(audit_run)
         return {
             'audit_run_id': audit_run.id,
             'processed_invoices': processed,
@@ -171,6 +456,7 @@ def run_audit(audit_run_id: int, invoice_ids: list[int] | None = None) -> dict:
             audit_run.summary = {**(audit_run.summary or {}), 'error': str(exc)}
             session.add(audit_run)
             session.commit()
+            _publish_status(audit_run)
         raise
     finally:
         session.close()
@@ -221,3 +507,32 @@ def reset_monthly_limits() -> int:
         return count
     finally:
         session.close()
+
+
+@shared_task
+def compact_storage_segments(org_id: int | None = None) -> dict:
+    """Junta XMLs pequenos em segmentos; sem ``org_id``, todas as organizações.
+
+    Cada organização é commitada antes de apagar os objetos antigos, então uma
+    falha no meio deixa no máximo objetos órfãos, nunca um ``File`` quebrado.
+    """
+
+    session = _get_session()
+    try:
+        compactor = SegmentCompactor(session)
+        org_ids = (
+            [org_id]
+            if org_id is not None
+            else list(session.scalars(select(File.org_id).distinct()))
+        )
+        totals = {'files': 0, 'segments': 0, 'purged_objects': 0}
+        for current in org_ids:
+            result = compactor.compact(current)
+            session.commit()
+            compactor.purge(result.obsolete_paths)
+            totals['files'] += result.files
+            totals['segments'] += result.segments
+            totals['purged_objects'] += len(result.obsolete_paths)
+        return totals
+    finally:
+        session.close()
@@ -0,0 +1 @@
+"""Scripts de medição de desempenho executados sob demanda (fora da suíte)."""
@@ -0,0 +1,115 @@
+"""Mede o ganho do índice de discriminação com conjuntos grandes de regras.
+
+Gera regras sintéticas no formato dos overrides (NCM, CST, UF e CFOP) e compara
+o modo ``compiled`` com e sem ``use_index`` e a avaliação em lote por colunas
+(``evaluate_batch``, requer numpy).
+
+Uso (a partir de ``backend/``)::
+
+    poetry run python -m benchmarks.rules_engine_index --rules 300 --invoices 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+
+from app.services.rule_packs import get_rule_pack
+from app.services.rules_dsl import RuleDSLParser
+from app.services.rules_engine import RuleEngine
+from benchmarks.rules_engine_modes import _signature, build_invoices
+
+_NCMS = ["22030000", "33030010", "84713012"]
+
+
+def build_rules_yaml(count: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    blocks = []
+    for index in range(count):
+        kind = index % 3
+        if kind == 0:
+            ncms = [f"{rng.randint(10000000, 99999999)}" for _ in range(4)]
+            if index % 30 == 0:
+                ncms.append(rng.choice(_NCMS))
+            clause = f"item.ncm in {json.dumps(ncms)}"
+        elif kind == 1:
+            clause = f'item.cst == "{rng.randint(0, 99):02d}"'
+        else:
+            prefix = rng.randint(1, 7)
+            clause = f'item.cfop is not None and item.cfop.startswith("{prefix}")'
+        blocks.append(
+            f"""
+  - id: "BENCH-{index:04d}"
+    name: "Regra sintética {index}"
+    scope: "item"
+    when:
+      all:
+        - invoice.uf == "{rng.choice(["AM", "SP", "RJ", "PA"])}"
+        - '{clause}'
+        - helpers.value_or(item.total_value, 0) > 10
+    then:
+      inconsistency_code: "BENCH"
+      severity: "baixo"
+      message_pt: "Regra sintética"
+      evidence:
+        ncm: item.ncm"""
+        )
+    return "rules:" + "".join(blocks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rules", type=int, default=300)
+    parser.add_argument("--invoices", type=int, default=500)
+    parser.add_argument("--items", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    dsl = RuleDSLParser()
+    rules = (
+        dsl.parse(get_rule_pack("zfm_baseline").yaml).rules
+        + dsl.parse(build_rules_yaml(args.rules)).rules
+    )
+    invoices = build_invoices(args.invoices, args.items)
+    total_items = args.invoices * args.items
+
+    reference = None
+    print(f"{len(rules)} regras | {args.invoices} notas x {args.items} itens")
+    variants = (
+        ("sem índice", False, False),
+        ("com índice", True, False),
+        ("lote", False, True),
+    )
+    for label, use_index, batch in variants:
+        started = time.perf_counter()
+        engine = RuleEngine(rules, use_index=use_index)
+        build_time = time.perf_counter() - started
+
+        best = float("inf")
+        signatures = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            if batch:
+                outputs = engine.evaluate_batch(invoices)
+            else:
+                outputs = [
+                    engine.evaluate(invoice=invoice, items=invoice.items)
+                    for invoice in invoices
+                ]
+            best = min(best, time.perf_counter() - started)
+            signatures = [_signature(results) for results in outputs]
+
+        if reference is None:
+            reference = signatures
+        status = "ok" if signatures == reference else "DIVERGENTE"
+        print(
+            f"{label:>12}: construção {build_time * 1000:8.2f} ms | "
+            f"avaliação {best:8.3f} s | {total_items / best:12,.0f} itens/s | "
+            f"resultados {status}"
+        )
+
+
+if __name__ == "__main__":
+    main()
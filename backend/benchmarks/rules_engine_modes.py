@@ -0,0 +1,131 @@
+"""Compara os modos de avaliação do ``RuleEngine`` com o pacote ZFM.
+
+Uso (a partir de ``backend/``)::
+
+    poetry run python -m benchmarks.rules_engine_modes --invoices 2000 --items 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from dataclasses import dataclass, field
+
+from app.services.rule_packs import get_rule_pack
+from app.services.rules_dsl import RuleDSLParser
+from app.services.rules_engine import ENGINE_MODES, HELPER_CACHE_STATS, RuleEngine
+from app.services.rules_optimizer import ClauseStatistics
+
+
+@dataclass(slots=True)
+class BenchItem:
+    seq: int
+    cfop: str | None
+    ncm: str | None
+    cest: str | None
+    cst: str | None
+    total_value: float
+    icms_st_value: float | None
+
+
+@dataclass(slots=True)
+class BenchInvoice:
+    uf: str
+    has_st: bool
+    total_value: float
+    freight_value: float | None
+    items: list[BenchItem] = field(default_factory=list)
+
+
+def build_invoices(
+    count: int, items_per_invoice: int, seed: int = 42
+) -> list[BenchInvoice]:
+    rng = random.Random(seed)
+    invoices = []
+    for _ in range(count):
+        items = [
+            BenchItem(
+                seq=seq,
+                cfop=rng.choice(["5102", "6102", "6101", None]),
+                ncm=rng.choice(["22030000", "33030010", "84713012", None]),
+                cest=rng.choice([None, "0300100"]),
+                cst=rng.choice(["00", "10", "60", "70"]),
+                total_value=round(rng.uniform(1, 500), 2),
+                icms_st_value=rng.choice([None, 0.0, 12.5]),
+            )
+            for seq in range(1, items_per_invoice + 1)
+        ]
+        items_total = sum(item.total_value for item in items)
+        invoices.append(
+            BenchInvoice(
+                uf=rng.choice(["AM", "AM", "SP", "RJ"]),
+                has_st=rng.random() < 0.2,
+                total_value=round(items_total + rng.choice([0.0, 0.0, 3.5]), 2),
+                freight_value=rng.choice([None, 0.0]),
+                items=items,
+            )
+        )
+    return invoices
+
+
+def _signature(results) -> list[tuple]:
+    return [
+        (result.rule_id, getattr(result.item, "seq", None), result.evidence)
+        for result in results
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--invoices", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rules = RuleDSLParser().parse(get_rule_pack("zfm_baseline").yaml).rules
+    invoices = build_invoices(args.invoices, args.items)
+    total_items = args.invoices * args.items
+
+    # Uma passada com coleta alimenta o modo com cláusulas reordenadas.
+    statistics = ClauseStatistics()
+    profiler = RuleEngine(rules, statistics=statistics, collect_statistics=True)
+    for invoice in invoices:
+        profiler.evaluate(invoice=invoice, items=invoice.items)
+
+    variants: list[tuple[str, dict]] = [(mode, {"mode": mode}) for mode in ENGINE_MODES]
+    variants.append(
+        ("reordered", {"statistics": statistics, "reorder_clauses": True})
+    )
+
+    reference = None
+    print(f"{args.invoices} notas x {args.items} itens ({total_items} itens)")
+    for label, options in variants:
+        started = time.perf_counter()
+        engine = RuleEngine(rules, **options)
+        build_time = time.perf_counter() - started
+
+        best = float("inf")
+        signatures = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            outputs = [
+                engine.evaluate(invoice=invoice, items=invoice.items)
+                for invoice in invoices
+            ]
+            best = min(best, time.perf_counter() - started)
+            signatures = [_signature(results) for results in outputs]
+
+        if reference is None:
+            reference = signatures
+        status = "ok" if signatures == reference else "DIVERGENTE"
+        print(
+            f"{label:>12}: construção {build_time * 1000:8.2f} ms | "
+            f"avaliação {best:8.3f} s | {total_items / best:12,.0f} itens/s | "
+            f"resultados {status}"
+        )
+    print(f"cache de helpers: {HELPER_CACHE_STATS.hit_rate():.1%} de acertos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Compara tempo e pico de memória dos modos do ``XMLParser``.
+
+Gera uma NF-e sintética com muitos ``det`` e mede, em um processo separado por
+combinação de modo (árvore/streaming) e estratégia de itens (``wildcard`` ou
+``dispatch``), o tempo de ``XMLParser.parse``, os itens por segundo e o aumento
+do pico de memória residente.
+
+Uso (a partir de ``backend/``)::
+
+    poetry run python -m benchmarks.xml_parser_modes --items 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.utils.xml_parser import PARSER_STRATEGIES, XMLParser
+
+_ITEM = """
+      <det nItem="{seq}">
+        <prod>
+          <cProd>P{seq:06d}</cProd>
+          <xProd>Produto sintético {seq}</xProd>
+          <NCM>{ncm}</NCM>
+          <CFOP>{cfop}</CFOP>
+          <qCom>2.0000</qCom>
+          <vUnCom>10.5000</vUnCom>
+          <vProd>21.00</vProd>
+        </prod>
+        <imposto>
+          <ICMS>
+            <ICMS10>
+              <orig>0</orig>
+              <CST>10</CST>
+              <vBC>21.00</vBC>
+              <vICMS>1.47</vICMS>
+              <vBCST>27.30</vBCST>
+              <vICMSST>{st}</vICMSST>
+            </ICMS10>
+          </ICMS>
+          <IPI><IPITrib><CST>50</CST><vIPI>1.05</vIPI></IPITrib></IPI>
+          <PIS><PISAliq><CST>01</CST><vPIS>0.14</vPIS></PISAliq></PIS>
+          <COFINS><COFINSAliq><CST>01</CST><vCOFINS>0.64</vCOFINS></COFINSAliq></COFINS>
+        </imposto>
+      </det>"""
+
+
+def build_nfe_xml(items: int) -> bytes:
+    ncms = ("22030000", "33030010", "84713012")
+    body = "".join(
+        _ITEM.format(
+            seq=seq,
+            ncm=ncms[seq % len(ncms)],
+            cfop="6102" if seq % 2 else "5102",
+            st="0.00" if seq % 3 else "1.02",
+        )
+        for seq in range(1, items + 1)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe">
+  <NFe>
+    <infNFe Id="NFe13240211222333000144550020000000771876543210">
+      <ide>
+        <cNF>87654321</cNF><mod>55</mod><serie>1</serie><nNF>1</nNF>
+        <dhEmi>2024-02-10T10:00:00-04:00</dhEmi><UF>AM</UF>
+      </ide>
+      <emit><CNPJ>11222333000144</CNPJ></emit>
+      <dest><CNPJ>55666777000188</CNPJ><UF>AM</UF></dest>{body}
+      <total><ICMSTot><vFrete>0.00</vFrete><vNF>{21 * items:.2f}</vNF></ICMSTot></total>
+    </infNFe>
+  </NFe>
+</nfeProc>
+""".encode()
+
+
+def _measure(path: str, options: dict) -> tuple[float, int, int]:
+    parser = XMLParser(**options)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    parsed = parser.parse(Path(path))
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return elapsed, peak - before, len(parsed.items)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=20000)
+    args = parser.parse_args()
+
+    variants = [
+        (f"{mode}/{strategy}", {"streaming": streaming, "strategy": strategy})
+        for mode, streaming in (("árvore", False), ("streaming", True))
+        for strategy in PARSER_STRATEGIES
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "nfe.xml"
+        path.write_bytes(build_nfe_xml(args.items))
+        size_mb = path.stat().st_size / 1024 / 1024
+        print(f"NF-e sintética: {args.items} itens, {size_mb:.1f} MB")
+        context = multiprocessing.get_context("spawn")
+        for label, options in variants:
+            # Um processo novo por modo: ``ru_maxrss`` é o pico do processo.
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                elapsed, peak_kb, count = pool.submit(
+                    _measure, str(path), options
+                ).result()
+            print(
+                f"{label:>20}: {elapsed:7.3f} s | {count / elapsed:10,.0f} itens/s | "
+                f"pico de memória +{peak_kb / 1024:7.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Mede a descompactação e o parse de lotes ZIP pelo ``ZipBatchParser``.
+
+Gera um ZIP com NF-e sintéticas e compara o modo sequencial com pools de
+threads e de processos, conferindo que as notas chegam na ordem do arquivo.
+A gravação no banco (consumidor único) não entra na medição. Com
+``--from-disk`` o ZIP é gravado em um temporário e lido pelo caminho, como nos
+workers.
+
+Uso (a partir de ``backend/``)::
+
+    poetry run python -m benchmarks.zip_ingestion --files 5000 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import tempfile
+import time
+import zipfile
+
+from app.services.batch_ingestion import ZipBatchParser
+from benchmarks.xml_parser_modes import build_nfe_xml
+
+
+def build_zip(files: int, items: int) -> bytes:
+    payload = build_nfe_xml(items)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for index in range(files):
+            archive.writestr(f"lote/nfe-{index:06d}.xml", payload)
+    return buffer.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--from-disk", action="store_true")
+    args = parser.parse_args()
+
+    zip_bytes = build_zip(args.files, args.items)
+    with tempfile.NamedTemporaryFile(suffix=".zip") as zip_file:
+        zip_file.write(zip_bytes)
+        zip_file.flush()
+        run(args, zip_bytes, zip_file.name if args.from_disk else zip_bytes)
+
+
+def run(args: argparse.Namespace, zip_bytes: bytes, source: bytes | str) -> None:
+    print(
+        f"ZIP sintético: {args.files} XMLs x {args.items} itens, "
+        f"{len(zip_bytes) / 1024 / 1024:.1f} MB"
+    )
+    variants = (
+        ("sequencial", 1, "thread"),
+        (f"threads x{args.workers}", args.workers, "thread"),
+        (f"processos x{args.workers}", args.workers, "process"),
+    )
+    for label, workers, executor in variants:
+        batch = ZipBatchParser(workers=workers, executor=executor)
+        started = time.perf_counter()
+        indexes = [member.index for member in batch.iter_parsed(source)]
+        elapsed = time.perf_counter() - started
+        status = "ok" if indexes == list(range(args.files)) else "FORA DE ORDEM"
+        print(
+            f"{label:>14}: {elapsed:7.3f} s | {args.files / elapsed:9,.0f} XMLs/s | "
+            f"ordem {status}"
+        )
+
+
+if __name__ == "__main__":
+    main()
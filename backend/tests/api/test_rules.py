@@ -4,6 +4,10 @@ from textwrap import dedent
 
 from fastapi.testclient import TestClient
 
+from app.services.ruleset_cache import ruleset_cache
+from app.services.ruleset_service import RuleSetService
+
+
 def test_get_baseline_rules(client: TestClient) -> None:
     response = client.get("/api/v1/rules/baseline")
     assert response.status_code == 200
@@ -56,3 +60,36 @@ def test_put_org_override(client: TestClient, seed_data) -> None:
     assert "ZFM-ST-001" in rule_ids
     custom_rule = next(rule for rule in effective["effective_rules"] if rule["id"] == "ZFM-ST-001")
     assert custom_rule["then"]["inconsistency_code"] == "ST_CUSTOM"
+
+
+def test_compose_for_org_reuses_compiled_ruleset(session, seed_data) -> None:
+    _, org = seed_data
+    service = RuleSetService(session)
+    first = service.compose_for_org(org.id)
+    second = service.compose_for_org(org.id)
+    assert second.compiled is first.compiled
+    assert second.build_engine() is first.build_engine()
+
+    override_yaml = dedent(
+        """
+        rules:
+          - id: "ZFM-CEST-001"
+            name: "CEST custom"
+            scope: "item"
+            when: item.ncm == "22030000"
+            then:
+              inconsistency_code: "CEST_CUSTOM"
+              severity: "baixo"
+              message_pt: "Regra customizada para CEST."
+        """
+    ).strip()
+    service.save_override(org_id=org.id, yaml_text=override_yaml)
+    third = service.compose_for_org(org.id)
+    assert third.override is not None
+    assert third.compiled is not first.compiled
+    assert any(rule.then["inconsistency_code"] == "CEST_CUSTOM" for rule in third.rules)
+    assert len(ruleset_cache) == 2
+
+    # O override substituído sai do cache; a entrada sem override continua.
+    service.save_override(org_id=org.id, yaml_text=override_yaml)
+    assert len(ruleset_cache) == 1
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import io
+import json
 import zipfile
 from pathlib import Path
 
@@ -36,6 +37,25 @@ def test_single_xml_upload_flow(client: TestClient, seed_data):
     assert "ZFM-TOTAL-001" in rule_ids
 
 
+def test_identical_xml_upload_reuses_invoice(client: TestClient, seed_data):
+    _, org = seed_data
+    sample_path = Path(__file__).resolve().parent.parent / "data" / "sample_invoice.xml"
+    payload = sample_path.read_bytes()
+
+    responses = [
+        client.post(
+            f"/api/v1/orgs/{org.id}/uploads/xml",
+            files={"file": ("nota.xml", payload, "application/xml")},
+        ).json()
+        for _ in range(2)
+    ]
+
+    assert [data["reused"] for data in responses] == [False, True]
+    assert responses[1]["invoice_id"] == responses[0]["invoice_id"]
+    assert responses[1]["findings"] == responses[0]["findings"]
+    assert responses[1]["audit_run_id"] != responses[0]["audit_run_id"]
+
+
 def test_zip_upload_flow(client: TestClient, seed_data):
     _, org = seed_data
     sample_path = Path(__file__).resolve().parent.parent / "data" / "sample_invoice.xml"
@@ -51,7 +71,47 @@ def test_zip_upload_flow(client: TestClient, seed_data):
         f"/api/v1/orgs/{org.id}/uploads/zip",
         files={"file": ("lote.zip", buffer.read(), "application/zip")},
     )
-    assert response.status_code == 200
+    assert response.status_code == 202
     data = response.json()
-    assert data["processed_invoices"] == 2
-    assert data["total_findings"] >= 3
+    assert data["status"] == "pending"
+    audit_run_id = data["audit_run_id"]
+
+    progress = client.get(f"/api/v1/orgs/{org.id}/audits/{audit_run_id}/progress")
+    assert progress.status_code == 200
+    progress_json = progress.json()
+    assert progress_json["status"] == "done"
+    assert progress_json["total_invoices"] == 2
+    assert progress_json["processed_invoices"] == 2
+    assert progress_json["percent"] == 100.0
+    assert progress_json["eta_seconds"] == 0.0
+
+    audit = client.get(f"/api/v1/orgs/{org.id}/audits/{audit_run_id}")
+    assert audit.status_code == 200
+    assert audit.json()["summary"]["total_findings"] >= 3
+
+
+def test_audit_events_stream_ends_with_status(client: TestClient, seed_data):
+    _, org = seed_data
+    sample_path = Path(__file__).resolve().parent.parent / "data" / "sample_invoice.xml"
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("nota1.xml", sample_path.read_bytes())
+    response = client.post(
+        f"/api/v1/orgs/{org.id}/uploads/zip",
+        files={"file": ("lote.zip", buffer.getvalue(), "application/zip")},
+    )
+    audit_run_id = response.json()["audit_run_id"]
+
+    url = f"/api/v1/orgs/{org.id}/audits/{audit_run_id}/events"
+    with client.stream("GET", url) as stream:
+        assert stream.headers["content-type"].startswith("text/event-stream")
+        events = [
+            json.loads(line.removeprefix("data: "))
+            for line in stream.iter_lines()
+            if line.startswith("data: ")
+        ]
+
+    assert [event["type"] for event in events] == ["progress", "status"]
+    assert events[0]["processed_invoices"] == 1
+    assert events[1]["status"] == "done"
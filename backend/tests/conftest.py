@@ -22,6 +22,9 @@ from app.models.plan import Plan
 from app.models.subscription import Subscription
 from app.models.user import User
 from app.models.user_org_role import UserOrgRole
+from app.services.audit_events import InMemoryAuditEventBroker, set_event_broker
+from app.services.ruleset_cache import ruleset_cache
+from app.workers import celery_app
 
 
 @pytest.fixture()
@@ -34,6 +37,8 @@ def engine() -> Iterator:
     )
     Base.metadata.create_all(bind=engine)
     assert "files" in Base.metadata.tables
+    # Cada teste cria um banco novo e os ids de ``rulesets`` se repetem.
+    ruleset_cache.invalidate()
     try:
         yield engine
     finally:
@@ -49,6 +54,16 @@ def session(engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
     monkeypatch.setattr(deps_module, "SessionLocal", SessionTesting)
     import app.workers.tasks as tasks_module
     monkeypatch.setattr(tasks_module, "SessionLocal", SessionTesting)
+    # Tasks enfileiradas com ``.delay()`` rodam no próprio processo de teste.
+    # ``@shared_task`` resolve o app pelo ``current_app``, que é por thread: o
+    # ``TestClient`` atende as rotas em outra thread, então ``celery_app`` vira
+    # o app padrão e o broker em memória evita conexões caso algo escape.
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(celery_app.conf, "task_eager_propagates", True)
+    monkeypatch.setattr(celery_app.conf, "broker_url", "memory://")
+    celery_app.set_default()
+    celery_app.set_current()
+    set_event_broker(InMemoryAuditEventBroker())
     settings.local_storage_path = str(tmp_path / "storage")
     Path(settings.local_storage_path).mkdir(parents=True, exist_ok=True)
     db = SessionTesting()
@@ -56,6 +71,7 @@ def session(engine, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
         yield db
     finally:
         db.close()
+        set_event_broker(None)
 
 
 @pytest.fixture()
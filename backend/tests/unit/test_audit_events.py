@@ -0,0 +1,32 @@
+import json
+import threading
+
+from app.services.audit_events import InMemoryAuditEventBroker, format_sse
+
+
+async def test_in_memory_broker_delivers_events_per_run() -> None:
+    broker = InMemoryAuditEventBroker()
+    async with await broker.subscribe(1) as subscription:
+        other = await broker.subscribe(2)
+        publisher = threading.Thread(
+            target=broker.publish,
+            args=(1, {"type": "progress", "processed_invoices": 10}),
+        )
+        publisher.start()
+        publisher.join()
+
+        assert await subscription.get(timeout=1) == {
+            "type": "progress",
+            "processed_invoices": 10,
+        }
+        assert await subscription.get(timeout=0.01) is None
+        assert await other.get(timeout=0.01) is None
+        await other.close()
+
+    assert broker._subscribers == {}
+    broker.publish(1, {"type": "status", "status": "done"})
+
+
+def test_format_sse() -> None:
+    event = {"type": "status", "status": "done"}
+    assert format_sse(event) == f"event: status\ndata: {json.dumps(event)}\n\n"
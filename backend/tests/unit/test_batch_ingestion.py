@@ -0,0 +1,187 @@
+import io
+import multiprocessing
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from app.services.batch_ingestion import (
+    ZipBatchParser,
+    ZipMemberError,
+    merge_chunk_results,
+    plan_chunks,
+    progress_report,
+    record_chunk_progress,
+)
+from app.utils.xml_parser import XMLParser
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+def _build_zip(members: list[tuple[str, bytes]]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("lote/", b"")
+        archive.writestr("lote/leia-me.txt", b"ignorado")
+        for name, payload in members:
+            archive.writestr(name, payload)
+    return buffer.getvalue()
+
+
+def _samples(copies: int) -> list[tuple[str, bytes]]:
+    samples = sorted(DATA_DIR.glob("*.xml"))
+    return [
+        (f"lote/{index:03d}-{sample.name}", sample.read_bytes())
+        for index in range(copies)
+        for sample in samples
+    ]
+
+
+@pytest.mark.parametrize(
+    "workers, executor", [(1, "thread"), (4, "thread"), (2, "process")]
+)
+def test_batch_parser_preserves_archive_order(workers: int, executor: str) -> None:
+    members = _samples(copies=5)
+    parser = XMLParser()
+    expected = [parser.parse_bytes(payload) for _, payload in members]
+
+    batch = ZipBatchParser(workers=workers, executor=executor, prefetch=1)
+    parsed = list(batch.iter_parsed(_build_zip(members)))
+
+    assert [member.index for member in parsed] == list(range(len(members)))
+    assert [member.file_name for member in parsed] == [
+        Path(name).name for name, _ in members
+    ]
+    assert [member.parsed for member in parsed] == expected
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_batch_parser_reports_first_invalid_member(workers: int) -> None:
+    members = _samples(copies=3)
+    members.insert(4, ("lote/quebrada-1.xml", b"<nfeProc><NFe>"))
+    members.insert(7, ("lote/quebrada-2.xml", b"sem xml"))
+
+    batch = ZipBatchParser(workers=workers, prefetch=8)
+    delivered = []
+    with pytest.raises(ZipMemberError) as error:
+        for member in batch.iter_parsed(_build_zip(members)):
+            delivered.append(member.index)
+
+    assert delivered == [0, 1, 2, 3]
+    assert error.value.index == 4
+    assert error.value.file_name == "lote/quebrada-1.xml"
+    assert str(error.value).startswith("lote/quebrada-1.xml: ")
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_batch_parser_reads_zip_from_disk(tmp_path: Path, executor: str) -> None:
+    members = _samples(copies=3)
+    zip_bytes = _build_zip(members)
+    zip_path = tmp_path / "lote.zip"
+    zip_path.write_bytes(zip_bytes)
+
+    batch = ZipBatchParser(workers=2, executor=executor)
+    from_disk = list(batch.iter_parsed(zip_path, start=1))
+    from_memory = list(batch.iter_parsed(zip_bytes, start=1))
+
+    assert [member.index for member in from_disk] == list(range(1, len(members)))
+    assert [member.parsed for member in from_disk] == [
+        member.parsed for member in from_memory
+    ]
+
+
+def test_batch_parser_rejects_unknown_executor() -> None:
+    with pytest.raises(ValueError):
+        ZipBatchParser(executor="gpu")
+
+
+def test_batch_parser_uses_threads_inside_daemon_process(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(multiprocessing.current_process(), "daemon", True)
+
+    assert ZipBatchParser(workers=2, executor="process").executor == "thread"
+
+
+def test_batch_parser_slices_keep_archive_indexes() -> None:
+    members = _samples(copies=4)
+    zip_bytes = _build_zip(members)
+    batch = ZipBatchParser(workers=2)
+
+    whole = list(batch.iter_parsed(zip_bytes))
+    sliced = [
+        member
+        for start, stop in plan_chunks(len(members), 5)
+        for member in batch.iter_parsed(zip_bytes, start=start, stop=stop)
+    ]
+
+    assert [member.index for member in sliced] == list(range(len(members)))
+    assert [member.parsed for member in sliced] == [member.parsed for member in whole]
+
+
+def test_plan_chunks() -> None:
+    assert plan_chunks(0, 10) == []
+    assert plan_chunks(7, 0) == [(0, 7)]
+    assert plan_chunks(7, 3) == [(0, 3), (3, 6), (6, 7)]
+
+
+def test_chunk_progress_and_merge() -> None:
+    summary = record_chunk_progress(
+        {"metadata": {"source": "zip_batch"}}, total_chunks=2, total_invoices=5
+    )
+    summary = record_chunk_progress(
+        summary, processed_invoices=3, completed_chunks=1, findings=4
+    )
+    summary = record_chunk_progress(
+        summary, processed_invoices=2, completed_chunks=1, findings=1
+    )
+
+    assert summary["metadata"] == {
+        "source": "zip_batch",
+        "progress": {
+            "total_chunks": 2,
+            "total_invoices": 5,
+            "completed_chunks": 2,
+            "processed_invoices": 5,
+            "total_findings": 5,
+        },
+    }
+    assert merge_chunk_results(
+        [
+            {"processed_invoices": 3, "total_findings": 4},
+            {"processed_invoices": 2, "total_findings": 1},
+        ]
+    ) == {"chunks": 2, "processed_invoices": 5, "total_findings": 5}
+
+
+def test_progress_report_throughput_and_eta() -> None:
+    started = datetime(2024, 3, 1, 12, 0, 0)
+    summary = record_chunk_progress(None, total_chunks=4, total_invoices=4000)
+    summary = record_chunk_progress(
+        summary, processed_invoices=1000, completed_chunks=1
+    )
+
+    running = progress_report(
+        summary,
+        status="running",
+        started_at=started,
+        now=started + timedelta(seconds=50),
+    )
+    assert running["processed_invoices"] == 1000
+    assert running["percent"] == 25.0
+    assert running["throughput_per_second"] == 20.0
+    assert running["eta_seconds"] == 150.0
+
+    pending = progress_report(None, status="pending", started_at=None)
+    assert pending["throughput_per_second"] is None
+    assert pending["eta_seconds"] is None
+
+    failed = progress_report(
+        {**summary, "error": "nota.xml: XML inválido"},
+        status="failed",
+        started_at=started,
+        finished_at=started + timedelta(seconds=60),
+    )
+    assert failed["eta_seconds"] is None
+    assert failed["error"] == "nota.xml: XML inválido"
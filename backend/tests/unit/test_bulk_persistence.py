@@ -0,0 +1,213 @@
+import dataclasses
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+
+from app.models.audit_finding import AuditFinding
+from app.models.audit_run import AuditRun
+from app.models.file import File
+from app.models.invoice_item import InvoiceItem
+from app.models.organization import Organization
+from app.models.user import User
+from app.services.bulk_persistence import BulkWriter, finding_rows, item_rows
+from app.services.invoice_ingestion import InvoiceIngestor
+from app.services.rule_packs import get_rule_pack
+from app.services.rules_engine import RuleResult
+from app.services.ruleset_service import RuleSetService
+from app.services.zfm_calculator import RuleAuditCalculator
+from app.utils.xml_parser import XMLParser
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+def test_item_and_finding_rows_match_orm_columns() -> None:
+    parsed = XMLParser().parse(DATA_DIR / "sample_invoice.xml")
+    rows = item_rows(7, parsed.items)
+    assert [row["seq"] for row in rows] == [1, 2]
+    assert rows[0]["invoice_id"] == 7
+    assert isinstance(rows[0]["total_value"], float)
+    assert set(rows[0]) == {
+        column.name for column in InvoiceItem.__table__.columns
+    } - {"id"}
+
+    result = RuleResult(
+        rule_id="R1",
+        name="Regra",
+        inconsistency_code="X",
+        severity="alto",
+        message_pt="msg",
+        suggestion_code=None,
+        references=("ref",),
+        evidence={"valor": Decimal("1.00")},
+        item=SimpleNamespace(id=3),
+    )
+    (row,) = finding_rows(1, 2, [result])
+    assert row["item_id"] == 3
+    assert row["references"] == ["ref"]
+    assert set(row) == {
+        column.name for column in AuditFinding.__table__.columns
+    } - {"id"}
+
+
+def test_bulk_writer_rejects_unknown_strategy() -> None:
+    with pytest.raises(ValueError):
+        BulkWriter(session=None, strategy="bcp")  # type: ignore[arg-type]
+
+
+def _fixtures(session, label: str):
+    org = Organization(name=label, slug=label, cnpj="12345678000199")
+    user = User(
+        email=f"{label}@oraculo.test",
+        first_name="Bulk",
+        last_name=label,
+        password_hash="-",
+    )
+    session.add_all([org, user])
+    session.flush()
+    raw_file = File(
+        org_id=org.id,
+        file_name="lote.zip",
+        mime="application/zip",
+        size_bytes=0,
+        storage_backend="local",
+        storage_path="lote.zip",
+        sha256="-",
+    )
+    audit_run = AuditRun(org_id=org.id, requested_by=user.id, summary={})
+    session.add_all([raw_file, audit_run])
+    session.flush()
+    return org, raw_file, audit_run
+
+
+def _stored_items(session, org_id: int):
+    return [
+        tuple(row)
+        for row in session.execute(
+            select(InvoiceItem.seq, InvoiceItem.ncm, InvoiceItem.total_value)
+            .join(InvoiceItem.invoice)
+            .where(InvoiceItem.invoice.has(org_id=org_id))
+            .order_by(InvoiceItem.invoice_id, InvoiceItem.seq)
+        )
+    ]
+
+
+def _write_samples(session, strategy: str):
+    org, raw_file, audit_run = _fixtures(session, strategy)
+    ingestor = InvoiceIngestor(persistence_strategy=strategy)
+    calculator = RuleAuditCalculator(session, org.id, persistence_strategy=strategy)
+    counts = []
+    for sample in sorted(DATA_DIR.glob("*.xml")):
+        parsed = XMLParser().parse(sample)
+        # Duas vezes: a segunda substitui itens e achados já gravados.
+        for _ in range(2):
+            invoice = ingestor.ingest_parsed(
+                session=session, org_id=org.id, parsed=parsed, file_record=raw_file
+            ).invoice
+            findings = calculator.persist_results(audit_run=audit_run, invoice=invoice)
+        counts.append(len(findings))
+    session.flush()
+
+    findings = session.execute(
+        select(AuditFinding.rule_id, AuditFinding.evidence, AuditFinding.references)
+        .where(AuditFinding.audit_run_id == audit_run.id)
+        .order_by(AuditFinding.invoice_id, AuditFinding.rule_id, AuditFinding.id)
+    ).all()
+    return (
+        counts,
+        _stored_items(session, org.id),
+        [tuple(row) for row in findings],
+    )
+
+
+def test_bulk_insert_matches_orm_path(session) -> None:
+    RuleSetService(session).save_global(yaml_text=get_rule_pack("zfm_baseline").yaml)
+
+    orm = _write_samples(session, "orm")
+    bulk = _write_samples(session, "insert")
+
+    assert bulk == orm
+    assert orm[2]
+
+
+def test_batch_upsert_matches_single_invoice_path(session) -> None:
+    samples = [XMLParser().parse(sample) for sample in sorted(DATA_DIR.glob("*.xml"))]
+    # A primeira nota se repete no mesmo lote: vale a última ocorrência.
+    batch = [*samples, samples[0]]
+
+    single_org, single_file, _ = _fixtures(session, "single")
+    ingestor = InvoiceIngestor(persistence_strategy="insert")
+    for parsed in batch:
+        ingestor.ingest_parsed(
+            session=session,
+            org_id=single_org.id,
+            parsed=parsed,
+            file_record=single_file,
+        )
+
+    org, raw_file, _ = _fixtures(session, "batch")
+    first = ingestor.ingest_parsed_batch(
+        session=session, org_id=org.id, parsed_invoices=batch, file_record=raw_file
+    )
+    assert [result.created for result in first] == [True] * len(samples) + [False]
+    assert [result.invoice.access_key for result in first] == [
+        parsed.access_key for parsed in batch
+    ]
+    assert first[0].invoice is first[-1].invoice
+    assert [len(result.invoice.items) for result in first] == [
+        len(parsed.items) for parsed in batch
+    ]
+
+    again = ingestor.ingest_parsed_batch(
+        session=session, org_id=org.id, parsed_invoices=samples, file_record=raw_file
+    )
+    assert not any(result.created for result in again)
+    assert [result.invoice.id for result in again] == [
+        result.invoice.id for result in first[: len(samples)]
+    ]
+    assert _stored_items(session, org.id) == _stored_items(session, single_org.id)
+
+
+@pytest.mark.parametrize("strategy", ["orm", "insert"])
+def test_reimport_only_touches_changed_items(session, strategy: str) -> None:
+    org, raw_file, audit_run = _fixtures(session, strategy)
+    ingestor = InvoiceIngestor(persistence_strategy=strategy)
+    parsed = XMLParser().parse(DATA_DIR / "sample_invoice.xml")
+
+    def ingest(invoice_data):
+        invoice = ingestor.ingest_parsed(
+            session=session, org_id=org.id, parsed=invoice_data, file_record=raw_file
+        ).invoice
+        session.flush()
+        return {item.seq: (item.id, item.description) for item in invoice.items}
+
+    original = ingest(parsed)
+    assert ingest(parsed) == original
+
+    first, second = parsed.items[:2]
+    session.add(
+        AuditFinding(
+            audit_run_id=audit_run.id,
+            invoice_id=session.get(InvoiceItem, original[second.seq][0]).invoice_id,
+            item_id=original[second.seq][0],
+            rule_id="R1",
+            inconsistency_code="X",
+            severity="alto",
+            message_pt="msg",
+        )
+    )
+    session.flush()
+    changed = dataclasses.replace(
+        parsed,
+        items=[
+            dataclasses.replace(first, description="Alterado"),
+            dataclasses.replace(second, seq=99),
+        ],
+    )
+    updated = ingest(changed)
+
+    assert updated[first.seq] == (original[first.seq][0], "Alterado")
+    assert set(updated) == {first.seq, 99}
+    assert session.scalars(select(AuditFinding.item_id)).all() == [None]
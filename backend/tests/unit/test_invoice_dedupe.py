@@ -0,0 +1,90 @@
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from app.models.audit_run import AuditRun, AuditStatus
+from app.models.file import File
+from app.models.organization import Organization
+from app.models.user import User
+from app.services.invoice_ingestion import InvoiceIngestor
+from app.services.rule_packs import get_rule_pack
+from app.services.ruleset_service import RuleSetService
+from app.services.storage.local import LocalStorageBackend
+from app.services.zfm_calculator import RuleAuditCalculator
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+def _audit(session, ingestor, org, user, payload: bytes):
+    result = ingestor.ingest_invoice(
+        session=session,
+        org_id=org.id,
+        payload=payload,
+        file_name="nota.xml",
+        mime="application/xml",
+        uploaded_by=user.id,
+    )
+    audit_run = AuditRun(org_id=org.id, requested_by=user.id, summary={})
+    session.add(audit_run)
+    session.flush()
+    calculator = RuleAuditCalculator(session, org.id)
+    calculator.bind_to_run(audit_run)
+    findings = None
+    if result.reused:
+        findings = calculator.reuse_findings(
+            audit_run=audit_run,
+            invoice=result.invoice,
+        )
+    if findings is None:
+        findings = calculator.persist_results(
+            audit_run=audit_run,
+            invoice=result.invoice,
+        )
+    audit_run.status = AuditStatus.DONE
+    audit_run.finished_at = datetime.utcnow()
+    session.flush()
+    return result, findings
+
+
+def test_identical_xml_reuses_file_invoice_and_findings(session, tmp_path) -> None:
+    RuleSetService(session).save_global(yaml_text=get_rule_pack("zfm_baseline").yaml)
+    org = Organization(name="Dedupe", slug="dedupe", cnpj="12345678000199")
+    user = User(
+        email="dedupe@oraculo.test",
+        first_name="Dedupe",
+        last_name="Teste",
+        password_hash="-",
+    )
+    session.add_all([org, user])
+    session.flush()
+    ingestor = InvoiceIngestor()
+    ingestor.storage = LocalStorageBackend(str(tmp_path))
+    payload = (DATA_DIR / "sample_invoice.xml").read_bytes()
+
+    first, first_findings = _audit(session, ingestor, org, user, payload)
+    second, second_findings = _audit(session, ingestor, org, user, payload)
+
+    assert first.created and not first.reused
+    assert second.reused and second.invoice is first.invoice
+    assert len(list(tmp_path.rglob("*.xml"))) == 1
+    assert session.scalar(select(func.count(File.id))) == 1
+    assert len(second_findings) == len(first_findings) >= 3
+    assert [row["rule_id"] for row in second_findings] == [
+        row["rule_id"] for row in first_findings
+    ]
+
+    # Nova versão das regras: o XML ainda é reaproveitado, os achados não.
+    RuleSetService(session).save_global(
+        yaml_text=get_rule_pack("zfm_baseline").yaml, version="2"
+    )
+    audit_run = AuditRun(org_id=org.id, requested_by=user.id, summary={})
+    session.add(audit_run)
+    session.flush()
+    calculator = RuleAuditCalculator(session, org.id)
+    calculator.bind_to_run(audit_run)
+    reused = calculator.reuse_findings(
+        audit_run=audit_run,
+        invoice=second.invoice,
+    )
+    assert reused is None
@@ -3,8 +3,19 @@ from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
 
+import pytest
+
+from app.services import rules_engine as rules_engine_module
 from app.services.rules_dsl import RuleDSLParser
-from app.services.rules_engine import RuleEngine
+from app.services.rules_engine import (
+    HELPER_CACHE_STATS,
+    ExpressionCompiler,
+    ExpressionEvaluator,
+    RuleEngine,
+    RuleEvaluationError,
+    RuleHelper,
+)
+from app.services.rules_optimizer import ClauseStatistics, reorder_condition
 
 
 @dataclass
@@ -26,7 +37,7 @@ class InvoiceStub:
     items: list[ItemStub]
 
 
-def test_rule_engine_applies_zfm_pack() -> None:
+def _load_zfm_rules():
     parser = RuleDSLParser()
     pack_path = (
         Path(__file__).resolve().parents[2]
@@ -35,10 +46,11 @@ def test_rule_engine_applies_zfm_pack() -> None:
         / "packs"
         / "zfm_baseline.yaml"
     )
-    document = parser.parse(pack_path.read_text(encoding="utf-8"))
-    engine = RuleEngine(document.rules)
+    return parser.parse(pack_path.read_text(encoding="utf-8")).rules
+
 
-    invoice = InvoiceStub(
+def _build_invoice() -> InvoiceStub:
+    return InvoiceStub(
         total_value=95.0,
         freight_value=5.0,
         has_st=False,
@@ -63,6 +75,11 @@ def test_rule_engine_applies_zfm_pack() -> None:
         ],
     )
 
+
+def test_rule_engine_applies_zfm_pack() -> None:
+    engine = RuleEngine(_load_zfm_rules())
+    invoice = _build_invoice()
+
     results = engine.evaluate(invoice=invoice, items=invoice.items)
     rule_ids = {result.rule_id for result in results}
     assert rule_ids == {"ZFM-TOTAL-001", "ZFM-ST-001", "ZFM-CEST-001"}
@@ -70,3 +87,401 @@ def test_rule_engine_applies_zfm_pack() -> None:
     total_rule = next(result for result in results if result.rule_id == "ZFM-TOTAL-001")
     assert total_rule.evidence
     assert total_rule.evidence["variacao"] > 0
+
+
+def test_compiled_mode_matches_interpreted_mode(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    rules = _load_zfm_rules()
+    interpreted = RuleEngine(rules, mode="interpreted")
+    compiled = RuleEngine(rules)
+    invoice = _build_invoice()
+    expected = interpreted.evaluate(invoice=invoice, items=invoice.items)
+
+    def _fail_parse(*args, **kwargs):
+        raise AssertionError("expressões devem ser compiladas na construção do motor")
+
+    monkeypatch.setattr(rules_engine_module.ast, "parse", _fail_parse)
+    results = compiled.evaluate(invoice=invoice, items=invoice.items)
+
+    assert [(r.rule_id, r.item, r.evidence) for r in results] == [
+        (r.rule_id, r.item, r.evidence) for r in expected
+    ]
+
+
+def test_fused_mode_matches_interpreted_mode_and_shares_subexpressions(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    rules = _load_zfm_rules()
+    invoice = _build_invoice()
+    expected = RuleEngine(rules, mode="interpreted").evaluate(
+        invoice=invoice, items=invoice.items
+    )
+
+    calls = []
+    original = RuleHelper.total_variance
+
+    def _counting_total_variance(self):
+        calls.append(1)
+        return original(self)
+
+    monkeypatch.setattr(RuleHelper, "total_variance", _counting_total_variance)
+    engine = RuleEngine(rules, mode="fused")
+    results = engine.evaluate(invoice=invoice, items=invoice.items)
+
+    assert [(r.rule_id, r.item, r.evidence) for r in results] == [
+        (r.rule_id, r.item, r.evidence) for r in expected
+    ]
+    # ``when`` e ``evidence`` de ZFM-TOTAL-001 compartilham o mesmo cálculo.
+    assert len(calls) == 1
+    assert engine.fused is not None and engine.fused.shared_subexpressions > 0
+
+
+def test_fused_mode_rejects_expressions_outside_whitelist() -> None:
+    rules = RuleDSLParser().parse(
+        """
+rules:
+  - id: "R1"
+    name: "Inválida"
+    when: item.__class__ is not None
+    then:
+      inconsistency_code: "X"
+      severity: "baixo"
+      message_pt: "x"
+"""
+    ).rules
+    with pytest.raises(RuleEvaluationError):
+        RuleEngine(rules, mode="fused")
+
+
+@pytest.mark.parametrize("mode", ["compiled", "fused"])
+def test_invoice_only_guards_skip_item_loop(mode: str) -> None:
+    rules = [rule for rule in _load_zfm_rules() if rule.id == "ZFM-ST-001"]
+    engine = RuleEngine(rules, mode=mode)
+    accessed: list[str] = []
+
+    class TrackingItem:
+        def __getattr__(self, name: str):
+            accessed.append(name)
+            raise AssertionError("itens não devem ser avaliados")
+
+    invoice = _build_invoice()
+    invoice.uf = "SP"
+    assert engine.evaluate(invoice=invoice, items=[TrackingItem()] * 50) == []
+    assert accessed == []
+
+    invoice.uf = "AM"
+    results = engine.evaluate(invoice=invoice, items=invoice.items)
+    assert [result.item for result in results] == invoice.items
+
+
+@pytest.mark.parametrize("mode", ["interpreted", "compiled", "fused"])
+def test_invoice_clause_after_item_clause_is_not_hoisted(mode: str) -> None:
+    rules = RuleDSLParser().parse(
+        """
+rules:
+  - id: "R-RATEIO"
+    name: "Cláusula da nota protegida pelo item"
+    scope: "item"
+    when:
+      all:
+        - item.cfop is not None
+        - invoice.total_value / invoice.freight_value > 1
+    then:
+      inconsistency_code: "X"
+      severity: "baixo"
+      message_pt: "x"
+"""
+    ).rules
+    invoice = _build_invoice()
+    invoice.freight_value = 0
+    for item in invoice.items:
+        item.cfop = None
+
+    engine = RuleEngine(rules, mode=mode)
+    assert engine.evaluate(invoice=invoice, items=invoice.items) == []
+    if mode == "compiled":
+        indexed = RuleEngine(rules, use_index=True)
+        assert indexed.evaluate(invoice=invoice, items=invoice.items) == []
+
+
+def test_expression_compiler_follows_evaluator_semantics() -> None:
+    compiler = ExpressionCompiler()
+    item = ItemStub(
+        cfop="6102", ncm=None, cest=None, cst="10", total_value=10.0, icms_st_value=None
+    )
+    context = {"item": item}
+    for expression in [
+        "item.cfop[:1] == '6' and item.cst in ['10', '60']",
+        "1 < item.total_value <= 10",
+        "item.ncm is null or not true",
+        "max(item.total_value, 2) * 2 - 1 % 3",
+        "{'cst': item.cst}['cst']",
+    ]:
+        expected = ExpressionEvaluator(context).evaluate(expression)
+        assert compiler.compile(expression)(context) == expected
+    assert compiler.compile("item.cst") is compiler.compile("item.cst")
+
+    with pytest.raises(RuleEvaluationError):
+        compiler.compile("item.__class__")
+    with pytest.raises(RuleEvaluationError):
+        compiler.compile("[x for x in item.cfop]")
+    with pytest.raises(RuleEvaluationError):
+        compiler.compile("invoice.uf")({"item": item})
+
+
+_GUARDED_RULES = """
+rules:
+  - id: "R-INTER"
+    name: "Interestadual"
+    scope: "item"
+    when:
+      all:
+        - item.cfop is not None and item.cfop.startswith('6')
+        - item.cst == '10'
+    then:
+      inconsistency_code: "X1"
+      severity: "baixo"
+      message_pt: "x"
+  - id: "R-NCM"
+    name: "NCM protegido"
+    scope: "item"
+    when:
+      all:
+        - item.ncm is not None
+        - item.ncm.startswith('2203')
+    then:
+      inconsistency_code: "X2"
+      severity: "baixo"
+      message_pt: "x"
+"""
+
+
+@pytest.mark.parametrize("mode", ["interpreted", "compiled", "fused"])
+def test_boolean_operators_short_circuit(mode: str) -> None:
+    rules = RuleDSLParser().parse(_GUARDED_RULES).rules
+    invoice = _build_invoice()
+    invoice.items[1].cfop = None
+
+    results = RuleEngine(rules, mode=mode).evaluate(
+        invoice=invoice, items=invoice.items
+    )
+    assert [(r.rule_id, r.item) for r in results] == [
+        ("R-INTER", invoice.items[0]),
+        ("R-NCM", invoice.items[0]),
+    ]
+
+
+def test_reordered_clauses_keep_results() -> None:
+    rules = RuleDSLParser().parse(_GUARDED_RULES).rules
+    invoice = _build_invoice()
+    invoice.items[1].ncm = None
+    expected = RuleEngine(rules).evaluate(invoice=invoice, items=invoice.items)
+
+    statistics = ClauseStatistics(min_samples=1)
+    profiler = RuleEngine(rules, statistics=statistics, collect_statistics=True)
+    profiler.evaluate(invoice=invoice, items=invoice.items)
+    stat = statistics.get("item.ncm is not None")
+    assert stat is not None and stat.evaluations == 2 and stat.passes == 1
+
+    # Mesmo mais caro, o guarda ``is not None`` continua antes da cláusula que
+    # ele protege.
+    statistics = ClauseStatistics.from_dict(statistics.to_dict(), min_samples=1)
+    statistics.get("item.ncm is not None").seconds = 1.0
+    engine = RuleEngine(rules, statistics=statistics, reorder_clauses=True)
+    results = engine.evaluate(invoice=invoice, items=invoice.items)
+
+    assert [(r.rule_id, r.item, r.evidence) for r in results] == [
+        (r.rule_id, r.item, r.evidence) for r in expected
+    ]
+    with pytest.raises(ValueError):
+        RuleEngine(rules, mode="fused", statistics=statistics, reorder_clauses=True)
+
+
+def test_reordering_keeps_errors_of_original_order() -> None:
+    rules = RuleDSLParser().parse(
+        """
+rules:
+  - id: "R-ERRO"
+    name: "Método antes das comparações"
+    scope: "item"
+    when:
+      all:
+        - item.cfop.startswith('6')
+        - item.cst == '99'
+        - item.ncm == '33030010'
+    then:
+      inconsistency_code: "X"
+      severity: "baixo"
+      message_pt: "x"
+"""
+    ).rules
+    statistics = ClauseStatistics.from_dict(
+        {
+            "item.cfop.startswith('6')": {"evaluations": 10, "passes": 9, "seconds": 1},
+            "item.cst == '99'": {"evaluations": 10, "passes": 0, "seconds": 1e-4},
+            "item.ncm == '33030010'": {"evaluations": 10, "passes": 5, "seconds": 1e-5},
+        },
+        min_samples=1,
+    )
+    # As comparações trocam de lugar entre si, mas não passam à frente do método.
+    assert reorder_condition(rules[0].when, statistics)["all"] == [
+        "item.cfop.startswith('6')",
+        "item.ncm == '33030010'",
+        "item.cst == '99'",
+    ]
+
+    invoice = _build_invoice()
+    invoice.items[0].cfop = None
+    engine = RuleEngine(rules, statistics=statistics, reorder_clauses=True)
+    with pytest.raises(AttributeError):
+        RuleEngine(rules).evaluate(invoice=invoice, items=invoice.items)
+    with pytest.raises(AttributeError):
+        engine.evaluate(invoice=invoice, items=invoice.items)
+
+
+def _synthetic_rules(count: int):
+    blocks = []
+    for index in range(count):
+        if index % 3 == 0:
+            clause = f'item.ncm in ["{22030000 + index}", "33030010"]'
+        elif index % 3 == 1:
+            clause = f'item.cst == "{index % 90:02d}"'
+        else:
+            clause = f'item.cfop is not None and item.cfop.startswith("{index % 7}")'
+        blocks.append(
+            f"""
+  - id: "SYN-{index:03d}"
+    name: "Sintética {index}"
+    scope: "item"
+    when:
+      all:
+        - invoice.uf == "{'AM' if index % 2 else 'SP'}"
+        - '{clause}'
+    then:
+      inconsistency_code: "SYN"
+      severity: "baixo"
+      message_pt: "x"
+      evidence:
+        ncm: item.ncm"""
+        )
+    return RuleDSLParser().parse("rules:" + "".join(blocks)).rules
+
+
+def test_discrimination_index_matches_full_scan() -> None:
+    rules = _load_zfm_rules() + _synthetic_rules(90)
+    indexed = RuleEngine(rules)
+    full_scan = RuleEngine(rules, use_index=False)
+    assert indexed.item_index is not None and full_scan.item_index is None
+
+    invoice = _build_invoice()
+    invoice.items.append(
+        ItemStub(
+            cfop=None,
+            ncm="22030003",
+            cest=None,
+            cst="04",
+            total_value=15.0,
+            icms_st_value=None,
+        )
+    )
+    for uf in ("AM", "SP"):
+        invoice.uf = uf
+        expected = full_scan.evaluate(invoice=invoice, items=invoice.items)
+        results = indexed.evaluate(invoice=invoice, items=invoice.items)
+        assert [(r.rule_id, r.item, r.evidence) for r in results] == [
+            (r.rule_id, r.item, r.evidence) for r in expected
+        ]
+        assert results
+
+    candidates = indexed.item_index.candidates(invoice.items[0])
+    assert len(candidates) < len(rules) // 2
+    assert len(indexed.invoice_index.candidates(invoice)) < len(rules)
+
+
+def test_evaluate_batch_matches_scalar_evaluation() -> None:
+    extra = RuleDSLParser().parse(
+        """
+rules:
+  - id: "COLUNAS"
+    name: "Duas colunas"
+    scope: "item"
+    when:
+      all:
+        - item.total_value > helpers.value_or(item.icms_st_value, 0) * 100
+    then:
+      inconsistency_code: "X"
+      severity: "baixo"
+      message_pt: "x"
+"""
+    ).rules
+    rules = _load_zfm_rules() + _synthetic_rules(12) + extra
+    engine = RuleEngine(rules)
+    invoices = [_build_invoice() for _ in range(3)]
+    invoices[1].uf = "SP"
+    invoices[2].items[0].cfop = None
+    invoices[2].items[1].ncm = None
+
+    batch = engine.evaluate_batch(invoices)
+
+    assert [
+        [(r.rule_id, r.item, r.evidence) for r in results] for results in batch
+    ] == [
+        [
+            (r.rule_id, r.item, r.evidence)
+            for r in engine.evaluate(invoice=invoice, items=invoice.items)
+        ]
+        for invoice in invoices
+    ]
+    if engine.vectorized is not None:
+        # Apenas a regra com duas colunas de item fica no avaliador escalar.
+        item_rules = sum(rule.scope == "item" for rule in rules)
+        assert engine.vectorized.vectorized_rules == item_rules - 1
+
+
+def test_evaluate_batch_falls_back_to_scalar_errors() -> None:
+    rules = RuleDSLParser().parse(
+        """
+rules:
+  - id: "SEM-GUARDA"
+    name: "Sem guarda"
+    scope: "item"
+    when:
+      all:
+        - item.cfop.startswith("6")
+    then:
+      inconsistency_code: "X"
+      severity: "baixo"
+      message_pt: "x"
+"""
+    ).rules
+    engine = RuleEngine(rules)
+    invoice = _build_invoice()
+    assert len(engine.evaluate_batch([invoice])[0]) == 2
+
+    invoice.items[1].cfop = None
+    with pytest.raises(AttributeError):
+        engine.evaluate(invoice=invoice, items=invoice.items)
+    with pytest.raises(AttributeError):
+        engine.evaluate_batch([invoice])
+
+
+def test_rule_helper_memoizes_per_invoice() -> None:
+    invoice = _build_invoice()
+    helper = RuleHelper(invoice, invoice.items)
+
+    variance = helper.total_variance()
+    assert helper.total_variance() == variance
+    assert helper.items_sum("total_value") == 80.0
+    assert helper.cache_stats.misses == {"total_variance": 1, "items_sum": 1}
+    assert helper.cache_stats.hits == {"total_variance": 1, "items_sum": 1}
+
+    registry = RuleHelper.helper_registry()
+    assert registry["total_variance"] is True
+    assert registry["value_or"] is False
+
+    HELPER_CACHE_STATS.reset()
+    RuleEngine(_load_zfm_rules()).evaluate(invoice=invoice, items=invoice.items)
+    # ZFM-TOTAL-001 pede ``total_variance`` na condição e na evidência.
+    assert HELPER_CACHE_STATS.misses["total_variance"] == 1
+    assert HELPER_CACHE_STATS.hit_rate() > 0
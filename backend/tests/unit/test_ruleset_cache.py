@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from app.services.rules_dsl import RuleDocument
+from app.services.ruleset_cache import CachedRuleSet, RuleSetCache
+
+
+def _entry(version: str) -> CachedRuleSet:
+    return CachedRuleSet(
+        versions=(version, None), document=RuleDocument(), rules=[], yaml=""
+    )
+
+
+def test_ruleset_cache_checks_versions_and_evicts() -> None:
+    cache = RuleSetCache(max_entries=2)
+    built: list[str] = []
+
+    def build(version: str):
+        def _build() -> CachedRuleSet:
+            built.append(version)
+            return _entry(version)
+
+        return _build
+
+    first = cache.get_or_build((1, None), ("v1", None), build("v1"))
+    assert cache.get_or_build((1, None), ("v1", None), build("v1")) is first
+    # Mesma chave com outra versão na tabela ``rulesets``: recompõe.
+    second = cache.get_or_build((1, None), ("v2", None), build("v2"))
+    assert second is not first
+
+    cache.get_or_build((2, 5), ("v1", "o1"), build("o1"))
+    cache.get_or_build((3, None), ("v3", None), build("v3"))
+    assert len(cache) == 2
+    assert built == ["v1", "v2", "o1", "v3"]
+    assert cache.stats()["hits"] == 1
+
+    cache.invalidate(5)
+    assert len(cache) == 1
+    assert first.engine() is first.engine()
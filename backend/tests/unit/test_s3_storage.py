@@ -0,0 +1,355 @@
+import hashlib
+import io
+import re
+import threading
+import zipfile
+from pathlib import Path
+from typing import BinaryIO
+
+import httpx
+import pytest
+
+from app.services.batch_ingestion import ZipBatchParser, open_zip
+from app.services.storage.s3 import (
+    MIN_PART_SIZE,
+    S3StorageBackend,
+    _AsyncS3Client,
+    _SimpleS3Client,
+)
+
+
+class FakeS3:
+    """Servidor S3 em memória para o ``httpx.MockTransport``.
+
+    Confere o ``x-amz-content-sha256`` de cada requisição e implementa o
+    suficiente de buckets, objetos, multipart e ``Range`` para o cliente.
+    """
+
+    def __init__(
+        self, fail_part: int | None = None, complete_error: bool = False
+    ) -> None:
+        self.buckets: set[str] = set()
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.requests: list[tuple[str, str]] = []
+        self.parts_received = 0
+        self.bytes_sent = 0
+        self.fail_part = fail_part
+        self.complete_error = complete_error
+        self._lock = threading.Lock()
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = request.read()
+        payload_hash = request.headers["x-amz-content-sha256"]
+        assert request.headers["authorization"].startswith("AWS4-HMAC-SHA256 ")
+        assert payload_hash in ("UNSIGNED-PAYLOAD", hashlib.sha256(body).hexdigest())
+        assert int(request.headers["content-length"]) == len(body)
+        assert request.headers["host"] == "s3.test"
+        assert "host" in request.headers["authorization"]
+
+        bucket, _, key = request.url.path.lstrip("/").partition("/")
+        params = request.url.params
+        with self._lock:
+            self.requests.append((request.method, payload_hash))
+            if not key:
+                if request.method == "HEAD":
+                    return httpx.Response(200 if bucket in self.buckets else 404)
+                self.buckets.add(bucket)
+                return httpx.Response(200)
+            if request.method == "POST" and "uploads" in params:
+                upload_id = f"upload-{len(self.uploads) + 1}"
+                self.uploads[upload_id] = {}
+                return httpx.Response(
+                    200,
+                    content=(
+                        '<InitiateMultipartUploadResult xmlns="http://s3.amazonaws.com/'
+                        f'doc/2006-03-01/"><UploadId>{upload_id}</UploadId>'
+                        "</InitiateMultipartUploadResult>"
+                    ).encode(),
+                )
+            if request.method == "PUT" and "partNumber" in params:
+                number = int(params["partNumber"])
+                if number == self.fail_part:
+                    return httpx.Response(500, content=b"falha simulada")
+                self.uploads[params["uploadId"]][number] = body
+                self.parts_received += 1
+                return httpx.Response(
+                    200, headers={"etag": f'"{hashlib.md5(body).hexdigest()}"'}
+                )
+            if request.method == "POST" and "uploadId" in params:
+                if self.complete_error:
+                    # O S3 pode responder 200 com o erro no corpo.
+                    return httpx.Response(
+                        200, content=b"<Error><Code>InternalError</Code></Error>"
+                    )
+                parts = self.uploads.pop(params["uploadId"])
+                numbers = [
+                    int(number)
+                    for number in re.findall(rb"<PartNumber>(\d+)</PartNumber>", body)
+                ]
+                assert numbers == sorted(parts)
+                if any(len(parts[number]) < MIN_PART_SIZE for number in numbers[:-1]):
+                    return httpx.Response(400, content=b"EntityTooSmall")
+                self.objects[key] = b"".join(parts[number] for number in numbers)
+                return httpx.Response(200, content=b"<CompleteMultipartUploadResult/>")
+            if request.method == "DELETE" and "uploadId" in params:
+                self.uploads.pop(params["uploadId"], None)
+                return httpx.Response(204)
+            if request.method == "DELETE":
+                self.objects.pop(key, None)
+                return httpx.Response(204)
+            if request.method == "PUT":
+                self.objects[key] = body
+                return httpx.Response(200)
+            if request.method in ("GET", "HEAD") and key not in self.objects:
+                return httpx.Response(404, content=b"NoSuchKey")
+            if request.method == "HEAD":
+                return httpx.Response(
+                    200,
+                    headers={
+                        "content-length": str(len(self.objects[key])),
+                        "content-type": "application/zip",
+                    },
+                )
+            if request.method == "GET":
+                content = self.objects[key]
+                match = re.fullmatch(
+                    r"bytes=(\d+)-(\d*)", request.headers.get("range", "")
+                )
+                if match:
+                    start = int(match.group(1))
+                    end = int(match.group(2)) + 1 if match.group(2) else len(content)
+                    content = content[start:end]
+                self.bytes_sent += len(content)
+                return httpx.Response(206 if match else 200, content=content)
+        return httpx.Response(400)
+
+
+def _backend(
+    fake: FakeS3, *, read_ahead: int | None = None, **options
+) -> S3StorageBackend:
+    client = _SimpleS3Client(
+        endpoint_url="http://s3.test",
+        access_key="chave",
+        secret_key="segredo",
+        region=None,
+        use_ssl=False,
+        transport=httpx.MockTransport(fake),
+        **options,
+    )
+    return S3StorageBackend(client=client, bucket="oraculo", read_ahead=read_ahead)
+
+
+def test_small_objects_use_single_signed_put_and_ranged_reads() -> None:
+    fake = FakeS3()
+    backend = _backend(fake, multipart_threshold=1024)
+    payload = bytes(range(256)) * 2
+
+    stored = backend.store(org_id=1, file_name="nota.xml", content=payload)
+
+    assert stored.size == len(payload)
+    assert fake.requests[-1] == ("PUT", hashlib.sha256(payload).hexdigest())
+    assert backend.read(path=stored.path) == payload
+    assert b"".join(backend.stream(path=stored.path, offset=10, length=5)) == (
+        payload[10:15]
+    )
+    assert b"".join(backend.stream(path=stored.path, offset=500)) == payload[500:]
+    backend.delete(path=stored.path)
+    backend.delete(path=stored.path)
+    assert stored.path not in fake.objects
+
+
+def test_large_files_go_multipart_with_unsigned_parts() -> None:
+    fake = FakeS3()
+    backend = _backend(
+        fake, multipart_threshold=MIN_PART_SIZE, part_size=1, upload_concurrency=2
+    )
+    payload = bytes(range(251)) * (2 * MIN_PART_SIZE // 251 + 1000)
+
+    stored = backend.store(org_id=1, file_name="lote.zip", content=io.BytesIO(payload))
+
+    assert stored.size == len(payload)
+    assert fake.objects[stored.path] == payload
+    assert fake.parts_received == 3
+    assert ("PUT", "UNSIGNED-PAYLOAD") in fake.requests
+    assert not fake.uploads
+    with backend.local_file(path=stored.path) as local_path:
+        assert local_path.read_bytes() == payload
+
+
+class ShortReads(io.RawIOBase):
+    """Fluxo sem ``seek`` que devolve no máximo 64 KB por ``read``."""
+
+    def __init__(self, payload: bytes) -> None:
+        self.source = io.BytesIO(payload)
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self.source.read(min(size, 64 * 1024) if size >= 0 else 64 * 1024)
+
+
+def test_multipart_buffers_short_reads_into_full_parts() -> None:
+    fake = FakeS3()
+    backend = _backend(
+        fake, multipart_threshold=0, part_size=MIN_PART_SIZE, upload_concurrency=2
+    )
+    payload = bytes(range(251)) * (2 * MIN_PART_SIZE // 251 + 10)
+
+    stored = backend.store(org_id=1, file_name="lote.zip", content=ShortReads(payload))
+
+    assert stored.size == len(payload)
+    assert fake.objects[stored.path] == payload
+    assert fake.parts_received == 3
+
+
+def test_streamed_put_below_threshold_skips_hashing() -> None:
+    fake = FakeS3()
+    backend = _backend(fake, multipart_threshold=1024 * 1024)
+    payload = b"<nfeProc/>" * 100
+
+    stored = backend.store(org_id=1, file_name="nota.xml", content=io.BytesIO(payload))
+
+    assert fake.objects[stored.path] == payload
+    assert fake.requests[-1] == ("PUT", "UNSIGNED-PAYLOAD")
+
+
+def test_failed_part_aborts_multipart_upload() -> None:
+    fake = FakeS3(fail_part=2)
+    backend = _backend(
+        fake, multipart_threshold=0, part_size=MIN_PART_SIZE, upload_concurrency=1
+    )
+    payload = b"x" * (MIN_PART_SIZE + 10)
+
+    with pytest.raises(RuntimeError):
+        backend.store(org_id=1, file_name="lote.zip", content=io.BytesIO(payload))
+
+    assert fake.requests[-1][0] == "DELETE"
+    assert not fake.uploads
+    assert not fake.objects
+
+
+def test_error_in_complete_response_aborts_upload() -> None:
+    fake = FakeS3(complete_error=True)
+    backend = _backend(fake, multipart_threshold=0)
+
+    with pytest.raises(RuntimeError):
+        backend.store(org_id=1, file_name="lote.zip", content=b"conteudo")
+
+    assert fake.requests[-1][0] == "DELETE"
+    assert not fake.objects
+
+
+def test_stat_range_reads_and_seekable_open() -> None:
+    fake = FakeS3()
+    backend = _backend(fake, read_ahead=64)
+    payload = bytes(range(256)) * 4
+    stored = backend.store(org_id=1, file_name="lote.zip", content=payload)
+
+    info = backend.stat(path=stored.path)
+    assert (info.size, info.content_type) == (len(payload), "application/zip")
+    assert backend.read_range(path=stored.path, offset=1000, length=100) == (
+        payload[1000:]
+    )
+    with pytest.raises(FileNotFoundError):
+        backend.stat(path="org-1/ausente.zip")
+
+    with backend.open(path=stored.path) as stream:
+        stream.seek(-10, io.SEEK_END)
+        assert stream.read() == payload[-10:]
+        stream.seek(100)
+        assert stream.read(10) == payload[100:110]
+        assert stream.read(10) == payload[110:120]
+        assert stream.tell() == 120
+        assert stream.read(2000) == payload[120:]
+        assert stream.read(1) == b""
+    # Leituras dentro do bloco antecipado não geram novas requisições.
+    assert fake.bytes_sent == 24 + 10 + 64 + 860
+
+
+class _StoredZipOpener:
+    def __init__(self, backend: S3StorageBackend, path: str) -> None:
+        self.backend = backend
+        self.path = path
+
+    def open(self) -> BinaryIO:
+        return self.backend.open(path=self.path)
+
+
+def test_zip_chunk_fetches_only_its_members_from_s3() -> None:
+    samples = sorted((Path(__file__).parent.parent / "data").glob("*.xml"))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for index in range(30):
+            for sample in samples:
+                archive.write(sample, f"lote/{index:03d}-{sample.name}")
+            # Anexos grandes entre as notas, para o lote pesar bem mais que a faixa.
+            archive.writestr(f"lote/{index:03d}-anexo.pdf", bytes(64 * 1024))
+    zip_bytes = buffer.getvalue()
+
+    fake = FakeS3()
+    backend = _backend(fake, read_ahead=16 * 1024)
+    stored = backend.store(org_id=1, file_name="lote.zip", content=zip_bytes)
+    opener = _StoredZipOpener(backend, stored.path)
+    batch = ZipBatchParser(workers=1)
+    start, stop = 10 * len(samples), 12 * len(samples)
+
+    with open_zip(opener) as archive:
+        assert archive.testzip() is None
+    fake.bytes_sent = 0
+    from_s3 = list(batch.iter_parsed(opener, start=start, stop=stop))
+
+    expected = list(batch.iter_parsed(zip_bytes, start=start, stop=stop))
+    assert [member.index for member in from_s3] == list(range(start, stop))
+    assert [member.parsed for member in from_s3] == [
+        member.parsed for member in expected
+    ]
+    assert fake.bytes_sent < len(zip_bytes) // 10
+
+
+def test_signing_key_is_derived_once_per_day() -> None:
+    fake = FakeS3()
+    backend = _backend(fake)
+    backend.store(org_id=1, file_name="a.xml", content=b"a")
+    cached = backend.client._signing_key
+    backend.store(org_id=1, file_name="b.xml", content=b"b")
+
+    assert cached is not None and backend.client._signing_key is cached
+    assert backend.client._signature_key("20240101") != cached[1]
+    assert backend.client._signing_key[0] == "20240101"
+
+
+def test_bulk_get_and_put_keep_order() -> None:
+    fake = FakeS3()
+    backend = _backend(fake)
+    objects = [(f"org-1/nota-{index:03d}.xml", b"x" * index) for index in range(40)]
+
+    sizes = backend.client.put_many(bucket="oraculo", objects=objects, concurrency=8)
+
+    assert sizes == [len(data) for _, data in objects]
+    keys = [key for key, _ in reversed(objects)]
+    assert backend.read_many(paths=keys, concurrency=8) == [
+        data for _, data in reversed(objects)
+    ]
+    with pytest.raises(RuntimeError):
+        backend.read_many(paths=[keys[0], "org-1/ausente.xml"])
+
+
+async def test_async_client_bulk_api() -> None:
+    fake = FakeS3()
+    async with _AsyncS3Client(
+        endpoint_url="http://s3.test",
+        access_key="chave",
+        secret_key="segredo",
+        region=None,
+        use_ssl=False,
+        transport=httpx.MockTransport(fake),
+    ) as client:
+        objects = [(f"org-1/{index}.xml", str(index).encode()) for index in range(20)]
+        await client.put_many(bucket="oraculo", objects=objects, concurrency=4)
+        contents = await client.get_many(
+            bucket="oraculo", keys=[key for key, _ in objects], concurrency=4
+        )
+
+    assert contents == [data for _, data in objects]
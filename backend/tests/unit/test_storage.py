@@ -0,0 +1,37 @@
+import io
+
+from app.services.storage.local import LocalStorageBackend
+
+
+def test_local_storage_streams_file_objects(tmp_path) -> None:
+    backend = LocalStorageBackend(str(tmp_path))
+    payload = b"PK" + bytes(range(256)) * 5000
+    source = io.BytesIO(payload)
+
+    stored = backend.store(
+        org_id=7,
+        file_name="lotes/jan.zip",
+        content=source,
+        content_type="application/zip",
+    )
+
+    assert stored.size == len(payload)
+    assert stored.path.startswith(str(tmp_path / "7"))
+    assert stored.path.endswith("_lotes_jan.zip")
+    with backend.local_file(path=stored.path) as local_path:
+        assert local_path.read_bytes() == payload
+    assert backend.read(path=stored.path) == payload
+
+
+def test_local_storage_stat_and_range_reads(tmp_path) -> None:
+    backend = LocalStorageBackend(str(tmp_path))
+    payload = bytes(range(256)) * 10
+    stored = backend.store(org_id=1, file_name="nota.xml", content=payload)
+
+    assert backend.stat(path=stored.path).size == len(payload)
+    assert backend.read_range(path=stored.path, offset=2500, length=500) == (
+        payload[2500:]
+    )
+    with backend.open(path=stored.path) as stream:
+        stream.seek(-5, io.SEEK_END)
+        assert stream.read() == payload[-5:]
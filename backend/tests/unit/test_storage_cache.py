@@ -0,0 +1,113 @@
+import os
+from pathlib import Path
+
+from prometheus_client import REGISTRY
+
+from app.services.storage.cache import CachedStorageBackend, DiskCache
+from app.services.storage.local import LocalStorageBackend
+
+
+class CountingBackend(LocalStorageBackend):
+    """Origem em disco que conta as leituras que chegam até ela."""
+
+    def __init__(self, base_path: str) -> None:
+        super().__init__(base_path)
+        self.reads = 0
+
+    def read(self, *, path: str) -> bytes:
+        self.reads += 1
+        return super().read(path=path)
+
+    def read_many(self, *, paths, concurrency=None):
+        self.reads += len(paths)
+        return super().read_many(paths=paths, concurrency=concurrency)
+
+
+def _metric(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _cached(tmp_path: Path, **options) -> tuple[CachedStorageBackend, CountingBackend]:
+    origin = CountingBackend(str(tmp_path / "origem"))
+    options.setdefault("max_bytes", 1024 * 1024)
+    options.setdefault("max_object_size", 1024 * 1024)
+    cache = DiskCache(tmp_path / "cache", **options)
+    return CachedStorageBackend(origin, cache), origin
+
+
+def test_reads_hit_disk_cache_after_first_miss(tmp_path: Path) -> None:
+    backend, origin = _cached(tmp_path)
+    stored = backend.store(org_id=1, file_name="nota.xml", content=b"<nfeProc/>")
+    hits = _metric("storage_cache_requests_total", result="hit")
+
+    assert backend.read(path=stored.path) == b"<nfeProc/>"
+    assert backend.read(path=stored.path) == b"<nfeProc/>"
+    assert backend.read_many(paths=[stored.path, stored.path]) == [b"<nfeProc/>"] * 2
+    with backend.local_file(path=stored.path) as local_path:
+        assert local_path.read_bytes() == b"<nfeProc/>"
+        assert local_path.is_relative_to(tmp_path / "cache")
+
+    assert origin.reads == 1
+    assert _metric("storage_cache_requests_total", result="hit") == hits + 3
+    assert backend.name == origin.name
+
+
+def test_corrupted_entry_is_discarded_and_refetched(tmp_path: Path) -> None:
+    backend, origin = _cached(tmp_path)
+    stored = backend.store(org_id=1, file_name="nota.xml", content=b"original")
+    backend.read(path=stored.path)
+    entry = backend.cache.get(backend._key(stored.path))
+    assert entry is not None
+    entry.write_bytes(b"alterado")
+
+    assert backend.read(path=stored.path) == b"original"
+    assert origin.reads == 2
+    assert backend.cache.read(backend._key(stored.path)) == b"original"
+
+
+def test_range_reads_use_entry_and_skip_truncated_ones(tmp_path: Path) -> None:
+    backend, _ = _cached(tmp_path)
+    stored = backend.store(org_id=1, file_name="nota.xml", content=b"0123456789")
+    backend.read(path=stored.path)
+    key = backend._key(stored.path)
+    entry = backend.cache.get(key)
+    assert entry is not None
+
+    assert backend.read_range(path=stored.path, offset=2, length=3) == b"234"
+    entry.write_bytes(b"01234")
+    assert backend.cache.get(key) is None
+    assert not entry.exists()
+    assert backend.read_range(path=stored.path, offset=2, length=3) == b"234"
+
+
+def test_eviction_keeps_cache_under_limit_lru(tmp_path: Path) -> None:
+    backend, _ = _cached(tmp_path, max_bytes=1000, max_object_size=400)
+    paths = [
+        backend.store(
+            org_id=1, file_name=f"{index}.xml", content=bytes([index]) * 300
+        ).path
+        for index in range(3)
+    ]
+    big = backend.store(org_id=1, file_name="grande.xml", content=b"x" * 500).path
+    evictions = _metric("storage_cache_evictions_total")
+
+    for index, path in enumerate(paths):
+        backend.read(path=path)
+        entry = backend.cache.get(backend._key(path))
+        os.utime(entry, (index, index))
+    backend.read(path=paths[1])  # o mais recente passa a ser o 1
+    backend.read(path=big)  # maior que max_object_size: não entra no cache
+    newest = backend.store(org_id=1, file_name="4.xml", content=b"4" * 300)
+    backend.read(path=newest.path)
+
+    assert backend.cache.get(backend._key(big)) is None
+    assert backend.cache.get(backend._key(paths[0])) is None
+    assert backend.cache.get(backend._key(paths[1])) is not None
+    assert _metric("storage_cache_evictions_total") > evictions
+    entries = [
+        entry
+        for shard in (tmp_path / "cache").iterdir()
+        if shard.name != "locks"
+        for entry in shard.iterdir()
+    ]
+    assert sum(entry.stat().st_size for entry in entries) <= 1000
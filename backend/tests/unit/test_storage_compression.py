@@ -0,0 +1,80 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from app.models.organization import Organization
+from app.services.invoice_ingestion import InvoiceIngestor
+from app.services.storage import compression
+from app.services.storage.compression import (
+    compress,
+    decompress,
+    open_decompressed,
+    open_file,
+    read_file,
+    resolve_codec,
+)
+from app.services.storage.local import LocalStorageBackend
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+def test_gzip_round_trip_for_bytes_and_streams() -> None:
+    payload = (DATA_DIR / "sample_invoice.xml").read_bytes() * 20
+
+    compressed, size = compress(payload, "gzip")
+    assert size == len(payload)
+    assert len(compressed) < len(payload) // 5
+    assert decompress(compressed, "gzip") == payload
+
+    spooled, size = compress(io.BytesIO(payload), "gzip")
+    assert size == len(payload)
+    with open_decompressed(spooled, "gzip") as reader:
+        assert reader.read() == payload
+
+
+def test_resolve_codec(monkeypatch) -> None:
+    assert resolve_codec(None) is None
+    assert resolve_codec("none") is None
+    assert resolve_codec("GZIP") == "gzip"
+    monkeypatch.setattr(compression, "zstandard", None)
+    assert resolve_codec("zstd") == "gzip"
+    with pytest.raises(ValueError):
+        resolve_codec("brotli")
+
+
+def test_store_file_compresses_xml_and_keeps_logical_size(session, tmp_path) -> None:
+    org = Organization(name="Compressão", slug="compressao", cnpj="12345678000199")
+    session.add(org)
+    session.flush()
+    storage = LocalStorageBackend(str(tmp_path))
+    ingestor = InvoiceIngestor(compression="gzip")
+    ingestor.storage = storage
+    payload = (DATA_DIR / "sample_invoice.xml").read_bytes()
+
+    xml_file = ingestor.store_file(
+        session=session,
+        org_id=org.id,
+        file_name="nota.xml",
+        payload=payload,
+        mime="application/xml",
+        uploaded_by=None,
+    )
+    zip_file = ingestor.store_file(
+        session=session,
+        org_id=org.id,
+        file_name="lote.zip",
+        payload=io.BytesIO(b"PK\x05\x06" + bytes(18)),
+        mime="application/zip",
+        uploaded_by=None,
+    )
+
+    assert xml_file.compression == "gzip"
+    assert xml_file.storage_path.endswith("nota.xml.gz")
+    assert xml_file.size_bytes == len(payload)
+    assert Path(xml_file.storage_path).stat().st_size < len(payload)
+    assert read_file(xml_file, storage) == payload
+    with open_file(xml_file, storage) as stream:
+        assert stream.read() == payload
+    assert zip_file.compression is None
+    assert zip_file.size_bytes == 22
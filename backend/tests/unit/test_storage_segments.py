@@ -0,0 +1,113 @@
+from pathlib import Path
+
+import pytest
+
+from app.models.file import File
+from app.models.organization import Organization
+from app.services.invoice_ingestion import InvoiceIngestor
+from app.services.storage.compression import open_file, read_file, read_files
+from app.services.storage.local import LocalStorageBackend
+from app.services.storage.segments import SegmentCompactor
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+class RangeCountingBackend(LocalStorageBackend):
+    def __init__(self, base_path: str) -> None:
+        super().__init__(base_path)
+        self.range_reads = 0
+
+    def read_range(self, *, path: str, offset: int, length: int) -> bytes:
+        self.range_reads += 1
+        return super().read_range(path=path, offset=offset, length=length)
+
+
+def _store_xmls(session, tmp_path: Path, count: int):
+    org = Organization(name="Segmentos", slug="segmentos", cnpj="12345678000199")
+    session.add(org)
+    session.flush()
+    storage = RangeCountingBackend(str(tmp_path))
+    template = (DATA_DIR / "sample_invoice.xml").read_bytes()
+    payloads = [
+        template.replace(b"</", f"<!-- {index} --></".encode(), 1)
+        for index in range(count)
+    ]
+    files = []
+    for index, payload in enumerate(payloads):
+        # Metade comprimida, metade não: o segmento guarda os bytes como estão.
+        ingestor = InvoiceIngestor(compression="gzip" if index % 2 else "none")
+        ingestor.storage = storage
+        files.append(
+            ingestor.store_file(
+                session=session,
+                org_id=org.id,
+                file_name=f"nota-{index}.xml",
+                payload=payload,
+                mime="application/xml",
+                uploaded_by=None,
+            )
+        )
+    return org, storage, files, payloads
+
+
+def test_compaction_packs_loose_xmls_and_reads_by_range(session, tmp_path) -> None:
+    org, storage, files, payloads = _store_xmls(session, tmp_path, count=6)
+    loose_paths = [record.storage_path for record in files]
+    compactor = SegmentCompactor(session, storage, segment_size=1024 * 1024)
+
+    result = compactor.compact(org.id)
+    session.commit()
+    compactor.purge(result.obsolete_paths)
+
+    assert (result.files, result.segments) == (6, 1)
+    assert sorted(result.obsolete_paths) == sorted(loose_paths)
+    assert not any(Path(path).exists() for path in loose_paths)
+    assert len({record.storage_path for record in files}) == 1
+    assert files[0].segment_offset == 0
+    assert all(
+        record.size_bytes == len(payload)
+        for record, payload in zip(files, payloads, strict=True)
+    )
+
+    assert [read_file(record, storage) for record in files] == payloads
+    with open_file(files[1], storage) as stream:
+        assert stream.read() == payloads[1]
+    storage.range_reads = 0
+    assert read_files(list(reversed(files)), storage) == list(reversed(payloads))
+    assert storage.range_reads == 1
+    # Nada novo para juntar: a segunda rodada não regrava o segmento.
+    assert compactor.compact(org.id).segments == 0
+
+
+def test_sparse_segment_is_rewritten(session, tmp_path) -> None:
+    org, storage, files, payloads = _store_xmls(session, tmp_path, count=6)
+    compactor = SegmentCompactor(session, storage, segment_size=1024 * 1024)
+    first = compactor.compact(org.id)
+    session.commit()
+    compactor.purge(first.obsolete_paths)
+    old_segment = files[0].storage_path
+
+    for record in files[:4]:
+        session.delete(record)
+    session.flush()
+    second = compactor.compact(org.id)
+    session.commit()
+    compactor.purge(second.obsolete_paths)
+
+    kept = session.query(File).order_by(File.id).all()
+    assert second.obsolete_paths == [old_segment]
+    assert not Path(old_segment).exists()
+    assert [record.segment_offset for record in kept] == [
+        0,
+        kept[0].segment_length,
+    ]
+    assert read_files(kept, storage) == payloads[4:]
+
+
+def test_corrupted_segment_index_is_detected(session, tmp_path) -> None:
+    org, storage, files, _ = _store_xmls(session, tmp_path, count=2)
+    SegmentCompactor(session, storage).compact(org.id)
+    files[0].segment_offset += 1
+
+    with pytest.raises(ValueError):
+        read_file(files[0], storage)
@@ -1,7 +1,9 @@
 from decimal import Decimal
 from pathlib import Path
 
-from app.utils.xml_parser import XMLParser
+import pytest
+
+from app.utils.xml_parser import PARSER_STRATEGIES, XMLParser
 
 
 def test_parse_full_invoice(tmp_path: Path) -> None:
@@ -18,3 +20,20 @@ def test_parse_full_invoice(tmp_path: Path) -> None:
     assert result.items[0].cfop == "6102"
     assert result.items[1].ncm == "33030010"
     assert result.has_st is False
+
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+@pytest.mark.parametrize(
+    "sample", sorted(DATA_DIR.glob("*.xml")), ids=lambda path: path.name
+)
+@pytest.mark.parametrize("strategy", PARSER_STRATEGIES)
+def test_parser_modes_match_wildcard_tree_parser(sample: Path, strategy: str) -> None:
+    expected = XMLParser(strategy="wildcard").parse(sample)
+
+    tree = XMLParser(strategy=strategy)
+    assert tree.parse(sample) == expected
+    streaming = XMLParser(streaming=True, strategy=strategy)
+    assert streaming.parse(sample) == expected
+    assert streaming.parse_bytes(sample.read_bytes()) == expected
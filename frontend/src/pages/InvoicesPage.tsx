@@ -42,7 +42,21 @@ type InvoiceDetail = InvoiceSummary & {
   findings: AuditFinding[];
 };
 
+type AuditProgress = {
+  audit_run_id: number;
+  status: string;
+  total_invoices: number | null;
+  processed_invoices: number;
+  percent: number | null;
+  throughput_per_second: number | null;
+  eta_seconds: number | null;
+  error: string | null;
+};
+
 const orgId = 1;
+const progressPollMs = 2000;
+
+const wait = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
 
 const formatCurrency = (value: number) =>
   new Intl.NumberFormat("pt-BR", { style: "currency", currency: "BRL" }).format(
@@ -55,6 +69,7 @@ const InvoicesPage = () => {
   const [selectedInvoice, setSelectedInvoice] = useState<InvoiceDetail | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [zipProgress, setZipProgress] = useState<AuditProgress | null>(null);
   const xmlInputRef = useRef<HTMLInputElement | null>(null);
   const zipInputRef = useRef<HTMLInputElement | null>(null);
 
@@ -117,12 +132,29 @@ const InvoicesPage = () => {
     try {
       const formData = new FormData();
       formData.append("file", file);
-      await api.post(`/orgs/${orgId}/uploads/zip`, formData);
+      const { data } = await api.post<{ audit_run_id: number }>(
+        `/orgs/${orgId}/uploads/zip`,
+        formData
+      );
+      // O lote é processado em segundo plano; acompanha até concluir.
+      let progress: AuditProgress;
+      do {
+        await wait(progressPollMs);
+        const response = await api.get<AuditProgress>(
+          `/orgs/${orgId}/audits/${data.audit_run_id}/progress`
+        );
+        progress = response.data;
+        setZipProgress(progress);
+      } while (progress.status !== "done" && progress.status !== "failed");
+      if (progress.status === "failed") {
+        setError(progress.error ?? "Falha ao processar ZIP.");
+      }
       await fetchInvoices();
     } catch (uploadError) {
       setError("Falha ao processar ZIP. Confirme o conteúdo antes de reenviar.");
     } finally {
       setLoading(false);
+      setZipProgress(null);
       if (zipInputRef.current) {
         zipInputRef.current.value = "";
       }
@@ -172,6 +204,15 @@ const InvoicesPage = () => {
         onChange={(event) => setFilter(event.target.value)}
       />
 
+      {zipProgress && zipProgress.status !== "done" && zipProgress.status !== "failed" && (
+        <p className="text-sm text-slate-600">
+          Processando ZIP: {zipProgress.processed_invoices}
+          {zipProgress.total_invoices !== null ? ` de ${zipProgress.total_invoices}` : ""} notas
+          {zipProgress.eta_seconds !== null
+            ? ` · cerca de ${Math.ceil(zipProgress.eta_seconds)} s restantes`
+            : ""}
+        </p>
+      )}
       {error && <p className="text-sm text-red-600">{error}</p>}
 
       <div className="grid gap-6 lg:grid-cols-[2fr,1fr]">